@@ -0,0 +1,97 @@
+"""Micro-benchmark: whole-batch struct decoding vs. per-register decoding.
+
+Run from the repository root:
+
+    python benchmarks/bench_decode.py
+"""
+from __future__ import annotations
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+    import homeassistant  # noqa: F401
+except ImportError:
+    # Reuse the minimal Home Assistant stubs from the test suite.
+    from tests.test_apstorage import _install_homeassistant_stubs
+
+    _install_homeassistant_stubs()
+
+from custom_components.apstorage import APstorageCoordinator
+from custom_components.apstorage.const import (
+    APSTORAGE_REGISTERS,
+    APSTORAGE_SCALE_REGISTERS,
+)
+
+
+def _per_register_poll(coordinator: APstorageCoordinator, batches) -> dict:
+    """Decode a poll the way the coordinator did before batch decoding."""
+    client = coordinator.modbus_client
+    raw_by_address = {}
+    for words, decoder in batches:
+        for address, offset, reg_count, _, _, _ in decoder.fields:
+            raw_by_address[address] = words[offset : offset + reg_count]
+
+    scale_factors = {}
+    for value_reg, scale_reg in APSTORAGE_SCALE_REGISTERS.items():
+        scale_regs = raw_by_address.get(scale_reg)
+        if scale_regs is not None:
+            sf = scale_regs[0]
+            if sf > 32767:
+                sf = sf - 65536
+            scale_factors[value_reg] = sf
+
+    data = {}
+    for address, (name, _, value_type, scale, unit, _) in APSTORAGE_REGISTERS.items():
+        registers = raw_by_address.get(address)
+        if registers is None:
+            continue
+        if address in scale_factors:
+            value = client.decode_register(registers, value_type, 1) * (10 ** scale_factors[address])
+        else:
+            value = client.decode_register(registers, value_type, scale)
+        data[address] = {"name": name, "value": value, "unit": unit, "type": value_type}
+    return data
+
+
+def main() -> None:
+    coordinator = APstorageCoordinator(
+        hass=None, host="bench", port=502, unit=1, connection_type="tcp"
+    )
+    rng = random.Random(0)
+    batches = []
+    for decoder in coordinator._read_plan:
+        words = [rng.randrange(0x20, 0x7F) for _ in range(decoder.count)]
+        batches.append((words, decoder))
+
+    number = 5000
+    legacy = timeit.timeit(lambda: _per_register_poll(coordinator, batches), number=number)
+    frames = [(decoder, decoder.pack(words)) for words, decoder in batches]
+
+    def batch_poll():
+        # Drop the previous frames so every batch is decoded, as on a poll
+        # where all registers changed.
+        coordinator._last_snapshot = None
+        coordinator._frames.clear()
+        return coordinator._decode_frames(frames)
+
+    def unchanged_poll():
+        return coordinator._decode_frames(frames)
+
+    batched = timeit.timeit(batch_poll, number=number)
+    coordinator._decode_frames(frames)
+    unchanged = timeit.timeit(unchanged_poll, number=number)
+
+    print(f"registers per poll: {len(APSTORAGE_REGISTERS)}, batches: {len(batches)}")
+    print(f"per-register decode: {legacy / number * 1e6:8.1f} us/poll")
+    print(f"batch struct decode: {batched / number * 1e6:8.1f} us/poll")
+    print(f"speedup:             {legacy / batched:8.2f}x")
+    print(f"unchanged frames:    {unchanged / number * 1e6:8.1f} us/poll")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Micro-benchmark: per-entity cost of the properties read when entities are added.
+
+Home Assistant reads unique_id, suggested_object_id and device_info for every
+entity when it is added, and device_info again on registry updates. This
+compares the cached lookups with rebuilding them on every access.
+
+Run from the repository root:
+
+    python benchmarks/bench_entity_add.py
+"""
+from __future__ import annotations
+
+import random
+import sys
+import timeit
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+    import homeassistant  # noqa: F401
+except ImportError:
+    # Reuse the minimal Home Assistant stubs from the test suite.
+    from tests.test_apstorage import _install_homeassistant_stubs
+
+    _install_homeassistant_stubs()
+
+from custom_components.apstorage import APstorageCoordinator
+from custom_components.apstorage.binary_sensor import APstorageAlarmBinarySensor
+from custom_components.apstorage.const import (
+    APSTORAGE_REGISTERS,
+    BATTERY_ALARM_BITS,
+    PCS_ALARM_BITS,
+)
+from custom_components.apstorage.entity_naming import get_suggested_object_id
+from custom_components.apstorage.sensor import APstorageRegisterSensor
+
+
+def _build_entities(coordinator, entry) -> list:
+    entities = [
+        APstorageRegisterSensor(coordinator, entry, address, name, unit, device_class, value_type)
+        for address, (name, _, value_type, _, unit, device_class) in APSTORAGE_REGISTERS.items()
+    ]
+    for address, alarm_bits in ((40096, BATTERY_ALARM_BITS), (40100, PCS_ALARM_BITS)):
+        entities.extend(
+            APstorageAlarmBinarySensor(coordinator, entry, address, bit, name, "alarm")
+            for bit, name in alarm_bits.items()
+        )
+    return entities
+
+
+def main() -> None:
+    coordinator = APstorageCoordinator(
+        hass=None, host="bench", port=502, unit=1, connection_type="tcp"
+    )
+    rng = random.Random(0)
+    frames = [
+        (decoder, decoder.pack([rng.randrange(0x41, 0x5A) for _ in range(decoder.count)]))
+        for decoder in coordinator._read_plan
+    ]
+    coordinator.data = coordinator._decode_frames(frames)
+    entry = MagicMock()
+    entry.entry_id = "bench"
+    entry.data = {"host": "192.0.2.1"}
+    entities = _build_entities(coordinator, entry)
+
+    def cached_add():
+        for entity in entities:
+            entity.unique_id
+            entity.suggested_object_id
+            entity.device_info
+
+    def uncached_add():
+        for entity in entities:
+            entity.unique_id
+            get_suggested_object_id(coordinator.data, entity._name)
+            entity._build_device_info()
+
+    number = 500
+    cached_add()
+    uncached = timeit.timeit(uncached_add, number=number)
+    cached = timeit.timeit(cached_add, number=number)
+    construct = timeit.timeit(lambda: _build_entities(coordinator, entry), number=number)
+
+    per_entity = 1e6 / number / len(entities)
+    print(f"entities: {len(entities)}")
+    print(f"construct:                      {construct * per_entity:6.2f} us/entity")
+    print(f"identity properties, rebuilt:   {uncached * per_entity:6.2f} us/entity")
+    print(f"identity properties, cached:    {cached * per_entity:6.2f} us/entity")
+
+
+if __name__ == "__main__":
+    main()
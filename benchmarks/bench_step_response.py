@@ -0,0 +1,391 @@
+"""Benchmark: how fast Battery Power follows a new Set Power.
+
+Writes a sequence of Set Power steps to register 40183 through
+APstorageModbusClient, samples Battery Power (40117) and the grid phase
+powers (40153-40155) as fast as the link allows, and reports dead time,
+rise time, overshoot and settle time for every step.
+
+Against a real battery (this changes its Set Power; it is restored to 0):
+
+    python benchmarks/bench_step_response.py --host 192.168.1.50 --unit 1
+
+The live Max Charge/Discharge Rate is read before any write, and the run is
+refused if a step lies outside it; ``--clamp`` clamps such steps instead.
+
+Against the built-in Modbus TCP battery simulator, for CI. The run fails
+if the measured dead time misses the simulator's by more than the
+tolerance:
+
+    python benchmarks/bench_step_response.py --simulator
+
+The test suite runs the simulator mode with a short hold.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+    import homeassistant  # noqa: F401
+except ImportError:
+    # Reuse the minimal Home Assistant stubs from the test suite.
+    from tests.test_apstorage import _install_homeassistant_stubs
+
+    _install_homeassistant_stubs()
+
+from custom_components.apstorage import APstorageModbusClient
+from custom_components.apstorage.const import CONNECTION_TCP, SET_POWER_REGISTER
+
+MAX_CHARGE_RATE = 40074
+MAX_DISCHARGE_RATE = 40075
+RATE_SF = 40124
+BATTERY_POWER = 40117
+POWER_SF = 40133
+GRID_POWER = 40153
+# One read covers Battery Power, W_SF and the three grid phases.
+SAMPLE_START = BATTERY_POWER
+SAMPLE_COUNT = GRID_POWER + 3 - SAMPLE_START
+# Fraction of the step that counts as "responding" and as "settled".
+BAND = 0.05
+
+
+def _int16(word: int) -> int:
+    return word - 0x10000 if word > 0x7FFF else word
+
+
+def read_limits(client: APstorageModbusClient) -> tuple[float, float]:
+    """Return the live Set Power range in W: -Max Charge Rate..Max Discharge Rate."""
+    rates = client.read_registers(MAX_CHARGE_RATE, 2)
+    scale = client.read_registers(RATE_SF, 1)
+    if rates is None or len(rates) < 2 or not scale:
+        raise RuntimeError("Could not read Max Charge/Discharge Rate")
+    # 0x8000 means the scale factor is not implemented: use the raw rates.
+    factor = 10 ** (0 if scale[0] == 0x8000 else _int16(scale[0]))
+    max_charge, max_discharge = rates[0] * factor, rates[1] * factor
+    if max_charge <= 0 or max_discharge <= 0:
+        raise RuntimeError(
+            f"Max Charge/Discharge Rate {max_charge:.0f}/{max_discharge:.0f} W leave no room to step"
+        )
+    return -max_charge, max_discharge
+
+
+def limit_steps(steps: list[int], low: float, high: float, clamp: bool) -> list[int]:
+    """Return the steps within ``low``..``high``; clamp them or raise ValueError."""
+    outside = [step for step in steps if not low <= step <= high]
+    if outside and not clamp:
+        raise ValueError(
+            f"Steps {outside} W are outside the battery's {low:.0f}..{high:.0f} W; "
+            "use --clamp to clamp them"
+        )
+    return [int(min(max(step, math.ceil(low)), math.floor(high))) for step in steps]
+
+
+def analyze_step(
+    times: list[float], values: list[float], initial: float, target: float, band: float = BAND
+) -> dict[str, float | None]:
+    """Return step-response metrics for samples taken after a setpoint step.
+
+    ``times`` are seconds since the write was sent. Dead time is the first
+    sample that moved ``band`` of the step, rise time runs from 10 % to 90 %,
+    overshoot is in percent of the step, and settle time is when the value
+    enters and stays within ``band`` of the target.
+    """
+    step = target - initial
+    if not step or not times:
+        return {"dead_time": None, "rise_time": None, "overshoot": None, "settle_time": None}
+    progress = [(value - initial) / step for value in values]
+
+    def first_reaching(level: float) -> float | None:
+        return next((t for t, p in zip(times, progress) if p >= level), None)
+
+    t10, t90 = first_reaching(0.1), first_reaching(0.9)
+    outside = [index for index, p in enumerate(progress) if abs(p - 1.0) > band]
+    if not outside:
+        settle_time = times[0]
+    elif outside[-1] + 1 < len(times):
+        settle_time = times[outside[-1] + 1]
+    else:
+        settle_time = None
+    dead_time = first_reaching(band)
+    return {
+        "dead_time": None if dead_time is None else round(dead_time, 4),
+        "rise_time": round(t90 - t10, 4) if t10 is not None and t90 is not None else None,
+        "overshoot": round(max(0.0, max(progress) - 1.0) * 100, 1),
+        "settle_time": None if settle_time is None else round(settle_time, 4),
+    }
+
+
+class SimulatedBattery:
+    """Modbus TCP server for a battery whose power follows Set Power.
+
+    Battery Power responds to each Set Power write after ``dead_time`` as an
+    underdamped second-order system, so every metric has a known value. Grid
+    power is a constant house load minus battery power, split over three
+    phases. Registers are served at their plain SunSpec addresses.
+    """
+
+    def __init__(
+        self,
+        dead_time: float = 0.3,
+        natural_frequency: float = 4.0,
+        damping: float = 0.6,
+        load: float = 1800.0,
+    ) -> None:
+        self.dead_time = dead_time
+        self.natural_frequency = natural_frequency
+        self.damping = damping
+        self.load = load
+        self.port = 0
+        self._steps: list[tuple[float, float]] = []
+        self._setpoint = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._thread: threading.Thread | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def _unit_step(self, elapsed: float) -> float:
+        """Return the normalized response ``elapsed`` seconds after the dead time."""
+        if elapsed <= 0:
+            return 0.0
+        zeta, omega = self.damping, self.natural_frequency
+        damped = omega * math.sqrt(1 - zeta**2)
+        decay = math.exp(-zeta * omega * elapsed)
+        return 1 - decay * (
+            math.cos(damped * elapsed) + zeta / math.sqrt(1 - zeta**2) * math.sin(damped * elapsed)
+        )
+
+    def battery_power(self, now: float | None = None) -> float:
+        """Return Battery Power at ``now`` by superposing every step's response."""
+        now = time.monotonic() if now is None else now
+        return sum(delta * self._unit_step(now - applied) for applied, delta in self._steps)
+
+    def registers(self, address: int, count: int) -> list[int]:
+        battery = round(self.battery_power())
+        grid = round((self.load - battery) / 3)
+        words = {BATTERY_POWER: battery, GRID_POWER: grid, GRID_POWER + 1: grid, GRID_POWER + 2: grid}
+        words[SET_POWER_REGISTER] = self._setpoint
+        # 5 kW each way, with a scale factor of 10^0.
+        words[MAX_CHARGE_RATE] = words[MAX_DISCHARGE_RATE] = 5000
+        return [words.get(address + index, 0) & 0xFFFF for index in range(count)]
+
+    def write(self, address: int, value: int) -> None:
+        if address == SET_POWER_REGISTER:
+            value = _int16(value)
+            self._steps.append((time.monotonic() + self.dead_time, value - self._setpoint))
+            self._setpoint = value
+
+    def _handle_pdu(self, pdu: bytes) -> bytes:
+        function = pdu[0]
+        if function == 0x03:
+            address, count = struct.unpack_from(">HH", pdu, 1)
+            words = self.registers(address, count)
+            return bytes((function, count * 2)) + struct.pack(f">{count}H", *words)
+        if function == 0x06:
+            address, value = struct.unpack_from(">HH", pdu, 1)
+            self.write(address, value)
+            return pdu[:5]
+        if function == 0x10:
+            address, count, _ = struct.unpack_from(">HHB", pdu, 1)
+            for index, value in enumerate(struct.unpack_from(f">{count}H", pdu, 6)):
+                self.write(address + index, value)
+            return pdu[:5]
+        return bytes((function | 0x80, 0x01))
+
+    async def _async_handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                transaction_id, _, length, unit = struct.unpack(">HHHB", await reader.readexactly(7))
+                response = self._handle_pdu(await reader.readexactly(length - 1))
+                writer.write(struct.pack(">HHHB", transaction_id, 0, len(response) + 1, unit) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def start(self) -> None:
+        """Serve on a free localhost port from a background thread."""
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._async_handle_client, "127.0.0.1", 0)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="apstorage-simulator", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        """Close the server and its connections, then end the thread."""
+        if self._loop is None:
+            return
+
+        async def shutdown() -> None:
+            self._server.close()
+            for writer in self._writers:
+                writer.close()
+            handlers = asyncio.all_tasks() - {asyncio.current_task()}
+            if handlers:
+                await asyncio.wait(handlers, timeout=1)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def expected(self, band: float = BAND) -> dict[str, float]:
+        """Return the metrics this plant should produce, from a fine time grid."""
+        times = [index / 1000 for index in range(10000)]
+        values = [self._unit_step(t - self.dead_time) for t in times]
+        return analyze_step(times, values, 0.0, 1.0, band)
+
+
+def _sample(client: APstorageModbusClient) -> tuple[float, float, float] | None:
+    """Read one sample; return (time, battery power, grid power) in W."""
+    sent = time.monotonic()
+    words = client.read_registers(SAMPLE_START, SAMPLE_COUNT)
+    if words is None or len(words) < SAMPLE_COUNT:
+        return None
+    scale = 10 ** _int16(words[POWER_SF - SAMPLE_START])
+    battery = _int16(words[BATTERY_POWER - SAMPLE_START]) * scale
+    grid = sum(_int16(words[GRID_POWER - SAMPLE_START + phase]) for phase in range(3)) * scale
+    return sent, battery, grid
+
+
+def run_step(
+    client: APstorageModbusClient, target: int, hold: float, rate: float | None
+) -> dict:
+    """Write one Set Power step and return its metrics and sampling stats."""
+    before = _sample(client)
+    if before is None:
+        raise RuntimeError("Could not read Battery Power before the step")
+    _, initial, grid_initial = before
+    sent = time.monotonic()
+    if not client.write_register(SET_POWER_REGISTER, target, False):
+        raise RuntimeError(f"Set Power write failed: {client.last_write_error}")
+    write_seconds = time.monotonic() - sent
+
+    times: list[float] = []
+    battery: list[float] = []
+    grid: list[float] = []
+    period = 1.0 / rate if rate else 0.0
+    next_at = sent
+    while (now := time.monotonic()) - sent < hold:
+        if next_at > now:
+            time.sleep(next_at - now)
+        next_at = max(next_at + period, time.monotonic())
+        if (sample := _sample(client)) is None:
+            continue
+        times.append(sample[0] - sent)
+        battery.append(sample[1])
+        grid.append(sample[2])
+
+    intervals = [later - earlier for earlier, later in zip(times, times[1:])]
+    step = target - initial
+    return {
+        "target": target,
+        "initial": initial,
+        "write_ms": round(write_seconds * 1000, 1),
+        "samples": len(times),
+        "sample_rate": round(len(intervals) / (times[-1] - times[0]), 1) if len(times) > 1 else None,
+        "sample_jitter_ms": round(statistics.pstdev(intervals) * 1000, 1) if intervals else None,
+        "battery": analyze_step(times, battery, initial, target),
+        # Grid power moves opposite to battery power.
+        "grid": analyze_step(times, grid, grid_initial, grid_initial - step),
+    }
+
+
+def _format(value: float | None, unit: str = "s") -> str:
+    return "-" if value is None else f"{value:.3f} {unit}" if unit == "s" else f"{value:.1f} {unit}"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=502)
+    parser.add_argument("--unit", type=int, default=1)
+    parser.add_argument("--steps", default="2000,-2000,1000,0", help="Set Power steps in W")
+    parser.add_argument("--hold", type=float, default=10.0, help="Seconds to sample after each step")
+    parser.add_argument("--rate", type=float, default=None, help="Sample rate in Hz (default: as fast as possible)")
+    parser.add_argument("--simulator", action="store_true", help="Run against the built-in simulator")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Simulator dead-time tolerance in s")
+    parser.add_argument("--clamp", action="store_true", help="Clamp steps to the live rate limits")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    simulator = None
+    if args.simulator:
+        simulator = SimulatedBattery()
+        simulator.start()
+        args.host, args.port = "127.0.0.1", simulator.port
+        if args.hold == parser.get_default("hold"):
+            args.hold = 2.5
+
+    client = APstorageModbusClient(
+        hass=None, host=args.host, port=args.port, unit=args.unit, connection_type=CONNECTION_TCP
+    )
+    results = []
+    try:
+        low, high = read_limits(client)
+        steps = limit_steps([int(step) for step in args.steps.split(",")], low, high, args.clamp)
+        for target in steps:
+            results.append(run_step(client, target, args.hold, args.rate))
+    except (RuntimeError, ValueError) as err:
+        print(err, file=sys.stderr)
+        return 2
+    finally:
+        if not simulator and (not results or results[-1]["target"] != 0):
+            client.write_register(SET_POWER_REGISTER, 0)
+        client._sync_disconnect()
+        if simulator is not None:
+            simulator.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            metrics = result["battery"]
+            print(
+                f"{result['initial']:7.0f} -> {result['target']:6d} W: "
+                f"dead {_format(metrics['dead_time'])}, rise {_format(metrics['rise_time'])}, "
+                f"overshoot {_format(metrics['overshoot'], '%')}, settle {_format(metrics['settle_time'])} "
+                f"({result['samples']} samples at {result['sample_rate']} Hz, "
+                f"jitter {result['sample_jitter_ms']} ms, write {result['write_ms']} ms)"
+            )
+
+    if simulator is None:
+        return 0
+    expected = simulator.expected()
+    print(
+        f"simulator: dead {_format(expected['dead_time'])}, rise {_format(expected['rise_time'])}, "
+        f"overshoot {_format(expected['overshoot'], '%')}, settle {_format(expected['settle_time'])}"
+    )
+    for result in results:
+        measured = result["battery"]["dead_time"]
+        if measured is None or abs(measured - expected["dead_time"]) > args.tolerance:
+            print(f"dead time {measured} s misses the simulator's {expected['dead_time']:.3f} s")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
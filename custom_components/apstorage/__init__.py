@@ -21,25 +21,90 @@ from .const import (
     CONF_BAUDRATE,
     CONF_CONNECTION_MAX_AGE_SECONDS,
     CONF_CONNECTION_TYPE,
+    CONF_FLEET,
+    CONF_MAX_BATCH_SIZE,
+    CONF_PIPELINE_REQUESTS,
+    CONF_PROXY_BIND_HOST,
+    CONF_PROXY_PORT,
     CONF_REGISTER_ADDRESS_OFFSET,
+    CONF_STALE_GRACE_POLLS,
+    CONF_STALE_GRACE_SECONDS,
+    CONF_RAW_RECORDER,
+    CONF_ZERO_EXPORT,
+    CONF_ZERO_EXPORT_TARGET,
     CONNECTION_TCP,
     CONNECTION_RTU,
+    DATA_FLEET,
+    DATA_POLL_SCHEDULER,
     DEFAULT_CONNECTION_MAX_AGE_SECONDS,
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_PROXY_BIND_HOST,
+    DEFAULT_PROXY_PORT,
     DEFAULT_REGISTER_ADDRESS_OFFSET,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STALE_GRACE_POLLS,
+    DEFAULT_STALE_GRACE_SECONDS,
+    DEFAULT_ZERO_EXPORT_TARGET,
     DOMAIN,
+    HEARTBEAT_REGISTER,
+    IDENTITY_REGISTERS,
     LOGGER_NAME,
+    RAW_RECORDER_DIRECTORY,
+    SUNSPEC_DISCOVERY_TIMEOUT_SECONDS,
+    TCP_POOL_CONNECTIONS,
 )
+from .bus import APstorageModbusBus, async_get_rtu_bus, async_get_tcp_pool, async_release_bus
+from .controller import APstorageZeroExportController
+from .decoder import BatchDecoder
+from .discovery import (
+    IDENTITY_SPAN,
+    APstorageModelCache,
+    SunSpecDiscovery,
+    async_confirm_unimplemented,
+    async_discover_model_chain,
+    async_get_model_cache,
+    identity_key,
+)
+from .entity_naming import async_migrate_config_entry_entity_ids, get_serial_number
+from .capture import APstorageCapture
+from .fleet import async_setup_fleet_entry, async_unload_fleet_entry
+from .live import APstorageLiveStream
+from .proxy import APstorageModbusProxy
+from .frame_log import APstorageFrameRecorder
+from .schedule import APstorageScheduleExecutor
+from .scheduler import APstoragePollScheduler
+from .services import async_setup_services
+from .snapshot import REGISTER_INDEX, APstorageSnapshot, new_value_list
+from .transport import APstorageModbusTcpPipeline, async_get_pipeline, async_release_pipeline
+from .websocket import async_register_websocket_commands
+from .writer import APstorageRegisterWriter
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
 CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 PLATFORMS = [Platform.SENSOR, Platform.NUMBER, Platform.BINARY_SENSOR]
 
+# Options the update listener applies to the running entry without a reload.
+_HOT_APPLY_OPTIONS = frozenset(
+    {
+        "scan_interval",
+        CONF_CONNECTION_MAX_AGE_SECONDS,
+        CONF_STALE_GRACE_POLLS,
+        CONF_STALE_GRACE_SECONDS,
+        CONF_PROXY_PORT,
+        CONF_PROXY_BIND_HOST,
+        CONF_ZERO_EXPORT,
+        CONF_ZERO_EXPORT_TARGET,
+        CONF_RAW_RECORDER,
+    }
+)
+
 
 async def async_setup(hass: HomeAssistant, config: dict) -> bool:
     """Set up APstorage from YAML config."""
     hass.data.setdefault(DOMAIN, {})
+    async_setup_services(hass)
+    async_register_websocket_commands(hass)
     _LOGGER.debug("APstorage integration initialized")
     return True
 
@@ -47,20 +112,34 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up APstorage from ConfigEntry."""
     hass.data.setdefault(DOMAIN, {})
+    if entry.data.get(CONF_FLEET):
+        return await async_setup_fleet_entry(hass, entry)
     hass.data[DOMAIN][entry.entry_id] = {}
 
-    scan_interval_seconds = entry.options.get(
-        "scan_interval", entry.data.get("scan_interval", DEFAULT_SCAN_INTERVAL.total_seconds())
-    )
-    connection_max_age_seconds = entry.options.get(
-        CONF_CONNECTION_MAX_AGE_SECONDS,
-        entry.data.get(CONF_CONNECTION_MAX_AGE_SECONDS, DEFAULT_CONNECTION_MAX_AGE_SECONDS),
-    )
-    register_address_offset = int(
-        entry.options.get(
-            CONF_REGISTER_ADDRESS_OFFSET,
-            entry.data.get(CONF_REGISTER_ADDRESS_OFFSET, DEFAULT_REGISTER_ADDRESS_OFFSET),
+    settings = _entry_settings(entry)
+    scan_interval_seconds = settings["scan_interval"]
+    connection_max_age_seconds = settings["connection_max_age_seconds"]
+
+    connection_type = entry.data.get(CONF_CONNECTION_TYPE, CONNECTION_TCP)
+    baudrate = int(entry.data.get(CONF_BAUDRATE, 9600))
+    # Units daisy-chained on one serial port share a single bus; units behind
+    # one TCP gateway share its connection pool.
+    if connection_type == CONNECTION_RTU:
+        bus = async_get_rtu_bus(hass, entry.data.get(CONF_HOST), baudrate)
+    else:
+        bus = async_get_tcp_pool(
+            hass,
+            entry.data.get(CONF_HOST),
+            entry.data.get(CONF_PORT, 502),
+            TCP_POOL_CONNECTIONS,
+            connection_max_age_seconds,
         )
+
+    # Opt-in: read all batches of a poll over one pipelined TCP connection.
+    pipeline = (
+        async_get_pipeline(hass, entry.data.get(CONF_HOST), entry.data.get(CONF_PORT, 502))
+        if connection_type == CONNECTION_TCP and entry.options.get(CONF_PIPELINE_REQUESTS, False)
+        else None
     )
 
     # Create coordinator
@@ -69,13 +148,24 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         host=entry.data.get(CONF_HOST),
         port=entry.data.get(CONF_PORT, 502),
         unit=entry.data.get("unit", 1),
-        connection_type=entry.data.get(CONF_CONNECTION_TYPE, CONNECTION_TCP),
+        connection_type=connection_type,
         scan_interval=timedelta(seconds=scan_interval_seconds),
-        baudrate=int(entry.data.get(CONF_BAUDRATE, 9600)),
+        baudrate=baudrate,
         connection_max_age_seconds=connection_max_age_seconds,
-        register_address_offset=register_address_offset,
+        register_address_offset=settings["register_address_offset"],
+        stale_grace_polls=settings["stale_grace_polls"],
+        stale_grace_seconds=settings["stale_grace_seconds"],
+        entry_id=entry.entry_id,
+        bus=bus,
+        pipeline=pipeline,
+        max_batch_size=entry.data.get(CONF_MAX_BATCH_SIZE, DEFAULT_MAX_BATCH_SIZE),
     )
 
+    # Stagger polls of entries sharing a Modbus link across the scan interval.
+    scheduler = hass.data.setdefault(DATA_POLL_SCHEDULER, APstoragePollScheduler())
+    scheduler.register(entry.entry_id, coordinator.modbus_client.link_key, scan_interval_seconds)
+    coordinator.poll_scheduler = scheduler
+
     # Don't block setup on initial connection; allow it to fail and retry in background.
     # This prevents Home Assistant from becoming unresponsive if the device is unreachable.
     try:
@@ -100,6 +190,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             "Error during APstorage setup connection: %s; will retry in background",
             err,
         )
+    else:
+        if connected:
+            try:
+                await asyncio.wait_for(
+                    coordinator.async_discover_registers(async_get_model_cache(hass)),
+                    timeout=SUNSPEC_DISCOVERY_TIMEOUT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                _LOGGER.warning(
+                    "SunSpec discovery timed out after %d seconds; reading the full register table",
+                    SUNSPEC_DISCOVERY_TIMEOUT_SECONDS,
+                )
 
     await coordinator.async_refresh()
     if not coordinator.last_update_success:
@@ -107,19 +209,147 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             "Initial APstorage refresh failed during setup; entities may be created without data until a later refresh succeeds"
         )
 
-    hass.data[DOMAIN][entry.entry_id]["coordinator"] = coordinator
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    entry_data["coordinator"] = coordinator
+    entry_data["options"] = dict(entry.options)
+    if (fleet := hass.data.get(DATA_FLEET)) is not None:
+        fleet.async_add_member(coordinator)
+
+    await _async_start_proxy(
+        entry_data, coordinator, settings["proxy_port"], settings["proxy_bind_host"]
+    )
+    if settings["zero_export"]:
+        coordinator.async_start_zero_export(settings["zero_export_target"])
+    if settings["raw_recorder"]:
+        coordinator.async_start_raw_recorder()
+    await coordinator.schedule.async_load()
 
     # Forward platforms
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     return True
 
 
+def _entry_settings(entry: ConfigEntry) -> dict[str, Any]:
+    """Resolve the entry's tunable settings from options, data and defaults."""
+    return {
+        "scan_interval": entry.options.get(
+            "scan_interval", entry.data.get("scan_interval", DEFAULT_SCAN_INTERVAL.total_seconds())
+        ),
+        "connection_max_age_seconds": entry.options.get(
+            CONF_CONNECTION_MAX_AGE_SECONDS,
+            entry.data.get(CONF_CONNECTION_MAX_AGE_SECONDS, DEFAULT_CONNECTION_MAX_AGE_SECONDS),
+        ),
+        "register_address_offset": int(
+            entry.options.get(
+                CONF_REGISTER_ADDRESS_OFFSET,
+                entry.data.get(CONF_REGISTER_ADDRESS_OFFSET, DEFAULT_REGISTER_ADDRESS_OFFSET),
+            )
+        ),
+        "stale_grace_polls": int(
+            entry.options.get(CONF_STALE_GRACE_POLLS, DEFAULT_STALE_GRACE_POLLS)
+        ),
+        "stale_grace_seconds": int(
+            entry.options.get(CONF_STALE_GRACE_SECONDS, DEFAULT_STALE_GRACE_SECONDS)
+        ),
+        "proxy_port": int(entry.options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT)),
+        "proxy_bind_host": entry.options.get(CONF_PROXY_BIND_HOST, DEFAULT_PROXY_BIND_HOST),
+        "zero_export": bool(entry.options.get(CONF_ZERO_EXPORT, False)),
+        "zero_export_target": int(
+            entry.options.get(CONF_ZERO_EXPORT_TARGET, DEFAULT_ZERO_EXPORT_TARGET)
+        ),
+        "raw_recorder": bool(entry.options.get(CONF_RAW_RECORDER, False)),
+    }
+
+
+async def _async_start_proxy(
+    entry_data: dict[str, Any], coordinator: APstorageCoordinator, port: int, host: str
+) -> None:
+    """Start the optional local Modbus TCP server for other consumers."""
+    if not port:
+        return
+    proxy = APstorageModbusProxy(coordinator, port, host)
+    try:
+        await proxy.async_start()
+    except OSError as err:
+        _LOGGER.error("Could not start APstorage Modbus proxy on %s:%d: %s", host, port, err)
+    else:
+        entry_data["proxy"] = proxy
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options to the running entry.
+
+    Timing, grace, proxy, zero-export and recorder options are applied to the live
+    coordinator and client; only options that change the transport reload
+    the entry. Data changes from reconfiguration reload on their own.
+    """
+    entry_data = hass.data[DOMAIN].get(entry.entry_id)
+    if not entry_data or "coordinator" not in entry_data:
+        return
+    previous = entry_data.get("options", {})
+    current = dict(entry.options)
+    changed = {key for key in previous.keys() | current.keys() if previous.get(key) != current.get(key)}
+    if not changed:
+        return
+    if not changed.issubset(_HOT_APPLY_OPTIONS):
+        _LOGGER.debug("APstorage options %s need a reload", sorted(changed - _HOT_APPLY_OPTIONS))
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    entry_data["options"] = current
+    coordinator: APstorageCoordinator = entry_data["coordinator"]
+    settings = _entry_settings(entry)
+    coordinator.async_apply_settings(
+        scan_interval=timedelta(seconds=settings["scan_interval"]),
+        connection_max_age_seconds=settings["connection_max_age_seconds"],
+        stale_grace_polls=settings["stale_grace_polls"],
+        stale_grace_seconds=settings["stale_grace_seconds"],
+    )
+    if coordinator.poll_scheduler is not None:
+        coordinator.poll_scheduler.register(
+            entry.entry_id, coordinator.modbus_client.link_key, settings["scan_interval"]
+        )
+    if changed & {CONF_PROXY_PORT, CONF_PROXY_BIND_HOST}:
+        if (proxy := entry_data.pop("proxy", None)) is not None:
+            await proxy.async_stop()
+        await _async_start_proxy(
+            entry_data, coordinator, settings["proxy_port"], settings["proxy_bind_host"]
+        )
+    if not settings["zero_export"]:
+        await coordinator.async_stop_zero_export()
+    elif coordinator.controller is not None and coordinator.controller.running:
+        coordinator.controller.target = settings["zero_export_target"]
+    else:
+        coordinator.async_start_zero_export(settings["zero_export_target"])
+    if settings["raw_recorder"]:
+        coordinator.async_start_raw_recorder()
+    else:
+        await coordinator.async_stop_raw_recorder()
+    _LOGGER.debug("Applied APstorage options %s without reload", sorted(changed))
+    # Poll now so a shorter interval or new offset takes effect right away.
+    await coordinator.async_request_refresh()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a ConfigEntry."""
-    coordinator: APstorageCoordinator | None = hass.data[DOMAIN].get(entry.entry_id, {}).get("coordinator")
+    if entry.data.get(CONF_FLEET):
+        return await async_unload_fleet_entry(hass, entry)
+    entry_data = hass.data[DOMAIN].get(entry.entry_id, {})
+    coordinator: APstorageCoordinator | None = entry_data.get("coordinator")
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        if (proxy := entry_data.get("proxy")) is not None:
+            await proxy.async_stop()
+        if (fleet := hass.data.get(DATA_FLEET)) is not None:
+            fleet.async_remove_member(entry.entry_id)
         if coordinator is not None:
             await coordinator.async_shutdown()
+            if (bus := coordinator.modbus_client.bus) is not None:
+                await async_release_bus(hass, bus)
+            if coordinator.pipeline is not None:
+                await async_release_pipeline(hass, coordinator.pipeline)
+        if (scheduler := hass.data.get(DATA_POLL_SCHEDULER)) is not None:
+            scheduler.unregister(entry.entry_id)
         hass.data[DOMAIN].pop(entry.entry_id)
     return unload_ok
 
@@ -139,23 +369,53 @@ class APstorageModbusClient:
         baudrate: int = 9600,
         connection_max_age_seconds: int = DEFAULT_CONNECTION_MAX_AGE_SECONDS,
         register_address_offset: int = DEFAULT_REGISTER_ADDRESS_OFFSET,
+        bus: APstorageModbusBus | None = None,
     ):
         self.hass = hass
         self.host = host
         self.port = port
         self.unit = unit
         self.connection_type = connection_type
-        self.baudrate = baudrate
+        # Every unit on a shared serial bus talks at the rate the port was opened with.
+        self.baudrate = getattr(bus, "baudrate", baudrate)
         self.connection_max_age_seconds = max(0, int(connection_max_age_seconds))
         self.register_address_offset = int(register_address_offset)
-        self.client = None
+        self.bus = bus
+        self._client = None
         self.last_write_error: str | None = None
         self._client_lock = threading.Lock()
-        self._request_lock = threading.Lock()
+        # On a shared link the request lock is the link's fair per-unit channel.
+        self._request_lock = bus.channel(unit) if bus is not None else threading.Lock()
         self._last_connect_monotonic: float | None = None
         self._last_successful_write_monotonic: float | None = None
 
-    def _to_wire_address(self, address: int) -> int:
+    @property
+    def client(self):
+        """Return the pymodbus client, shared with other units on a bus."""
+        if self.bus is not None:
+            return self.bus.client
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        if self.bus is not None:
+            self.bus.client = client
+        else:
+            self._client = client
+
+    @property
+    def link_key(self) -> str:
+        """Return a key identifying the physical link (TCP endpoint or serial port)."""
+        if self.connection_type == CONNECTION_TCP:
+            return f"{CONNECTION_TCP}:{self.host}:{self.port}"
+        return f"{CONNECTION_RTU}:{self.host}"
+
+    def _record_failure(self) -> None:
+        """Count a failed transaction in the shared link's per-unit metrics."""
+        if self.bus is not None:
+            self.bus.record_failure(self.unit)
+
+    def to_wire_address(self, address: int) -> int:
         """Convert logical register address to Modbus wire address."""
         return int(address) + self.register_address_offset
 
@@ -204,6 +464,9 @@ class APstorageModbusClient:
 
     def _sync_disconnect(self) -> None:
         """Close the current client connection synchronously."""
+        if self.bus is not None:
+            # The shared port is closed when its last user releases the bus.
+            return
         with self._client_lock:
             if self.client is not None:
                 try:
@@ -215,6 +478,8 @@ class APstorageModbusClient:
 
     def _sync_connect(self, force_reconnect: bool = False) -> bool:
         """Connect (or reconnect) to the Modbus device synchronously."""
+        if self.bus is not None:
+            return self.bus.connect(self._create_client, force_reconnect)
         with self._client_lock:
             if not force_reconnect and self._is_client_connected():
                 return True
@@ -237,6 +502,11 @@ class APstorageModbusClient:
             _LOGGER.info("Connected to APstorage Modbus device")
             return True
 
+    def _sync_connect_exclusive(self) -> bool:
+        """Connect while holding the request lock, as reads and writes do."""
+        with self._request_lock:
+            return self._sync_connect()
+
     def _should_recycle_connection(self) -> bool:
         """Return True if the connection should be recycled due to age."""
         if self.connection_type != CONNECTION_TCP:
@@ -262,7 +532,7 @@ class APstorageModbusClient:
         """Connect to the Modbus device."""
         try:
             return await asyncio.wait_for(
-                self.hass.async_add_executor_job(self._sync_connect),
+                self.hass.async_add_executor_job(self._sync_connect_exclusive),
                 timeout=10.0
             )
         except asyncio.TimeoutError:
@@ -281,10 +551,14 @@ class APstorageModbusClient:
         await self.hass.async_add_executor_job(self._sync_disconnect)
 
     def read_registers(self, address: int, count: int) -> list[int] | None:
-        """Read holding registers synchronously."""
-        try:
-            wire_address = self._to_wire_address(address)
-            with self._request_lock:
+        """Read holding registers synchronously.
+
+        Every reconnect and retry happens while the request lock is held, so
+        on a shared link the connection is never touched by two units at once.
+        """
+        wire_address = self.to_wire_address(address)
+        with self._request_lock:
+            try:
                 if not self._ensure_connected(recycle_if_old=True):
                     _LOGGER.debug(
                         "Skipping Modbus read for %s:%s address=%d count=%d device_id=%d because client is not connected",
@@ -294,6 +568,7 @@ class APstorageModbusClient:
                         count,
                         self.unit,
                     )
+                    self._record_failure()
                     return None
                 rr = self.client.read_holding_registers(
                     address=wire_address,
@@ -327,40 +602,44 @@ class APstorageModbusClient:
                             self.unit,
                             retry,
                         )
+                    self._record_failure()
                     return None
                 return rr.registers
-        except Exception as err:  # pragma: no cover
-            _LOGGER.exception(
-                "Exception reading Modbus registers for %s:%s address=%d count=%d device_id=%d: %s",
-                self.host,
-                self.port,
-                address,
-                count,
-                self.unit,
-                err,
-            )
-            try:
-                if self._sync_connect(force_reconnect=True):
-                    retry = self.client.read_holding_registers(
-                        address=wire_address,
-                        count=count,
-                        device_id=self.unit,
-                    )
-                    if not retry.isError():
-                        return retry.registers
-            except Exception as retry_err:  # pragma: no cover
-                _LOGGER.debug("Retry read after reconnect failed: %s", retry_err)
-            return None
+            except Exception as err:  # pragma: no cover
+                _LOGGER.exception(
+                    "Exception reading Modbus registers for %s:%s address=%d count=%d device_id=%d: %s",
+                    self.host,
+                    self.port,
+                    address,
+                    count,
+                    self.unit,
+                    err,
+                )
+                try:
+                    if self._sync_connect(force_reconnect=True):
+                        retry = self.client.read_holding_registers(
+                            address=wire_address,
+                            count=count,
+                            device_id=self.unit,
+                        )
+                        if not retry.isError():
+                            return retry.registers
+                except Exception as retry_err:  # pragma: no cover
+                    _LOGGER.debug("Retry read after reconnect failed: %s", retry_err)
+                self._record_failure()
+                return None
 
-    def write_register(self, address: int, value: int) -> bool:
+    def write_register(self, address: int, value: int, defer_reads: bool = True) -> bool:
         """Write a single holding register synchronously.
 
         Tries both Modbus function 16 (write multiple) and function 6 (write
-        single), as device behavior can vary by firmware.
+        single), as device behavior can vary by firmware. ``defer_reads``
+        holds off polls briefly after the write; control loops that write
+        every interval turn it off.
         """
         try:
             self.last_write_error = None
-            wire_address = self._to_wire_address(address)
+            wire_address = self.to_wire_address(address)
             attempt_errors: list[str] = []
             if not -32768 <= value <= 32767:
                 _LOGGER.error(
@@ -394,10 +673,6 @@ class APstorageModbusClient:
                     device_id=self.unit,
                 )
 
-            method_order = ["write_registers", "write_register"]
-            if not callable(getattr(self.client, "write_registers", None)):
-                method_order = ["write_register"]
-
             with self._request_lock:
                 if not self._ensure_connected(recycle_if_old=True):
                     self.last_write_error = "Modbus client is not connected"
@@ -407,6 +682,11 @@ class APstorageModbusClient:
                     if reconnect and not self._sync_connect(force_reconnect=True):
                         continue
 
+                    # On a shared link the client is only reachable inside the channel.
+                    method_order = ["write_registers", "write_register"]
+                    if not callable(getattr(self.client, "write_registers", None)):
+                        method_order = ["write_register"]
+
                     for method in method_order:
                         try:
                             result = _attempt_write(method)
@@ -430,7 +710,8 @@ class APstorageModbusClient:
                                 method,
                                 len(attempt_errors),
                             )
-                            self._last_successful_write_monotonic = time.monotonic()
+                            if defer_reads:
+                                self._last_successful_write_monotonic = time.monotonic()
                             self.last_write_error = None
                             return True
 
@@ -453,6 +734,7 @@ class APstorageModbusClient:
                     self.last_write_error,
                 )
             _LOGGER.error(self.last_write_error)
+            self._record_failure()
             return False
         except Exception as err:  # pragma: no cover
             _LOGGER.exception("Exception writing register: %s", err)
@@ -509,7 +791,13 @@ class APstorageModbusClient:
 class APstorageCoordinator(DataUpdateCoordinator):
     """Coordinator to poll APstorage device."""
 
-    _MAX_MODBUS_BATCH_READ_COUNT = 125
+    _MAX_MODBUS_BATCH_READ_COUNT = DEFAULT_MAX_BATCH_SIZE
+    # The heartbeat ticks once per second; a shorter gap may legitimately
+    # see the same value twice.
+    _HEARTBEAT_MIN_ELAPSED_SECONDS = 1.5
+    # Re-anchor device time when heartbeat and host clocks disagree by more
+    # than this (controller restart or counter wrap between polls).
+    _HEARTBEAT_RESYNC_SECONDS = 5.0
 
     def __init__(
         self,
@@ -522,7 +810,16 @@ class APstorageCoordinator(DataUpdateCoordinator):
         baudrate: int = 9600,
         connection_max_age_seconds: int = DEFAULT_CONNECTION_MAX_AGE_SECONDS,
         register_address_offset: int = DEFAULT_REGISTER_ADDRESS_OFFSET,
+        stale_grace_polls: int = DEFAULT_STALE_GRACE_POLLS,
+        stale_grace_seconds: int = DEFAULT_STALE_GRACE_SECONDS,
+        entry_id: str | None = None,
+        bus: APstorageModbusBus | None = None,
+        pipeline: APstorageModbusTcpPipeline | None = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
     ):
+        self.entry_id = entry_id
+        self.max_batch_size = max(1, min(int(max_batch_size), self._MAX_MODBUS_BATCH_READ_COUNT))
+        self.pipeline = pipeline
         self.modbus_client = APstorageModbusClient(
             hass,
             host,
@@ -532,10 +829,14 @@ class APstorageCoordinator(DataUpdateCoordinator):
             baudrate,
             connection_max_age_seconds,
             register_address_offset,
+            bus,
         )
         
         if scan_interval is None:
             scan_interval = DEFAULT_SCAN_INTERVAL
+        # Configured interval; update_interval is re-phased by the poll scheduler.
+        self.scan_interval: timedelta = scan_interval
+        self.poll_scheduler: APstoragePollScheduler | None = None
 
         super().__init__(
             hass,
@@ -543,23 +844,82 @@ class APstorageCoordinator(DataUpdateCoordinator):
             name="APstorage Modbus",
             update_method=self._async_update_data,
             update_interval=scan_interval,
+            always_update=False,
         )
+        self._scale_registers = frozenset(APSTORAGE_SCALE_REGISTERS.values())
+        # Change detection: last raw frame per batch start and the scale
+        # factors decoded from them.
+        self._frames: dict[int, bytes] = {}
+        self._scale_factors: dict[int, int] = {}
+        self._last_snapshot: APstorageSnapshot | None = None
+        # Grace policy: failing batches keep their last values, flagged stale,
+        # for a number of failed polls or seconds before they go unavailable.
+        self.stale_grace_polls = max(0, int(stale_grace_polls))
+        self.stale_grace_seconds = max(0, int(stale_grace_seconds))
+        self._batch_sampled: dict[int, float] = {}
+        self._batch_failures: dict[int, int] = {}
+        self._stale_batches: set[int] = set()
+        # Latest raw frame read from the device per batch start, for the proxy.
+        self.raw_frames: dict[int, bytes] = {}
+        # SunSpec models found on the device; empty until discovery ran.
+        self.sunspec_models: tuple = ()
+        # Registers the device reports as not implemented; no entities are made for them.
+        self.unimplemented_registers: frozenset[int] = frozenset()
+        self._set_read_plan(self._build_read_plan(max_count=self.max_batch_size))
+        # Registers decoded in the last poll; None means "treat all as changed".
+        self.changed_addresses: frozenset[int] | None = None
+        # Heartbeat tracking: last value, host time it was seen and device time.
+        self._heartbeat: int | None = None
+        self._heartbeat_monotonic: float | None = None
+        self._device_time: float | None = None
+        self.device_stale = False
+        # Bumped whenever an identity register changes, so entities can cache
+        # device info and object IDs derived from them.
+        self._identity: tuple[Any, ...] | None = None
+        self.identity_version = 0
+        # Entity IDs are migrated to the serial prefix once per entry lifetime.
+        self.entity_ids_migrated = False
+        self.writer = APstorageRegisterWriter(self)
+        # Optional zero-export control loop; created when first enabled.
+        self.controller: APstorageZeroExportController | None = None
+        # Optional raw frame log; created when the option is enabled.
+        self.recorder: APstorageFrameRecorder | None = None
+        self.schedule = APstorageScheduleExecutor(self)
+        self.live = APstorageLiveStream(self)
+        self.capture = APstorageCapture(self)
 
     async def async_init(self) -> bool:
         """Initialize the coordinator."""
+        if self.pipeline is not None:
+            # Reads go over the pipeline; the pymodbus client connects on first write.
+            return await self.pipeline.async_connect()
         return await self.modbus_client.async_connect()
 
     async def async_shutdown(self) -> None:
         """Shutdown the coordinator and close Modbus resources."""
+        self.writer.async_cancel()
+        self.schedule.async_cancel()
+        await self.live.async_stop()
+        await self.async_stop_zero_export()
+        await self.async_stop_raw_recorder()
         await self.modbus_client.async_disconnect()
 
     @classmethod
-    def _build_read_batches(cls) -> list[tuple[int, int]]:
-        """Build contiguous Modbus read batches from configured register spans."""
+    def _build_read_batches(
+        cls, addresses: frozenset[int] | None = None, max_count: int | None = None
+    ) -> list[tuple[int, int]]:
+        """Build contiguous Modbus read batches from configured register spans.
+
+        ``addresses`` limits the batches to registers the device implements;
+        ``max_count`` caps the registers per batch for slow links.
+        """
+        if max_count is None:
+            max_count = cls._MAX_MODBUS_BATCH_READ_COUNT
         batches: list[tuple[int, int]] = []
         spans = sorted(
             (address, address + count - 1)
             for address, (_, count, _, _, _, _) in APSTORAGE_REGISTERS.items()
+            if addresses is None or address in addresses
         )
         if not spans:
             return batches
@@ -569,7 +929,7 @@ class APstorageCoordinator(DataUpdateCoordinator):
             proposed_end = max(batch_end, span_end)
             proposed_count = proposed_end - batch_start + 1
 
-            if span_start <= batch_end + 1 and proposed_count <= cls._MAX_MODBUS_BATCH_READ_COUNT:
+            if span_start <= batch_end + 1 and proposed_count <= max_count:
                 batch_end = proposed_end
                 continue
 
@@ -579,8 +939,138 @@ class APstorageCoordinator(DataUpdateCoordinator):
         batches.append((batch_start, batch_end))
         return batches
 
-    async def _async_update_data(self) -> dict[str, Any]:
-        """Fetch data from the device."""
+    @classmethod
+    def _build_read_plan(
+        cls, addresses: frozenset[int] | None = None, max_count: int | None = None
+    ) -> list[BatchDecoder]:
+        """Precompile a batch decoder for every contiguous read batch."""
+        plan: list[BatchDecoder] = []
+        assigned: set[int] = set()
+        for batch_start, batch_end in cls._build_read_batches(addresses, max_count):
+            fields = []
+            for address, (_, reg_count, value_type, scale, _, _) in APSTORAGE_REGISTERS.items():
+                if address in assigned or address < batch_start:
+                    continue
+                if addresses is not None and address not in addresses:
+                    continue
+                if address + reg_count - 1 > batch_end:
+                    continue
+                assigned.add(address)
+                fields.append(
+                    (
+                        address,
+                        address - batch_start,
+                        reg_count,
+                        value_type,
+                        scale,
+                        APSTORAGE_SCALE_REGISTERS.get(address),
+                    )
+                )
+            plan.append(BatchDecoder(batch_start, batch_end - batch_start + 1, tuple(fields)))
+        return plan
+
+    @property
+    def read_plan(self) -> tuple[BatchDecoder, ...]:
+        """Return the batches each poll reads, in address order."""
+        return tuple(self._read_plan)
+
+    def _set_read_plan(self, plan: list[BatchDecoder]) -> None:
+        """Replace the read plan and reset all per-batch state."""
+        self._read_plan = plan
+        self._batch_stats: dict[int, dict[str, int]] = {
+            decoder.start: {"polls": 0, "unchanged": 0, "failed": 0} for decoder in plan
+        }
+        self._batch_of = {
+            address: decoder.start for decoder in plan for address in decoder.addresses
+        }
+        self._frames.clear()
+        self.raw_frames.clear()
+        self._batch_sampled.clear()
+        self._batch_failures.clear()
+        self._stale_batches.clear()
+
+    async def async_discover_registers(self, cache: APstorageModelCache) -> None:
+        """Limit the read plan to the SunSpec models the device implements.
+
+        The model chain is walked and the unimplemented registers confirmed
+        once per serial number and firmware version; later startups only
+        read the identity and reuse the stored result. The models are stored
+        and applied before the confirming reads, so a timeout there keeps
+        them.
+        """
+        client = self.modbus_client
+        configured_offset = client.register_address_offset
+
+        async def read(wire_address: int, count: int) -> list[int] | None:
+            return await self.hass.async_add_executor_job(
+                client.read_registers, wire_address - configured_offset, count
+            )
+
+        span_start, span_count = IDENTITY_SPAN
+        words = await read(span_start + configured_offset, span_count)
+        key = identity_key(words) if words is not None and len(words) >= span_count else None
+        discovery = await cache.async_get(key) if key else None
+        if discovery is None:
+            result = await async_discover_model_chain(read, (configured_offset, 0, -1, 1))
+            if result is None:
+                _LOGGER.debug("No SunSpec model chain found; reading the full register table")
+                return
+            discovery, key = result
+            if key:
+                await cache.async_set(key, discovery)
+        self._apply_discovery(discovery)
+        if discovery.unimplemented is not None:
+            return
+        discovery = await async_confirm_unimplemented(read, discovery)
+        if discovery.unimplemented is None:
+            return
+        self._apply_discovery(discovery)
+        if key:
+            await cache.async_set(key, discovery)
+
+    def _apply_discovery(self, discovery: SunSpecDiscovery) -> None:
+        """Switch to the read plan for the discovered models."""
+        client = self.modbus_client
+        if discovery.offset != client.register_address_offset:
+            _LOGGER.warning(
+                "SunSpec marker found with register_address_offset %d instead of the configured %d; using %d",
+                discovery.offset,
+                client.register_address_offset,
+                discovery.offset,
+            )
+            client.register_address_offset = discovery.offset
+        addresses = discovery.implemented_addresses()
+        if not addresses:
+            return
+        self.sunspec_models = discovery.models
+        self.unimplemented_registers = discovery.unimplemented or frozenset()
+        self._set_read_plan(self._build_read_plan(addresses, self.max_batch_size))
+        _LOGGER.debug(
+            "SunSpec models %s; reading %d of %d registers in %d batches",
+            [model.model_id for model in discovery.models],
+            len(addresses),
+            len(APSTORAGE_REGISTERS),
+            len(self._read_plan),
+        )
+
+    async def _async_update_data(self) -> APstorageSnapshot:
+        """Fetch data from the device and schedule the next staggered poll."""
+        started = time.monotonic()
+        try:
+            return await self._async_poll()
+        finally:
+            self._schedule_next_poll(time.monotonic() - started)
+
+    def _schedule_next_poll(self, duration: float) -> None:
+        """Move the next refresh to this entry's phase slot on its link."""
+        scheduler = self.poll_scheduler
+        if scheduler is None or self.entry_id is None:
+            return
+        scheduler.record_duration(self.entry_id, duration)
+        self.update_interval = timedelta(seconds=scheduler.next_delay(self.entry_id))
+
+    async def _async_poll(self) -> APstorageSnapshot:
+        """Read all batches and decode them into a snapshot."""
         try:
             if self.modbus_client.should_defer_reads() and getattr(self, "data", None):
                 _LOGGER.debug(
@@ -589,81 +1079,408 @@ class APstorageCoordinator(DataUpdateCoordinator):
                 )
                 return self.data
 
-            data = {}
-            raw_by_address: dict[int, list[int]] = {}
+            if self.pipeline is not None:
+                frames = await self._async_read_frames_pipelined()
+            else:
+                frames = await self._async_read_frames()
+            received, received_wall = time.monotonic(), time.time()
+            snapshot = self._apply_heartbeat(self._decode_frames(frames), received)
+            if self.recorder is not None:
+                # Log the poll at device time, mapped onto the wall clock, so
+                # record spacing follows the heartbeat rather than host jitter.
+                device_time = snapshot.device_time
+                self.recorder.async_record(
+                    frames,
+                    received_wall if device_time is None else received_wall + device_time - received,
+                )
+            if not self.entity_ids_migrated:
+                self._async_migrate_entity_ids(snapshot)
+            return snapshot
+        except UpdateFailed:
+            raise
+        except Exception as err:  # pragma: no cover
+            raise UpdateFailed(err) from err
+
+    async def _async_read_frames(
+        self, plan: list[BatchDecoder] | None = None
+    ) -> list[tuple[BatchDecoder, bytes | None]]:
+        """Read every batch in turn through the pymodbus client."""
+        frames: list[tuple[BatchDecoder, bytes | None]] = []
 
-            # Read configured registers in contiguous batches to reduce Modbus requests.
-            for batch_start, batch_end in self._build_read_batches():
-                count = batch_end - batch_start + 1
-                batch_registers = await self.hass.async_add_executor_job(
-                    self.modbus_client.read_registers, batch_start, count
+        # Read configured registers in contiguous batches to reduce Modbus requests.
+        for decoder in self._read_plan if plan is None else plan:
+            batch_registers = await self.hass.async_add_executor_job(
+                self.modbus_client.read_registers, decoder.start, decoder.count
+            )
+            if batch_registers is None or len(batch_registers) < decoder.count:
+                _LOGGER.debug(
+                    "Batch register read returned no data for start=%d end=%d count=%d",
+                    decoder.start,
+                    decoder.start + decoder.count - 1,
+                    decoder.count,
                 )
-                if batch_registers is None:
-                    _LOGGER.debug(
-                        "Batch register read returned no data for start=%d end=%d count=%d",
-                        batch_start,
-                        batch_end,
-                        count,
-                    )
+                frames.append((decoder, None))
+                continue
+            frames.append((decoder, decoder.pack(batch_registers[: decoder.count])))
+        return frames
+
+    async def _async_read_frames_pipelined(
+        self, plan: list[BatchDecoder] | None = None
+    ) -> list[tuple[BatchDecoder, bytes | None]]:
+        """Send every batch request back to back and collect the raw frames."""
+        if plan is None:
+            plan = self._read_plan
+        client = self.modbus_client
+        payloads = await self.pipeline.async_read_many(
+            client.unit,
+            [(client.to_wire_address(decoder.start), decoder.count) for decoder in plan],
+        )
+        # Response payloads are already the big-endian frames the decoders expect.
+        return [
+            (decoder, payload if payload is not None and len(payload) == decoder.count * 2 else None)
+            for decoder, payload in zip(plan, payloads)
+        ]
+
+    def build_sample_plan(self, addresses: frozenset[int]) -> list[BatchDecoder]:
+        """Return the minimal read plan for a few registers sampled outside polls."""
+        return self._build_read_plan(addresses, self.max_batch_size)
+
+    async def async_sample(
+        self, plan: list[BatchDecoder]
+    ) -> list[tuple[BatchDecoder, bytes | None]]:
+        """Read a sample plan without touching poll state or change detection.
+
+        Values are decoded with the scale factors of the last poll.
+        """
+        if self.pipeline is not None:
+            return await self._async_read_frames_pipelined(plan)
+        return await self._async_read_frames(plan)
+
+    def decode_sample(
+        self, frames: list[tuple[BatchDecoder, bytes | None]]
+    ) -> dict[int, Any]:
+        """Decode sampled frames into {address: value}; unread registers are omitted."""
+        values = new_value_list()
+        decoded: dict[int, Any] = {}
+        for decoder, frame in frames:
+            if frame is None:
+                continue
+            decoder.decode_into(values, frame, decoder.unpack(frame), self._scale_factors)
+            for address in decoder.addresses:
+                decoded[address] = values[REGISTER_INDEX[address]]
+        return decoded
+
+    def _decode_frames(
+        self,
+        frames: list[tuple[BatchDecoder, bytes | None]],
+        now: float | None = None,
+    ) -> APstorageSnapshot:
+        """Decode the batches whose raw frame changed since the previous poll.
+
+        A frame of ``None`` marks a batch that could not be read. Its last
+        values stay published, flagged stale, while the grace policy allows;
+        after that its registers are dropped. When nothing changed the
+        previous snapshot object is returned as-is, so the coordinator skips
+        listener dispatch entirely.
+        """
+        if now is None:
+            now = time.monotonic()
+        previous = self._last_snapshot
+        changed: list[tuple[BatchDecoder, bytes]] = []
+        failed: list[BatchDecoder] = []
+        stale_changed: list[BatchDecoder] = []
+        for decoder, frame in frames:
+            start = decoder.start
+            stats = self._batch_stats[start]
+            stats["polls"] += 1
+            if frame is None:
+                stats["failed"] += 1
+                failures = self._batch_failures.get(start, 0) + 1
+                self._batch_failures[start] = failures
+                if self._frames.get(start) is None:
+                    continue
+                if self._batch_in_grace(start, failures, now):
+                    if start not in self._stale_batches:
+                        self._stale_batches.add(start)
+                        stale_changed.append(decoder)
+                    # Decode again once the batch reads successfully.
+                    self._frames[start] = b""
                     continue
+                _LOGGER.debug(
+                    "Dropping APstorage registers %d-%d after %d failed reads",
+                    start,
+                    start + decoder.count - 1,
+                    failures,
+                )
+                del self._frames[start]
+                self.raw_frames.pop(start, None)
+                self._stale_batches.discard(start)
+                failed.append(decoder)
+                continue
 
-                for address, (_, reg_count, _, _, _, _) in APSTORAGE_REGISTERS.items():
-                    if address < batch_start:
-                        continue
-                    reg_end = address + reg_count - 1
-                    if reg_end > batch_end:
-                        continue
-                    if address in raw_by_address:
-                        continue
+            self._batch_failures[start] = 0
+            self._batch_sampled[start] = now
+            self.raw_frames[start] = frame
+            if start in self._stale_batches:
+                self._stale_batches.discard(start)
+                stale_changed.append(decoder)
+            if previous is not None and self._frames.get(start) == frame:
+                stats["unchanged"] += 1
+                continue
+            self._frames[start] = frame
+            changed.append((decoder, frame))
+
+        if previous is not None and not changed and not failed and not stale_changed:
+            self.changed_addresses = frozenset()
+            return previous
+
+        # Scale factors only need re-resolving when a batch carrying them changed.
+        scale_factors = dict(self._scale_factors)
+        for decoder in failed:
+            for address, _ in decoder.scale_factor_fields:
+                scale_factors.pop(address, None)
+        unpacked = []
+        for decoder, frame in changed:
+            raw = decoder.unpack(frame)
+            decoder.collect_scale_factors(raw, scale_factors)
+            unpacked.append((decoder, frame, raw))
+
+        if scale_factors != self._scale_factors and previous is not None:
+            # A scale factor moved: every batch must be re-decoded with it.
+            changed_starts = {decoder.start for decoder, _ in changed}
+            unpacked.extend(
+                (decoder, frame, decoder.unpack(frame))
+                for decoder, frame in frames
+                if frame is not None and decoder.start not in changed_starts
+            )
+        self._scale_factors = scale_factors
 
-                    offset = address - batch_start
-                    registers = batch_registers[offset : offset + reg_count]
-                    if len(registers) == reg_count:
-                        raw_by_address[address] = registers
-
-            # Resolve scale factors from previously read register data.
-            scale_factors = {}
-            for value_reg, scale_reg in APSTORAGE_SCALE_REGISTERS.items():
-                scale_regs = raw_by_address.get(scale_reg)
-                if scale_regs is not None:
-                    # Signed 16-bit for scale factor
-                    sf = scale_regs[0]
-                    if sf > 32767:
-                        sf = sf - 65536
-                    scale_factors[value_reg] = sf
-                else:
-                    _LOGGER.debug(
-                        "Scale factor register %d could not be read for value register %d",
-                        scale_reg,
-                        value_reg,
-                    )
+        missing_scale_registers = self._scale_registers.difference(scale_factors)
+        if missing_scale_registers:
+            _LOGGER.debug(
+                "Scale factor registers could not be read: %s",
+                sorted(missing_scale_registers),
+            )
+
+        values = previous.copy_values() if previous is not None else new_value_list()
+        changed_addresses: set[int] = set()
+        for decoder in failed:
+            decoder.clear_into(values)
+            changed_addresses.update(decoder.addresses)
+        for decoder in stale_changed:
+            changed_addresses.update(decoder.addresses)
+        for decoder, frame, raw in unpacked:
+            decoder.decode_into(values, frame, raw, scale_factors)
+            changed_addresses.update(decoder.addresses)
+        snapshot = APstorageSnapshot(
+            values,
+            stale_addresses=frozenset(
+                address
+                for decoder in self._read_plan
+                if decoder.start in self._stale_batches
+                for address in decoder.addresses
+            ),
+        )
+
+        if not snapshot:
+            self._last_snapshot = None
+            self._frames.clear()
+            self.raw_frames.clear()
+            self._stale_batches.clear()
+            self._scale_factors = {}
+            raise UpdateFailed(
+                "No APstorage registers could be read; enable debug logging for custom_components.apstorage_ha to inspect Modbus failures"
+            )
 
-            # Decode all configured registers from raw values.
-            for address, (name, count, value_type, scale, unit, _) in APSTORAGE_REGISTERS.items():
-                registers = raw_by_address.get(address)
-                if registers is not None:
-                    # Use dynamic scale factor if available
-                    if address in scale_factors:
-                        sf = scale_factors[address]
-                        decoded = self.modbus_client.decode_register(registers, value_type, 1)
-                        value = decoded * (10 ** sf)
-                    else:
-                        value = self.modbus_client.decode_register(registers, value_type, scale)
-                    data[address] = {
-                        "name": name,
-                        "value": value,
-                        "unit": unit,
-                        "type": value_type,
-                    }
-                else:
-                    _LOGGER.debug("Register read returned no data for %s (%d)", name, address)
-
-            if not data:
-                raise UpdateFailed(
-                    "No APstorage registers could be read; enable debug logging for custom_components.apstorage_ha to inspect Modbus failures"
+        self.changed_addresses = frozenset(changed_addresses) if previous is not None else None
+        if self.registers_changed(IDENTITY_REGISTERS):
+            identity = tuple(snapshot.value(address) for address in IDENTITY_REGISTERS)
+            if identity != self._identity:
+                self._identity = identity
+                self.identity_version += 1
+        self._last_snapshot = snapshot
+        return snapshot
+
+    def _batch_in_grace(self, start: int, failures: int, now: float) -> bool:
+        """Return True while a failing batch may keep publishing its last values.
+
+        Grace lasts until both the failed-poll and the data-age limits are
+        exceeded; setting both to 0 disables it.
+        """
+        sampled = self._batch_sampled.get(start)
+        if sampled is None:
+            return False
+        return failures <= self.stale_grace_polls or (now - sampled) <= self.stale_grace_seconds
+
+    def data_age(self, address: int, now: float | None = None) -> float | None:
+        """Return seconds since a register was last read from a live device."""
+        if now is None:
+            now = time.monotonic()
+        if self.device_stale and self._heartbeat_monotonic is not None:
+            return now - self._heartbeat_monotonic
+        sampled = self._batch_sampled.get(self._batch_of.get(address))
+        return None if sampled is None else now - sampled
+
+    def _apply_heartbeat(self, snapshot: APstorageSnapshot, now: float) -> APstorageSnapshot:
+        """Timestamp a snapshot in device time, or mark data stale if frozen.
+
+        When the controller heartbeat did not advance, the BMS controller is
+        not updating its registers, so the last published values are returned
+        flagged as stale instead of republishing the frozen frame.
+        """
+        if snapshot.is_stale(HEARTBEAT_REGISTER) and not snapshot.stale:
+            # The heartbeat batch failed this poll; its value says nothing.
+            snapshot.device_time = self._device_time
+            return snapshot
+
+        heartbeat = snapshot.value(HEARTBEAT_REGISTER)
+        if not isinstance(heartbeat, int):
+            self._heartbeat = None
+            snapshot.device_time = now
+            return snapshot
+
+        if self._heartbeat is not None and self._heartbeat_monotonic is not None:
+            delta = (heartbeat - self._heartbeat) & 0xFFFF
+            elapsed = now - self._heartbeat_monotonic
+            if delta == 0:
+                if elapsed < self._HEARTBEAT_MIN_ELAPSED_SECONDS:
+                    snapshot.device_time = self._device_time
+                    return snapshot
+                return self._mark_stale(snapshot, elapsed)
+            if abs(delta - elapsed) > max(self._HEARTBEAT_RESYNC_SECONDS, elapsed / 2):
+                _LOGGER.debug(
+                    "APstorage heartbeat jumped by %d over %.1f seconds; resyncing device time",
+                    delta,
+                    elapsed,
                 )
+                device_time = now
+            else:
+                device_time = self._device_time + delta
+        else:
+            device_time = now
+
+        if self.device_stale:
+            _LOGGER.info("APstorage controller heartbeat resumed; data is fresh again")
+            self.device_stale = False
+        self._heartbeat = heartbeat
+        self._heartbeat_monotonic = now
+        self._device_time = device_time
+        snapshot.device_time = device_time
+        return snapshot
+
+    def _mark_stale(self, snapshot: APstorageSnapshot, elapsed: float) -> APstorageSnapshot:
+        """Return the last published values flagged as stale."""
+        published = self.data if isinstance(self.data, APstorageSnapshot) else None
+        if published is None:
+            return snapshot
+        if published.stale:
+            self.changed_addresses = frozenset()
+            return published
 
-            return data
-        except Exception as err:  # pragma: no cover
-            raise UpdateFailed(err) from err
+        _LOGGER.warning(
+            "APstorage controller heartbeat has not advanced for %.1f seconds; marking data stale",
+            elapsed,
+        )
+        self.device_stale = True
+        stale = published.copy()
+        stale.stale = True
+        # Decode every batch again once the heartbeat resumes.
+        self._frames.clear()
+        self._last_snapshot = stale
+        self.changed_addresses = None
+        return stale
+
+    def _async_migrate_entity_ids(self, snapshot: APstorageSnapshot) -> None:
+        """Rename this entry's entities in one pass once the serial is known."""
+        if self.entry_id is None or not get_serial_number(snapshot):
+            return
+        renamed = async_migrate_config_entry_entity_ids(self.hass, self.entry_id, snapshot)
+        if renamed:
+            _LOGGER.info("Renamed %d APstorage entities to serial-prefixed entity IDs", renamed)
+        self.entity_ids_migrated = True
+
+    def registers_changed(self, addresses: tuple[int, ...]) -> bool:
+        """Return True if any of the given registers changed in the last poll."""
+        changed = self.changed_addresses
+        return changed is None or not changed.isdisjoint(addresses)
+
+    def async_set_optimistic_value(self, address: int, value: Any) -> None:
+        """Show a just-requested value until the next poll reads the device."""
+        if not self.data or address not in self.data:
+            return
+        self.data.set_value(address, value)
+        # Force the batch holding this register to be decoded on the next poll
+        # even if the device frame did not change.
+        for decoder in self._read_plan:
+            if address in decoder.addresses and decoder.start in self._frames:
+                self._frames[decoder.start] = b""
+
+    def async_apply_settings(
+        self,
+        scan_interval: timedelta,
+        connection_max_age_seconds: int,
+        stale_grace_polls: int,
+        stale_grace_seconds: int,
+    ) -> None:
+        """Apply changed options to the live coordinator and Modbus client.
+
+        The register address offset is left alone: SunSpec discovery may have
+        corrected it at setup, and it only changes on a reload.
+        """
+        self.scan_interval = scan_interval
+        self.update_interval = scan_interval
+        self.stale_grace_polls = max(0, int(stale_grace_polls))
+        self.stale_grace_seconds = max(0, int(stale_grace_seconds))
+
+        client = self.modbus_client
+        client.connection_max_age_seconds = max(0, int(connection_max_age_seconds))
+        if client.bus is not None:
+            client.bus.max_age_seconds = client.connection_max_age_seconds
+
+    def async_start_zero_export(self, target: float) -> None:
+        """Start the zero-export control loop holding grid power at ``target`` W."""
+        if self.controller is None:
+            self.controller = APstorageZeroExportController(self)
+        self.controller.target = float(target)
+        self.controller.async_start()
+
+    async def async_stop_zero_export(self) -> None:
+        """Stop the zero-export control loop if it runs."""
+        if self.controller is not None and self.controller.running:
+            await self.controller.async_stop()
+
+    def async_start_raw_recorder(self) -> None:
+        """Start appending every poll's raw frames to the binary log."""
+        if self.recorder is None:
+            self.recorder = APstorageFrameRecorder(
+                self.hass,
+                self.hass.config.path(RAW_RECORDER_DIRECTORY),
+                self.entry_id or DOMAIN,
+            )
 
+    async def async_stop_raw_recorder(self) -> None:
+        """Stop the raw frame log and write what it still buffers."""
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            await recorder.async_stop()
+
+    def async_notify_register_changed(self, address: int) -> None:
+        """Push an out-of-poll change of one register to the entities."""
+        self.changed_addresses = frozenset((address,))
+        self.async_update_listeners()
+
+    def batch_statistics(self) -> list[dict[str, Any]]:
+        """Return per-batch read and change-detection counters."""
+        statistics = []
+        for decoder in self._read_plan:
+            stats = self._batch_stats[decoder.start]
+            read = stats["polls"] - stats["failed"]
+            statistics.append(
+                {
+                    "start": decoder.start,
+                    "count": decoder.count,
+                    **stats,
+                    "unchanged_ratio": round(stats["unchanged"] / read, 3) if read else None,
+                }
+            )
+        return statistics
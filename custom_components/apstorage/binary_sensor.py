@@ -16,7 +16,7 @@ from homeassistant.helpers.entity import EntityCategory
 from . import APstorageCoordinator
 from .const import DOMAIN, BATTERY_ALARM_BITS, LOGGER_NAME, PCS_ALARM_BITS
 from .entity_base import APstorageEntityMixin
-from .entity_naming import async_migrate_entity_id, get_suggested_object_id
+from .snapshot import get_register_value
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
@@ -28,32 +28,35 @@ async def async_setup_entry(
     coordinator: APstorageCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
 
     entities = []
-    
+    unimplemented = coordinator.unimplemented_registers
+
     # Battery Event 1 Bitfield (address 40096)
-    for bit, name in BATTERY_ALARM_BITS.items():
-        entities.append(
-            APstorageAlarmBinarySensor(
-                coordinator,
-                entry,
-                40096,
-                bit,
-                f"Battery Alarm: {name}",
-                "battery_alarm",
+    if 40096 not in unimplemented:
+        for bit, name in BATTERY_ALARM_BITS.items():
+            entities.append(
+                APstorageAlarmBinarySensor(
+                    coordinator,
+                    entry,
+                    40096,
+                    bit,
+                    f"Battery Alarm: {name}",
+                    "battery_alarm",
+                )
             )
-        )
-    
+
     # PCS Alarm Bitfield (address 40100)
-    for bit, name in PCS_ALARM_BITS.items():
-        entities.append(
-            APstorageAlarmBinarySensor(
-                coordinator,
-                entry,
-                40100,
-                bit,
-                f"PCS Alarm: {name}",
-                "pcs_alarm",
+    if 40100 not in unimplemented:
+        for bit, name in PCS_ALARM_BITS.items():
+            entities.append(
+                APstorageAlarmBinarySensor(
+                    coordinator,
+                    entry,
+                    40100,
+                    bit,
+                    f"PCS Alarm: {name}",
+                    "pcs_alarm",
+                )
             )
-        )
 
     async_add_entities(entities, True)
 
@@ -76,6 +79,7 @@ class APstorageAlarmBinarySensor(APstorageEntityMixin, BinarySensorEntity):
         self._bit_number = bit_number
         self._name = name
         self._alarm_type = alarm_type
+        self._watched_addresses = (register_address,)
 
     @property
     def name(self) -> str:
@@ -90,7 +94,7 @@ class APstorageAlarmBinarySensor(APstorageEntityMixin, BinarySensorEntity):
     @property
     def suggested_object_id(self) -> str | None:
         """Return the preferred object ID for this binary sensor."""
-        return get_suggested_object_id(self._coordinator.data, self._name)
+        return self._cached_suggested_object_id()
 
     @property
     def device_class(self) -> str | None:
@@ -105,16 +109,15 @@ class APstorageAlarmBinarySensor(APstorageEntityMixin, BinarySensorEntity):
     @property
     def is_on(self) -> bool | None:
         """Return true if the alarm bit is set."""
-        if self._coordinator.data and self._register_address in self._coordinator.data:
-            bitfield_value = self._coordinator.data[self._register_address].get("value")
-            if bitfield_value is not None:
-                return bool((bitfield_value >> self._bit_number) & 1)
+        bitfield_value = get_register_value(self._coordinator.data, self._register_address)
+        if bitfield_value is not None:
+            return bool((bitfield_value >> self._bit_number) & 1)
         return None
 
     @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self._coordinator.last_update_success
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return stale/data_age attributes while showing last-known values."""
+        return self._freshness_attributes()
 
     @property
     def should_poll(self) -> bool:
@@ -131,24 +134,9 @@ class APstorageAlarmBinarySensor(APstorageEntityMixin, BinarySensorEntity):
         """Register with coordinator."""
         await super().async_added_to_hass()
         self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+            self._coordinator.async_add_listener(self._async_handle_coordinator_update)
         )
 
-        self._async_ensure_prefixed_entity_id()
-
-    def _async_ensure_prefixed_entity_id(self) -> None:
-        """Rename the entity once the device serial number is available."""
-        try:
-            async_migrate_entity_id(
-                self.hass,
-                self.entity_id,
-                self._coordinator.data,
-                self._name,
-            )
-        except ValueError:
-            _LOGGER.warning("Unable to rename entity %s", self.entity_id)
-
     async def async_update(self) -> None:
         """Update via coordinator."""
         await self._coordinator.async_request_refresh()
-        self._async_ensure_prefixed_entity_id()
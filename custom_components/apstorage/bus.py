@@ -0,0 +1,302 @@
+"""Modbus links shared by several APstorage unit IDs.
+
+Units daisy-chained on one serial port share an ``APstorageRtuBus``; units
+behind one Modbus TCP gateway share an ``APstorageTcpPool``. Both hand their
+connections to unit IDs in round-robin order and keep per-unit metrics.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import CONNECTION_RTU, CONNECTION_TCP, DATA_MODBUS_BUSES, LOGGER_NAME
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# Modbus RTU frames are separated by at least 3.5 character times; above
+# 19200 baud the spec fixes the gap at 1.75 ms.
+_RTU_BITS_PER_CHARACTER = 11
+_RTU_FIXED_FRAME_GAP_SECONDS = 0.00175
+
+
+def rtu_frame_gap(baudrate: int) -> float:
+    """Return the minimum silent interval between RTU frames in seconds."""
+    if baudrate > 19200:
+        return _RTU_FIXED_FRAME_GAP_SECONDS
+    return 3.5 * _RTU_BITS_PER_CHARACTER / baudrate
+
+
+class _Connection:
+    """One pymodbus client of a shared link."""
+
+    __slots__ = ("client", "connected_at", "ready_at")
+
+    def __init__(self) -> None:
+        self.client: Any = None
+        self.connected_at: float | None = None
+        self.ready_at = 0.0
+
+
+class APstorageModbusBus:
+    """A fixed number of pymodbus connections shared across unit IDs.
+
+    Transactions take a free connection; when units are waiting, the next
+    free connection goes to the unit ID after the one served last, so a unit
+    reading many batches cannot starve the others. A connection is reused no
+    sooner than ``frame_gap`` seconds after its previous transaction ended.
+    """
+
+    # Reopen a connection when a unit gets an error reply.
+    reopen_on_error = True
+
+    def __init__(
+        self,
+        key: str,
+        connections: int = 1,
+        frame_gap: float = 0.0,
+        max_age_seconds: int = 0,
+    ) -> None:
+        self.key = key
+        self.frame_gap = frame_gap
+        self.max_age_seconds = max(0, int(max_age_seconds))
+        self.users = 0
+        self._connections = [_Connection() for _ in range(max(1, int(connections)))]
+        self._free = deque(self._connections)
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._waiters: dict[int, deque[object]] = {}
+        self._granted: dict[object, _Connection] = {}
+        self._last_unit: int | None = None
+        self.transactions: dict[int, int] = {}
+        self._metrics: dict[int, dict[str, float]] = {}
+
+    @property
+    def _current(self) -> _Connection:
+        """Return the connection held by this thread.
+
+        Connections may only be used, opened or closed inside a channel;
+        outside one, any connection may be mid-transaction for another unit.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            raise RuntimeError(f"No connection of Modbus link {self.key} is held by this thread")
+        return connection
+
+    @property
+    def client(self) -> Any:
+        """Return the pymodbus client of the connection held by this thread."""
+        return self._current.client
+
+    @client.setter
+    def client(self, client: Any) -> None:
+        self._current.client = client
+
+    def channel(self, unit: int) -> APstorageBusChannel:
+        """Return a reusable context manager holding a connection for one unit."""
+        return APstorageBusChannel(self, unit)
+
+    def acquire(self, unit: int) -> None:
+        """Block until this unit gets a connection."""
+        requested = time.monotonic()
+        with self._condition:
+            if self._free and not any(self._waiters.values()):
+                connection = self._free.popleft()
+            else:
+                ticket = object()
+                self._waiters.setdefault(unit, deque()).append(ticket)
+                while ticket not in self._granted:
+                    self._condition.wait()
+                connection = self._granted.pop(ticket)
+            self._last_unit = unit
+            self.transactions[unit] = self.transactions.get(unit, 0) + 1
+            metrics = self._unit_metrics(unit)
+            metrics["wait_seconds"] += time.monotonic() - requested
+        self._local.connection = connection
+        self._local.unit = unit
+        self._local.started = time.monotonic()
+        delay = connection.ready_at - self._local.started
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self) -> None:
+        """Return this thread's connection to the next waiting unit."""
+        connection = self._local.connection
+        now = time.monotonic()
+        self._local.connection = None
+        with self._condition:
+            self._unit_metrics(self._local.unit)["busy_seconds"] += now - self._local.started
+            connection.ready_at = now + self.frame_gap
+            ticket = self._next_waiter()
+            if ticket is None:
+                self._free.append(connection)
+            else:
+                self._granted[ticket] = connection
+                self._condition.notify_all()
+
+    def _next_waiter(self) -> object | None:
+        """Pop the first ticket of the next unit ID that has waiters."""
+        units = sorted(unit for unit, tickets in self._waiters.items() if tickets)
+        if not units:
+            return None
+        if self._last_unit is not None:
+            units = [unit for unit in units if unit > self._last_unit] or units
+        return self._waiters[units[0]].popleft()
+
+    def _unit_metrics(self, unit: int) -> dict[str, float]:
+        metrics = self._metrics.get(unit)
+        if metrics is None:
+            metrics = self._metrics[unit] = {
+                "failures": 0,
+                "wait_seconds": 0.0,
+                "busy_seconds": 0.0,
+            }
+        return metrics
+
+    def record_failure(self, unit: int) -> None:
+        """Count a failed transaction for a unit."""
+        with self._condition:
+            self._unit_metrics(unit)["failures"] += 1
+
+    def unit_metrics(self, unit: int) -> dict[str, float]:
+        """Return transaction counters and times for one unit ID."""
+        with self._condition:
+            metrics = dict(self._unit_metrics(unit))
+            metrics["transactions"] = self.transactions.get(unit, 0)
+        for name in ("wait_seconds", "busy_seconds"):
+            metrics[name] = round(metrics[name], 3)
+        return metrics
+
+    def connect(self, create_client: Callable[[], Any], force_reconnect: bool = False) -> bool:
+        """Open this thread's connection if needed and return True when open."""
+        connection = self._current
+        now = time.monotonic()
+        if connection.client is not None and getattr(connection.client, "connected", True):
+            expired = (
+                self.max_age_seconds > 0
+                and connection.connected_at is not None
+                and now - connection.connected_at >= self.max_age_seconds
+            )
+            if not expired and not (force_reconnect and self.reopen_on_error):
+                return True
+
+        self._close(connection)
+        connection.client = create_client()
+        if not connection.client.connect():
+            _LOGGER.error("Failed to open shared Modbus connection %s", self.key)
+            connection.client = None
+            connection.connected_at = None
+            return False
+        connection.connected_at = now
+        _LOGGER.info("Opened shared Modbus connection %s", self.key)
+        return True
+
+    def _close(self, connection: _Connection) -> None:
+        if connection.client is not None:
+            try:
+                connection.client.close()
+            except Exception as err:  # pragma: no cover
+                _LOGGER.debug("Error closing Modbus connection %s: %s", self.key, err)
+        connection.client = None
+        connection.connected_at = None
+
+    def close(self) -> None:
+        """Close every connection of the link."""
+        with self._condition:
+            for connection in self._connections:
+                self._close(connection)
+
+
+class APstorageRtuBus(APstorageModbusBus):
+    """The single serial client of a port, with RTU inter-frame timing."""
+
+    # An error reply from one unit says nothing about the serial port itself.
+    reopen_on_error = False
+
+    def __init__(self, port: str, baudrate: int) -> None:
+        super().__init__(port, 1, rtu_frame_gap(baudrate))
+        self.port = port
+        self.baudrate = baudrate
+
+
+class APstorageTcpPool(APstorageModbusBus):
+    """Connections to one Modbus TCP gateway shared by every unit behind it."""
+
+    def __init__(
+        self, host: str, port: int, connections: int, max_age_seconds: int = 0
+    ) -> None:
+        super().__init__(f"{host}:{port}", connections, 0.0, max_age_seconds)
+        self.host = host
+        self.port = port
+
+
+class APstorageBusChannel:
+    """Context manager that holds a shared connection for one unit ID."""
+
+    __slots__ = ("_bus", "_unit")
+
+    def __init__(self, bus: APstorageModbusBus, unit: int) -> None:
+        self._bus = bus
+        self._unit = unit
+
+    def __enter__(self) -> APstorageBusChannel:
+        self._bus.acquire(self._unit)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._bus.release()
+
+
+def _async_add_bus_user(
+    hass: HomeAssistant, key: str, factory: Callable[[], APstorageModbusBus]
+) -> APstorageModbusBus:
+    """Return the shared link for a key, creating it on first use."""
+    buses: dict[str, APstorageModbusBus] = hass.data.setdefault(DATA_MODBUS_BUSES, {})
+    bus = buses.get(key)
+    if bus is None:
+        bus = buses[key] = factory()
+    bus.users += 1
+    return bus
+
+
+def async_get_rtu_bus(hass: HomeAssistant, port: str, baudrate: int) -> APstorageRtuBus:
+    """Return the shared bus for a serial port."""
+    bus = _async_add_bus_user(
+        hass, f"{CONNECTION_RTU}:{port}", lambda: APstorageRtuBus(port, baudrate)
+    )
+    if bus.baudrate != baudrate:
+        _LOGGER.warning(
+            "Serial port %s is already open at %d baud; ignoring %d baud for this unit",
+            port,
+            bus.baudrate,
+            baudrate,
+        )
+    return bus
+
+
+def async_get_tcp_pool(
+    hass: HomeAssistant, host: str, port: int, connections: int, max_age_seconds: int
+) -> APstorageTcpPool:
+    """Return the shared connection pool for a Modbus TCP endpoint."""
+    return _async_add_bus_user(
+        hass,
+        f"{CONNECTION_TCP}:{host}:{port}",
+        lambda: APstorageTcpPool(host, port, connections, max_age_seconds),
+    )
+
+
+async def async_release_bus(hass: HomeAssistant, bus: APstorageModbusBus) -> None:
+    """Drop one user of a shared link and close it when nobody uses it."""
+    bus.users -= 1
+    if bus.users > 0:
+        return
+    buses = hass.data.get(DATA_MODBUS_BUSES, {})
+    for key, shared in list(buses.items()):
+        if shared is bus:
+            del buses[key]
+    await hass.async_add_executor_job(bus.close)
@@ -0,0 +1,183 @@
+"""On-demand high-rate capture of a few registers, returned as a service response."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import statistics
+import time
+from array import array
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    APSTORAGE_REGISTERS,
+    CAPTURE_MAX_RATE_HZ,
+    LOGGER_NAME,
+    NUMERIC_REGISTER_TYPES,
+)
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+class APstorageCapture:
+    """Samples a few registers as fast as asked for a short window.
+
+    The capture reads a minimal plan covering only the requested registers,
+    at the target rate or back to back when no rate is given, into arrays
+    sized for the whole window up front; a link faster than
+    ``CAPTURE_MAX_RATE_HZ`` doubles them rather than ending the window early. It does not touch poll state,
+    entity values or change detection, so regular polls carry on as before
+    once the window ends. One capture runs at a time per battery.
+    """
+
+    def __init__(self, coordinator: APstorageCoordinator) -> None:
+        self._coordinator = coordinator
+        self._lock = asyncio.Lock()
+        self.captures = 0
+        self.last_summary: dict[str, Any] | None = None
+
+    @staticmethod
+    def _validate(registers: Sequence[int]) -> tuple[int, ...]:
+        registers = tuple(dict.fromkeys(registers))
+        invalid = [
+            address
+            for address in registers
+            if address not in APSTORAGE_REGISTERS
+            or APSTORAGE_REGISTERS[address][2] not in NUMERIC_REGISTER_TYPES
+        ]
+        if invalid or not registers:
+            raise HomeAssistantError(f"Registers {invalid} are not numeric APstorage registers")
+        return registers
+
+    async def async_capture(
+        self,
+        registers: Sequence[int],
+        duration: float,
+        rate: float | None = None,
+        include_raw: bool = False,
+    ) -> dict[str, Any]:
+        """Capture the registers for ``duration`` seconds and return the samples.
+
+        Timestamps are seconds since ``started``, taken when each read was
+        sent. A sample is recorded only if every batch of the plan was read.
+        """
+        registers = self._validate(registers)
+        if self._lock.locked():
+            raise HomeAssistantError("A capture is already running for this battery")
+        async with self._lock:
+            return await self._async_capture(registers, duration, rate, include_raw)
+
+    async def _async_capture(
+        self,
+        registers: tuple[int, ...],
+        duration: float,
+        rate: float | None,
+        include_raw: bool,
+    ) -> dict[str, Any]:
+        coordinator = self._coordinator
+        plan = coordinator.build_sample_plan(frozenset(registers))
+        period = 1.0 / rate if rate else 0.0
+        capacity = max(1, math.ceil(duration * (rate or CAPTURE_MAX_RATE_HZ)))
+        width = len(registers)
+        word_count = sum(decoder.count for decoder in plan)
+        timestamps = array("d", bytes(8 * capacity))
+        values = array("d", bytes(8 * capacity * width))
+        raw = array("H", bytes(2 * capacity * word_count)) if include_raw else None
+
+        started_at = dt_util.utcnow()
+        started = time.monotonic()
+        deadline = started + duration
+        next_at = started
+        count = failed = 0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if count == capacity:
+                timestamps.frombytes(bytes(8 * capacity))
+                values.frombytes(bytes(8 * capacity * width))
+                if raw is not None:
+                    raw.frombytes(bytes(2 * capacity * word_count))
+                capacity *= 2
+            if next_at > now:
+                if next_at >= deadline:
+                    break
+                await asyncio.sleep(next_at - now)
+            sent = time.monotonic()
+            # A late sample starts the next period; missed slots are not made up.
+            next_at = max(next_at + period, sent)
+            frames = await coordinator.async_sample(plan)
+            if any(frame is None for _, frame in frames):
+                failed += 1
+                continue
+            decoded = coordinator.decode_sample(frames)
+            timestamps[count] = sent - started
+            row = count * width
+            for position, address in enumerate(registers):
+                value = decoded.get(address)
+                values[row + position] = value if isinstance(value, (int, float)) else math.nan
+            if raw is not None:
+                offset = count * word_count
+                for decoder, frame in frames:
+                    raw[offset : offset + decoder.count] = array("H", decoder.words(frame))
+                    offset += decoder.count
+            count += 1
+
+        summary = self._summary(timestamps[:count], period, failed)
+        self.captures += 1
+        self.last_summary = summary
+        _LOGGER.debug("Captured %s: %s", registers, summary)
+        response: dict[str, Any] = {
+            "registers": list(registers),
+            "started": started_at.isoformat(),
+            **summary,
+            "timestamps": [round(timestamp, 4) for timestamp in timestamps[:count]],
+            "values": [
+                [_number(value) for value in values[row * width : (row + 1) * width]]
+                for row in range(count)
+            ],
+        }
+        if raw is not None:
+            response["raw"] = {
+                "batches": [[decoder.start, decoder.count] for decoder in plan],
+                "words": [
+                    raw[row * word_count : (row + 1) * word_count].tolist() for row in range(count)
+                ],
+            }
+        return response
+
+    @staticmethod
+    def _summary(timestamps: Sequence[float], period: float, failed: int) -> dict[str, Any]:
+        """Return the achieved rate and the jitter of the sample intervals."""
+        intervals = [later - earlier for earlier, later in zip(timestamps, timestamps[1:])]
+        span = timestamps[-1] - timestamps[0] if len(timestamps) > 1 else 0.0
+        return {
+            "samples": len(timestamps),
+            "failed_reads": failed,
+            "target_rate": round(1.0 / period, 3) if period else None,
+            "achieved_rate": round((len(timestamps) - 1) / span, 3) if span > 0 else None,
+            "jitter_ms": round(statistics.pstdev(intervals) * 1000, 3) if intervals else None,
+            "max_interval_ms": round(max(intervals) * 1000, 3) if intervals else None,
+        }
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the number of captures and the last capture's timing."""
+        return {
+            "running": self._lock.locked(),
+            "captures": self.captures,
+            "last": self.last_summary,
+        }
+
+
+def _number(value: float) -> int | float | None:
+    """Return integral floats as ints, so unscaled counts read naturally."""
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else round(value, 6)
@@ -1,14 +1,17 @@
 """Config flow for APstorage integration."""
 from __future__ import annotations
 
+import ipaddress
 import logging
+import time
 from typing import Any
 
 import voluptuous as vol
-from homeassistant import config_entries
+from homeassistant import config_entries, data_entry_flow
 from homeassistant.const import CONF_HOST, CONF_PORT
+from homeassistant.core import HomeAssistant
 from homeassistant.helpers.selector import selector
-from serial.tools import list_ports
+from homeassistant.helpers.service_info.usb import UsbServiceInfo
 
 from .const import (
     DOMAIN,
@@ -17,17 +20,48 @@ from .const import (
     CONF_CONNECTION_TYPE,
     CONF_CONNECTION_MAX_AGE_SECONDS,
     CONF_BAUDRATE,
+    CONF_FLEET,
+    CONF_MAX_BATCH_SIZE,
+    CONF_PIPELINE_REQUESTS,
+    CONF_PROXY_BIND_HOST,
+    CONF_PROXY_PORT,
+    CONF_REGISTER_ADDRESS_OFFSET,
+    CONF_STALE_GRACE_POLLS,
+    CONF_STALE_GRACE_SECONDS,
     CONF_UNIT,
+    CONF_DEADBANDS,
+    CONF_RAW_RECORDER,
+    CONF_ZERO_EXPORT,
+    CONF_ZERO_EXPORT_TARGET,
+    DATA_MODBUS_BUSES,
+    DATA_SERIAL_PORTS,
     DEFAULT_CONNECTION_MAX_AGE_SECONDS,
+    DEFAULT_PROXY_BIND_HOST,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_REGISTER_ADDRESS_OFFSET,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STALE_GRACE_POLLS,
+    DEFAULT_STALE_GRACE_SECONDS,
+    DEFAULT_ZERO_EXPORT_TARGET,
     LOGGER_NAME,
+    SERIAL_PORTS_CACHE_SECONDS,
 )
+from . import APstorageCoordinator
+from .deadband import parse_deadbands
+from .probe import ProbeResult, async_probe_tcp, candidates, probe_serial
+from .proxy import is_loopback
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
 
 def _serial_port_options() -> list[dict[str, str]]:
-    """Return available serial ports as Home Assistant selector options."""
+    """Return available serial ports as Home Assistant selector options.
+
+    Scanning ports touches every tty and USB device, so this runs in the
+    executor, and pyserial's port listing is only imported when needed.
+    """
+    from serial.tools import list_ports
+
     options: list[dict[str, str]] = []
     for port in list_ports.comports():
         label = port.device
@@ -37,6 +71,17 @@ def _serial_port_options() -> list[dict[str, str]]:
     return options
 
 
+async def _async_serial_port_options(hass: HomeAssistant) -> list[dict[str, str]]:
+    """Return serial port options, rescanning at most every few seconds."""
+    cached = hass.data.get(DATA_SERIAL_PORTS)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < SERIAL_PORTS_CACHE_SECONDS:
+        return cached[1]
+    options = await hass.async_add_executor_job(_serial_port_options)
+    hass.data[DATA_SERIAL_PORTS] = (now, options)
+    return options
+
+
 class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle APstorage config flow."""
 
@@ -46,18 +91,36 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize the config flow."""
         self.data: dict[str, Any] = {}
         self._reconfigure_entry: config_entries.ConfigEntry | None = None
+        self._probe: ProbeResult | None = None
     
     @staticmethod
     def async_get_options_flow(config_entry: config_entries.ConfigEntry):
         """Get the options flow for this handler."""
         return APstorageOptionsFlowHandler(config_entry)
+
+    @classmethod
+    def async_supports_options_flow(cls, config_entry: config_entries.ConfigEntry) -> bool:
+        """Return True for battery entries; the fleet device has no options."""
+        return not config_entry.data.get(CONF_FLEET)
     
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ):
-        """Handle the initial step."""
+        """Offer a battery connection or the fleet device."""
         self.data = {}
-        return await self.async_step_select_connection(user_input)
+        return self.async_show_menu(
+            step_id="user", menu_options=["select_connection", "fleet"]
+        )
+
+    async def async_step_fleet(
+        self, user_input: dict[str, Any] | None = None
+    ):
+        """Create the single virtual fleet device over all batteries."""
+        await self.async_set_unique_id(CONF_FLEET)
+        self._abort_if_unique_id_configured()
+        if user_input is not None:
+            return self.async_create_entry(title="APstorage Fleet", data={CONF_FLEET: True})
+        return self.async_show_form(step_id="fleet", data_schema=vol.Schema({}))
 
     async def async_step_reconfigure(
         self, user_input: dict[str, Any] | None = None
@@ -68,10 +131,32 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             self._reconfigure_entry = self.hass.config_entries.async_get_entry(entry_id)
             if self._reconfigure_entry is None:
                 return self.async_abort(reason="unknown")
+            if self._reconfigure_entry.data.get(CONF_FLEET):
+                return self.async_abort(reason="fleet_not_reconfigurable")
             self.data = dict(self._reconfigure_entry.data)
 
         return await self.async_step_select_connection(user_input)
 
+    async def async_step_usb(self, discovery_info: UsbServiceInfo):
+        """Handle a USB serial adapter found by Home Assistant."""
+        from homeassistant.components.usb import get_serial_by_id
+
+        device = await self.hass.async_add_executor_job(
+            get_serial_by_id, discovery_info.device
+        )
+        # A port already used by an entry needs no new flow; more units on
+        # the same bus are added by hand.
+        self._async_abort_entries_match({CONF_HOST: device})
+        await self.async_set_unique_id(f"{device}:1")
+        self._abort_if_unique_id_configured()
+
+        self.data = {CONF_CONNECTION_TYPE: CONNECTION_RTU, CONF_HOST: device}
+        label = discovery_info.description or device
+        if discovery_info.manufacturer:
+            label = f"{label} - {discovery_info.manufacturer}"
+        self.context["title_placeholders"] = {"name": label}
+        return await self.async_step_rtu()
+
     async def async_step_select_connection(
         self, user_input: dict[str, Any] | None = None
     ):
@@ -97,9 +182,13 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     ):
         """Configure TCP connection."""
         if user_input is not None:
-            await self._async_abort_if_duplicate_host(user_input[CONF_HOST])
+            await self._async_abort_if_duplicate_unit(
+                user_input[CONF_HOST],
+                user_input.get(CONF_UNIT, 1),
+                user_input.get(CONF_PORT, 502),
+            )
             self.data.update(user_input)
-            return await self.async_step_finish()
+            return await self.async_step_probe()
 
         schema = vol.Schema(
             {
@@ -115,16 +204,18 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     ):
         """Configure RTU connection."""
         if user_input is not None:
-            await self._async_abort_if_duplicate_host(user_input[CONF_HOST])
+            await self._async_abort_if_duplicate_unit(
+                user_input[CONF_HOST], user_input.get(CONF_UNIT, 1)
+            )
             self.data.update(user_input)
-            return await self.async_step_finish()
+            return await self.async_step_probe()
 
         schema = vol.Schema(
             {
                 vol.Required(CONF_HOST, default=self.data.get(CONF_HOST, "")): selector(
                     {
                         "select": {
-                            "options": _serial_port_options(),
+                            "options": await _async_serial_port_options(self.hass),
                             "custom_value": True,
                         }
                     }
@@ -147,14 +238,77 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         )
         return self.async_show_form(step_id="rtu", data_schema=schema)
 
-    async def _async_abort_if_duplicate_host(self, host: str) -> None:
-        """Abort if the selected host/serial port is already configured."""
+    async def _async_abort_if_duplicate_unit(
+        self, host: str, unit: int, port: int | None = None
+    ) -> None:
+        """Abort if this unit ID on the host/serial port is already configured.
+
+        Several units may share one serial port or TCP gateway. Entries
+        created before that was possible use the bare host as unique ID, so
+        they are matched on their stored data instead.
+        """
         if self._reconfigure_entry is not None:
             return
 
-        await self.async_set_unique_id(host)
+        for entry in self._async_current_entries(include_ignore=False):
+            if (
+                entry.data.get(CONF_HOST) == host
+                and int(entry.data.get(CONF_UNIT, 1)) == int(unit)
+                and (port is None or int(entry.data.get(CONF_PORT, 502)) == int(port))
+            ):
+                raise data_entry_flow.AbortFlow("already_configured")
+
+        link = host if port is None else f"{host}:{port}"
+        await self.async_set_unique_id(f"{link}:{unit}")
         self._abort_if_unique_id_configured()
 
+    async def async_step_probe(
+        self, user_input: dict[str, Any] | None = None
+    ):
+        """Detect the unit ID and register offset and measure the link.
+
+        Candidates are checked against the SunSpec header; the first that
+        validates, preferring the values entered, is stored with the entry.
+        Without an answer the entered values are kept unchanged.
+        """
+        host = self.data[CONF_HOST]
+        unit = int(self.data.get(CONF_UNIT, 1))
+        probes = candidates(
+            unit,
+            self.data.get(CONF_REGISTER_ADDRESS_OFFSET, DEFAULT_REGISTER_ADDRESS_OFFSET),
+        )
+        self._probe = None
+        if self.data.get(CONF_CONNECTION_TYPE) == CONNECTION_TCP:
+            self._probe = await async_probe_tcp(
+                self.hass, host, int(self.data.get(CONF_PORT, 502)), probes
+            )
+        elif f"{CONNECTION_RTU}:{host}" not in self.hass.data.get(DATA_MODBUS_BUSES, {}):
+            # A port already opened by another entry cannot be probed.
+            try:
+                self._probe = await self.hass.async_add_executor_job(
+                    probe_serial, host, int(self.data.get(CONF_BAUDRATE, 9600)), probes
+                )
+            except Exception as err:  # pragma: no cover
+                _LOGGER.debug("Probing serial port %s failed: %s", host, err)
+
+        if self._probe is None:
+            _LOGGER.debug("No SunSpec header found on %s; keeping entered settings", host)
+            return await self.async_step_finish()
+
+        _LOGGER.debug("Probe of %s found %s", host, self._probe)
+        if self._probe.unit != unit:
+            await self._async_abort_if_duplicate_unit(
+                host,
+                self._probe.unit,
+                self.data.get(CONF_PORT, 502)
+                if self.data.get(CONF_CONNECTION_TYPE) == CONNECTION_TCP
+                else None,
+            )
+        self.data[CONF_UNIT] = self._probe.unit
+        self.data[CONF_REGISTER_ADDRESS_OFFSET] = self._probe.offset
+        self.data[CONF_MAX_BATCH_SIZE] = self._probe.recommended_batch_size
+        return await self.async_step_finish()
+
     async def async_step_finish(
         self, user_input: dict[str, Any] | None = None
     ):
@@ -171,16 +325,35 @@ class APstorageConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 await self.hass.config_entries.async_reload(self._reconfigure_entry.entry_id)
                 return self.async_abort(reason="reconfigure_successful")
 
-            return self.async_create_entry(title=self.data[CONF_HOST], data=self.data)
+            title = self.data[CONF_HOST]
+            if int(self.data.get(CONF_UNIT, 1)) != 1:
+                title = f"{title} (unit {self.data[CONF_UNIT]})"
+            return self.async_create_entry(title=title, data=self.data)
 
+        scan_interval = int(DEFAULT_SCAN_INTERVAL.total_seconds())
+        probe_summary = "The device did not answer the probe; the entered settings are used."
+        if self._probe is not None:
+            batches = APstorageCoordinator._build_read_batches(
+                max_count=self._probe.recommended_batch_size
+            )
+            scan_interval = self._probe.recommended_scan_interval(batches)
+            probe_summary = (
+                f"Found unit {self._probe.unit} with register offset {self._probe.offset}; "
+                f"round trip {self._probe.rtt * 1000:.0f} ms, "
+                f"batch size {self._probe.recommended_batch_size}."
+            )
         schema = vol.Schema(
             {
                 vol.Optional(
-                    "scan_interval", default=int(DEFAULT_SCAN_INTERVAL.total_seconds())
+                    "scan_interval", default=self.data.get("scan_interval", scan_interval)
                 ): int
             }
         )
-        return self.async_show_form(step_id="finish", data_schema=schema)
+        return self.async_show_form(
+            step_id="finish",
+            data_schema=schema,
+            description_placeholders={"probe_summary": probe_summary},
+        )
 
 
 # Register the config flow
@@ -198,8 +371,25 @@ class APstorageOptionsFlowHandler(config_entries.OptionsFlow):
         self, user_input: dict[str, Any] | None = None
     ):
         """Manage options."""
+        errors: dict[str, str] = {}
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            try:
+                parse_deadbands(user_input.get(CONF_DEADBANDS))
+            except ValueError:
+                errors[CONF_DEADBANDS] = "invalid_deadbands"
+            bind_host = user_input.get(CONF_PROXY_BIND_HOST, DEFAULT_PROXY_BIND_HOST)
+            try:
+                ipaddress.ip_address(bind_host)
+            except ValueError:
+                errors[CONF_PROXY_BIND_HOST] = "invalid_bind_host"
+            if not errors:
+                if not is_loopback(bind_host):
+                    _LOGGER.warning(
+                        "APstorage Modbus proxy bind address %s exposes unauthenticated "
+                        "Set Power writes to the network",
+                        bind_host,
+                    )
+                return self.async_create_entry(title="", data=user_input)
 
         # Get current scan_interval from options or use default
         current_scan_interval = self._config_entry.options.get(
@@ -212,6 +402,27 @@ class APstorageOptionsFlowHandler(config_entries.OptionsFlow):
                 DEFAULT_CONNECTION_MAX_AGE_SECONDS,
             ),
         )
+        current_stale_grace_polls = self._config_entry.options.get(
+            CONF_STALE_GRACE_POLLS, DEFAULT_STALE_GRACE_POLLS
+        )
+        current_stale_grace_seconds = self._config_entry.options.get(
+            CONF_STALE_GRACE_SECONDS, DEFAULT_STALE_GRACE_SECONDS
+        )
+        current_pipeline_requests = self._config_entry.options.get(
+            CONF_PIPELINE_REQUESTS, False
+        )
+        current_proxy_port = self._config_entry.options.get(
+            CONF_PROXY_PORT, DEFAULT_PROXY_PORT
+        )
+        current_proxy_bind_host = self._config_entry.options.get(
+            CONF_PROXY_BIND_HOST, DEFAULT_PROXY_BIND_HOST
+        )
+        current_zero_export = self._config_entry.options.get(CONF_ZERO_EXPORT, False)
+        current_zero_export_target = self._config_entry.options.get(
+            CONF_ZERO_EXPORT_TARGET, DEFAULT_ZERO_EXPORT_TARGET
+        )
+        current_raw_recorder = self._config_entry.options.get(CONF_RAW_RECORDER, False)
+        current_deadbands = self._config_entry.options.get(CONF_DEADBANDS, "")
         
         schema = vol.Schema(
             {
@@ -223,6 +434,42 @@ class APstorageOptionsFlowHandler(config_entries.OptionsFlow):
                     CONF_CONNECTION_MAX_AGE_SECONDS,
                     default=current_connection_max_age,
                 ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400)),
+                vol.Optional(
+                    CONF_STALE_GRACE_POLLS,
+                    default=current_stale_grace_polls,
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+                vol.Optional(
+                    CONF_STALE_GRACE_SECONDS,
+                    default=current_stale_grace_seconds,
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400)),
+                vol.Optional(
+                    CONF_PIPELINE_REQUESTS,
+                    default=current_pipeline_requests,
+                ): bool,
+                vol.Optional(
+                    CONF_PROXY_PORT,
+                    default=current_proxy_port,
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+                vol.Optional(
+                    CONF_PROXY_BIND_HOST,
+                    default=current_proxy_bind_host,
+                ): str,
+                vol.Optional(
+                    CONF_ZERO_EXPORT,
+                    default=current_zero_export,
+                ): bool,
+                vol.Optional(
+                    CONF_ZERO_EXPORT_TARGET,
+                    default=current_zero_export_target,
+                ): vol.All(vol.Coerce(int), vol.Range(min=-10000, max=10000)),
+                vol.Optional(
+                    CONF_RAW_RECORDER,
+                    default=current_raw_recorder,
+                ): bool,
+                vol.Optional(
+                    CONF_DEADBANDS,
+                    default=current_deadbands,
+                ): str,
             }
         )
-        return self.async_show_form(step_id="init", data_schema=schema)
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
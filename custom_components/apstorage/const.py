@@ -6,6 +6,60 @@ LOGGER_NAME = "custom_components.apstorage_ha"
 DEFAULT_SCAN_INTERVAL = timedelta(seconds=60)
 DEFAULT_CONNECTION_MAX_AGE_SECONDS = 480
 DEFAULT_REGISTER_ADDRESS_OFFSET = 0
+DEFAULT_STALE_GRACE_POLLS = 3
+DEFAULT_STALE_GRACE_SECONDS = 180
+
+# hass.data key for the scheduler shared by all entries of the integration.
+DATA_POLL_SCHEDULER = f"{DOMAIN}_poll_scheduler"
+# hass.data key for serial buses shared by entries on the same port.
+DATA_MODBUS_BUSES = f"{DOMAIN}_modbus_buses"
+# Modbus TCP gateways often accept only one or two concurrent clients.
+TCP_POOL_CONNECTIONS = 1
+# hass.data key for pipelined Modbus TCP connections, and their in-flight window.
+DATA_MODBUS_PIPELINES = f"{DOMAIN}_modbus_pipelines"
+DEFAULT_PIPELINE_WINDOW = 4
+# A reduced window doubles again after this many clean rounds of reads.
+PIPELINE_RECOVERY_ROUNDS = 20
+# The Modbus TCP proxy has no authentication, so it listens on loopback
+# unless the options name another address; port 0 in the options disables it.
+DEFAULT_PROXY_BIND_HOST = "127.0.0.1"
+# hass.data key for the fleet aggregator of the fleet config entry.
+DATA_FLEET = f"{DOMAIN}_fleet"
+# hass.data key for the SunSpec model cache shared by all entries.
+DATA_SUNSPEC_CACHE = f"{DOMAIN}_sunspec_cache"
+# Startup discovery gives up after this long and the full register table is read.
+SUNSPEC_DISCOVERY_TIMEOUT_SECONDS = 30
+# A register counts as not implemented only if it holds the SunSpec sentinel
+# in this many reads of its model, taken this many seconds apart.
+SUNSPEC_CONFIRM_READS = 3
+SUNSPEC_CONFIRM_INTERVAL_SECONDS = 1.0
+DEFAULT_PROXY_PORT = 0
+# hass.data key for the serial ports listed by the config flow, and how long they stay valid.
+DATA_SERIAL_PORTS = f"{DOMAIN}_serial_ports"
+SERIAL_PORTS_CACHE_SECONDS = 30
+# Fastest per-subscriber rate of the websocket live stream.
+LIVE_MAX_RATE_HZ = 5.0
+# Samples buffered per live subscriber; max_rate * batch_seconds must fit.
+LIVE_MAX_QUEUED_SAMPLES = 120
+# Live events are held while more messages than this wait on the websocket.
+LIVE_MAX_PENDING_MESSAGES = 16
+# Longest window and fastest target rate of an on-demand capture.
+CAPTURE_MAX_SECONDS = 60
+CAPTURE_MAX_RATE_HZ = 50.0
+# The zero-export control loop steps once per second when enabled.
+ZERO_EXPORT_INTERVAL_SECONDS = 1.0
+DEFAULT_ZERO_EXPORT_TARGET = 0
+# Raw frame recorder: directory under the config dir, file rotation, and how
+# long or how much it buffers before writing. A full poll is about 300 bytes.
+RAW_RECORDER_DIRECTORY = f"{DOMAIN}_raw"
+RAW_RECORDER_FILE_BYTES = 8 * 1024 * 1024
+RAW_RECORDER_MAX_FILES = 30
+RAW_RECORDER_FLUSH_BYTES = 64 * 1024
+RAW_RECORDER_FLUSH_SECONDS = 60
+# Seconds between entries of the timestamp index.
+RAW_RECORDER_INDEX_SECONDS = 60
+# Largest Modbus read; slow links get a smaller batch size from the config-flow probe.
+DEFAULT_MAX_BATCH_SIZE = 125
 
 CONF_UNIT = "unit"
 CONF_REGISTERS = "registers"
@@ -13,6 +67,18 @@ CONF_CONNECTION_TYPE = "connection_type"
 CONF_BAUDRATE = "baudrate"
 CONF_CONNECTION_MAX_AGE_SECONDS = "connection_max_age_seconds"
 CONF_REGISTER_ADDRESS_OFFSET = "register_address_offset"
+CONF_STALE_GRACE_POLLS = "stale_grace_polls"
+CONF_STALE_GRACE_SECONDS = "stale_grace_seconds"
+CONF_PIPELINE_REQUESTS = "pipeline_requests"
+CONF_PROXY_PORT = "proxy_port"
+CONF_PROXY_BIND_HOST = "proxy_bind_host"
+CONF_MAX_BATCH_SIZE = "max_batch_size"
+CONF_ZERO_EXPORT = "zero_export"
+# Set in the data of the single fleet entry, which has no Modbus connection.
+CONF_FLEET = "fleet"
+CONF_ZERO_EXPORT_TARGET = "zero_export_target"
+CONF_RAW_RECORDER = "raw_recorder"
+CONF_DEADBANDS = "deadbands"
 
 CONNECTION_TCP = "tcp"
 CONNECTION_RTU = "rtu"
@@ -103,7 +169,19 @@ APSTORAGE_REGISTERS = {
     40183: ("Set Power", 1, "int16", 1, "W", "power"),
 }
 
+# Register types that decode to numbers; only these can be streamed or captured.
+NUMERIC_REGISTER_TYPES = frozenset({"uint16", "int16", "uint32"})
+
+# Registers identifying the device (manufacturer, model, version, serial).
+IDENTITY_REGISTERS = (40004, 40020, 40044, 40052)
+
+# Controller heartbeat: increments once per second while the BMS controller runs.
+HEARTBEAT_REGISTER = 40089
+
 # Writable registers (address -> UI metadata)
+# Signed battery power setpoint: positive discharges, negative charges.
+SET_POWER_REGISTER = 40183
+
 APSTORAGE_WRITABLE_REGISTERS = {
     40183: {"min": -10000, "max": 10000, "step": 1, "mode": "box"},
 }
@@ -216,6 +294,24 @@ APSTORAGE_SCALE_REGISTERS = {
     40183: 40133,  # Set Power uses W_SF
 }
 
+# Sensor state-write deadbands as (absolute, relative) thresholds. A sensor only
+# writes a new state once its value moved by at least
+# max(absolute, relative * |last written value|), or when
+# DEADBAND_MAX_SILENCE_SECONDS passed since its last write.
+DEADBAND_DEFAULTS_BY_DEVICE_CLASS = {
+    "power": (10, 0.01),
+    "current": (0.2, 0.0),
+    "voltage": (0.5, 0.0),
+    "temperature": (0.2, 0.0),
+}
+DEADBAND_DEFAULTS_BY_UNIT = {
+    "Var": (10, 0.01),
+}
+# Per-register overrides; (0, 0) disables the deadband for a register. The
+# deadbands entry option overrides these again.
+APSTORAGE_DEADBANDS: dict[int, tuple[float, float]] = {}
+DEADBAND_MAX_SILENCE_SECONDS = 300
+
 # Energy sensor state-class groups
 TOTAL_INCREASING_ENERGY_REGISTERS = {40148, 40150}
 TOTAL_ENERGY_REGISTERS = {40146, 40147}
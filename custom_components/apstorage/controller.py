@@ -0,0 +1,237 @@
+"""Native zero-export control loop driving Set Power from measured grid power."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from .const import DOMAIN, LOGGER_NAME, SET_POWER_REGISTER, ZERO_EXPORT_INTERVAL_SECONDS
+from .snapshot import get_register_value
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# Grid Power Phase A..C; positive values are import from the grid.
+GRID_POWER_REGISTER = 40153
+_GRID_POWER_COUNT = 3
+_BATTERY_POWER_REGISTER = 40117
+# Read together each iteration, as two requests: the registers in between
+# are not needed.
+_POWER_SPANS = ((GRID_POWER_REGISTER, _GRID_POWER_COUNT), (_BATTERY_POWER_REGISTER, 1))
+
+# Set Power follows grid power with a gain of -1 (more discharge, less
+# import) and settles within a few seconds, so modest gains keep the loop
+# stable without the oscillation of a debounced automation.
+_KP = 0.3
+_KI = 0.5
+# Skip writes that would change Set Power by less than this.
+_MIN_STEP_WATTS = 10.0
+# After a missed iteration, integrate over at most this many intervals.
+_MAX_DT_INTERVALS = 5
+
+
+def _int16(word: int) -> int:
+    return word - 0x10000 if word > 0x7FFF else word
+
+
+class APstorageZeroExportController:
+    """PI controller holding grid power at a target through Set Power.
+
+    Each iteration reads only the grid power block and Battery Power and
+    writes Set Power directly through the Modbus client, bypassing the
+    writer's debounce and the read blackout after writes, so a step costs
+    about one round trip.
+    The output is clamped to the device's live Max Charge/Discharge Rate, and
+    the integrator stops accumulating while the output is saturated
+    (conditional-integration anti-windup).
+    """
+
+    def __init__(
+        self,
+        coordinator: APstorageCoordinator,
+        target: float = 0.0,
+        interval: float = ZERO_EXPORT_INTERVAL_SECONDS,
+        kp: float = _KP,
+        ki: float = _KI,
+    ) -> None:
+        self._coordinator = coordinator
+        self.target = float(target)
+        self.interval = interval
+        self.kp = kp
+        self.ki = ki
+        self._integral: float | None = None
+        self._last_step: float | None = None
+        self._task: asyncio.Task | None = None
+        self.output: float | None = None
+        self.grid_power: float | None = None
+        self.battery_power: float | None = None
+        self.saturated = False
+        self.iterations = 0
+        self.read_failures = 0
+        self.writes = 0
+        self.loop_seconds: float | None = None
+
+    @property
+    def running(self) -> bool:
+        """Return True while the control loop task is active."""
+        return self._task is not None and not self._task.done()
+
+    def update(self, grid_power: float, dt: float, low: float, high: float) -> float:
+        """Return the new Set Power for a grid power sample ``dt`` seconds after the last."""
+        if self._integral is None:
+            self._integral = self._initial_output()
+        error = grid_power - self.target
+        integral = self._integral + self.ki * error * dt
+        output = self.kp * error + integral
+        self.saturated = False
+        if output > high:
+            output, self.saturated = high, True
+            if error > 0:
+                integral = self._integral
+        elif output < low:
+            output, self.saturated = low, True
+            if error < 0:
+                integral = self._integral
+        self._integral = min(max(integral, low), high)
+        return output
+
+    def _initial_output(self) -> float:
+        """Start from what the battery does now, for a bumpless start.
+
+        Battery Power read in this iteration is preferred; the polled Set
+        Power and Battery Power may be a whole scan interval old.
+        """
+        if self.battery_power is not None:
+            return self.battery_power
+        data = self._coordinator.data
+        for address in (SET_POWER_REGISTER, _BATTERY_POWER_REGISTER):
+            value = get_register_value(data, address) if data else None
+            if isinstance(value, (int, float)):
+                return float(value)
+        return 0.0
+
+    def _read_power(self) -> tuple[list[int] | None, list[int] | None]:
+        """Read both power spans back to back; runs in the executor."""
+        client = self._coordinator.modbus_client
+        return tuple(client.read_registers(address, count) for address, count in _POWER_SPANS)
+
+    async def _async_read_power(self) -> tuple[list[int] | None, list[int] | None]:
+        """Read the grid power block and Battery Power in the same cycle."""
+        coordinator = self._coordinator
+        client = coordinator.modbus_client
+        if coordinator.pipeline is None:
+            return await coordinator.hass.async_add_executor_job(self._read_power)
+        payloads = await coordinator.pipeline.async_read_many(
+            client.unit,
+            [(client.to_wire_address(address), count) for address, count in _POWER_SPANS],
+        )
+        return tuple(
+            None
+            if payload is None
+            else [int.from_bytes(payload[i : i + 2], "big") for i in range(0, len(payload), 2)]
+            for payload in payloads
+        )
+
+    async def _async_read_grid_power(self) -> float | None:
+        """Return total grid power in W; also update Battery Power."""
+        grid, battery = await self._async_read_power()
+        writer = self._coordinator.writer
+        self.battery_power = (
+            _int16(battery[0]) * writer.effective_scale(_BATTERY_POWER_REGISTER)
+            if battery
+            else None
+        )
+        if grid is None or len(grid) < _GRID_POWER_COUNT:
+            return None
+        return sum(
+            _int16(word) * writer.effective_scale(GRID_POWER_REGISTER + index)
+            for index, word in enumerate(grid[:_GRID_POWER_COUNT])
+        )
+
+    async def _async_write(self, value: float) -> bool:
+        coordinator = self._coordinator
+        raw = coordinator.writer.to_raw(SET_POWER_REGISTER, value)
+        # Control writes run every interval; they must not hold off the regular poll.
+        success = await coordinator.hass.async_add_executor_job(
+            coordinator.modbus_client.write_register, SET_POWER_REGISTER, raw, False
+        )
+        if success:
+            self.writes += 1
+            coordinator.async_set_optimistic_value(SET_POWER_REGISTER, value)
+            coordinator.async_notify_register_changed(SET_POWER_REGISTER)
+        return success
+
+    async def async_iterate(self) -> None:
+        """Run one read-compute-write step of the loop."""
+        started = time.monotonic()
+        grid_power = await self._async_read_grid_power()
+        if grid_power is None:
+            # Hold the last output; a missing sample must not wind the integrator.
+            self.read_failures += 1
+            return
+        self.grid_power = grid_power
+        now = time.monotonic()
+        dt = self.interval if self._last_step is None else now - self._last_step
+        self._last_step = now
+        low, high = self._coordinator.writer.value_range(SET_POWER_REGISTER)
+        output = self.update(grid_power, min(dt, self.interval * _MAX_DT_INTERVALS), low, high)
+        self.iterations += 1
+        if self.output is None or abs(output - self.output) >= _MIN_STEP_WATTS:
+            if await self._async_write(output):
+                self.output = output
+        duration = time.monotonic() - started
+        self.loop_seconds = (
+            duration if self.loop_seconds is None else 0.8 * self.loop_seconds + 0.2 * duration
+        )
+
+    async def _async_run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.async_iterate()
+            except Exception as err:  # pragma: no cover
+                _LOGGER.exception("Zero-export control step failed: %s", err)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def async_start(self) -> None:
+        """Start the control loop."""
+        if self.running:
+            return
+        self._integral = None
+        self._last_step = None
+        self._task = self._coordinator.hass.async_create_background_task(
+            self._async_run(), f"{DOMAIN} zero export {self._coordinator.entry_id}"
+        )
+        _LOGGER.info("Zero-export control started with target %.0f W", self.target)
+
+    async def async_stop(self) -> None:
+        """Stop the loop and return Set Power to 0 if the loop changed it."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if self.output not in (None, 0):
+            await self._async_write(0)
+        self.output = None
+        _LOGGER.info("Zero-export control stopped")
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the loop's state for diagnostics."""
+        return {
+            "running": self.running,
+            "target": self.target,
+            "grid_power": self.grid_power,
+            "battery_power": self.battery_power,
+            "output": self.output,
+            "integral": self._integral,
+            "saturated": self.saturated,
+            "iterations": self.iterations,
+            "writes": self.writes,
+            "read_failures": self.read_failures,
+            "loop_seconds": self.loop_seconds,
+        }
@@ -0,0 +1,66 @@
+"""Sensor state-write deadbands, shared by the sensors and significant_change."""
+from __future__ import annotations
+
+from .const import (
+    APSTORAGE_DEADBANDS,
+    APSTORAGE_REGISTERS,
+    DEADBAND_DEFAULTS_BY_DEVICE_CLASS,
+    DEADBAND_DEFAULTS_BY_UNIT,
+)
+
+# State attribute carrying a sensor's deadband when it differs from the
+# default for its device class and unit; [0, 0] means none.
+ATTR_DEADBAND = "deadband"
+
+
+def parse_deadbands(text: str | None) -> dict[int, tuple[float, float]]:
+    """Parse the deadbands option into {address: (absolute, relative)}.
+
+    The option is a comma-separated list of ``address=absolute[/relative]``
+    items, for example ``40117=25/0.02, 40114=0``. Raises ValueError for
+    malformed items or unknown registers.
+    """
+    deadbands: dict[int, tuple[float, float]] = {}
+    for item in (text or "").replace(";", ",").split(","):
+        if not item.strip():
+            continue
+        address_text, _, band = item.partition("=")
+        absolute_text, _, relative_text = band.partition("/")
+        address = int(address_text)
+        absolute = float(absolute_text)
+        relative = float(relative_text) if relative_text.strip() else 0.0
+        if address not in APSTORAGE_REGISTERS:
+            raise ValueError(f"Unknown register {address}")
+        if absolute < 0 or relative < 0:
+            raise ValueError(f"Negative deadband for register {address}")
+        deadbands[address] = (absolute, relative)
+    return deadbands
+
+
+def default_deadband(
+    unit_of_measurement: str | None, device_class: str | None
+) -> tuple[float, float] | None:
+    """Return the deadband for a device class, or failing that a unit."""
+    deadband = DEADBAND_DEFAULTS_BY_DEVICE_CLASS.get(device_class or "")
+    if deadband is None:
+        deadband = DEADBAND_DEFAULTS_BY_UNIT.get(unit_of_measurement or "")
+    return deadband
+
+
+def resolve_deadband(
+    address: int,
+    unit_of_measurement: str | None,
+    device_class: str | None,
+    configured: tuple[float, float] | None = None,
+) -> tuple[float, float] | None:
+    """Return the (absolute, relative) state-write deadband for a register.
+
+    ``configured`` comes from the entry's deadbands option and wins over
+    the code-level overrides and the defaults.
+    """
+    deadband = configured if configured is not None else APSTORAGE_DEADBANDS.get(address)
+    if deadband is None:
+        deadband = default_deadband(unit_of_measurement, device_class)
+    if deadband is None or not any(deadband):
+        return None
+    return deadband
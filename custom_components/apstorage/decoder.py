@@ -0,0 +1,137 @@
+"""Whole-batch register decoding for the APstorage coordinator."""
+from __future__ import annotations
+
+import struct
+from typing import Any
+
+from .const import CHARGE_STATUS_ENUM
+from .snapshot import MISSING, REGISTER_INDEX
+
+# Field kinds for numeric values unpacked by the batch struct.
+_KIND_SCALED = 0
+_KIND_RAW = 1
+_KIND_ENUM = 2
+
+# struct codes per register type; strings are skipped by the struct and
+# decoded separately from a memoryview slice.
+_STRUCT_CODES = {
+    "uint16": ("H", _KIND_SCALED),
+    "int16": ("h", _KIND_SCALED),
+    "uint32": ("I", _KIND_SCALED),
+    "bitfield32": ("I", _KIND_RAW),
+    "sunssf": ("h", _KIND_RAW),
+    "enum16": ("H", _KIND_ENUM),
+}
+
+
+class BatchDecoder:
+    """Decode every register of one contiguous read batch in a single pass.
+
+    The batch words are packed into one big-endian bytes buffer, all numeric
+    fields are unpacked with one precompiled ``struct.Struct`` and strings are
+    decoded from memoryview slices of the same buffer.
+    """
+
+    __slots__ = (
+        "start",
+        "count",
+        "fields",
+        "addresses",
+        "scale_factor_fields",
+        "_word_struct",
+        "_field_struct",
+        "_numeric",
+        "_strings",
+    )
+
+    def __init__(
+        self,
+        start: int,
+        count: int,
+        fields: tuple[tuple[int, int, int, str, float, int | None], ...],
+    ) -> None:
+        self.start = start
+        self.count = count
+        self.fields = fields
+        self.addresses = frozenset(field[0] for field in fields)
+        self._word_struct = struct.Struct(f">{count}H")
+
+        codes = [">"]
+        numeric: list[tuple[int, int, float, int | None]] = []
+        strings: list[tuple[int, int, int]] = []
+        scale_factor_fields: list[tuple[int, int]] = []
+        position = 0
+        for address, offset, reg_count, value_type, scale, scale_reg in sorted(
+            fields, key=lambda field: field[1]
+        ):
+            if offset > position:
+                codes.append(f"{(offset - position) * 2}x")
+            if value_type == "string":
+                codes.append(f"{reg_count * 2}x")
+                strings.append((REGISTER_INDEX[address], offset * 2, (offset + reg_count) * 2))
+            elif value_type in _STRUCT_CODES:
+                code, kind = _STRUCT_CODES[value_type]
+                # uint32/bitfield32 span two registers; pad if the table says more.
+                width = 2 if code == "I" else 1
+                codes.append(code)
+                if reg_count > width:
+                    codes.append(f"{(reg_count - width) * 2}x")
+                if value_type == "sunssf":
+                    scale_factor_fields.append((address, len(numeric)))
+                numeric.append((REGISTER_INDEX[address], kind, scale, scale_reg))
+            else:
+                codes.append(f"{reg_count * 2}x")
+            position = offset + reg_count
+
+        self._field_struct = struct.Struct("".join(codes))
+        self._numeric = tuple(numeric)
+        self._strings = tuple(strings)
+        self.scale_factor_fields = tuple(scale_factor_fields)
+
+    def pack(self, words: list[int]) -> bytes:
+        """Pack the batch words into one big-endian frame."""
+        return self._word_struct.pack(*words)
+
+    def words(self, buffer: bytes) -> tuple[int, ...]:
+        """Return the raw register words of a packed frame."""
+        return self._word_struct.unpack(buffer)
+
+    def unpack(self, buffer: bytes) -> tuple[int, ...]:
+        """Unpack all numeric fields from a packed frame."""
+        return self._field_struct.unpack_from(buffer)
+
+    def collect_scale_factors(
+        self, raw: tuple[int, ...], scale_factors: dict[int, int]
+    ) -> None:
+        """Record the SunSpec scale factors carried by this batch."""
+        for address, index in self.scale_factor_fields:
+            scale_factors[address] = raw[index]
+
+    def decode_into(
+        self,
+        values: list[Any],
+        buffer: bytes,
+        raw: tuple[int, ...],
+        scale_factors: dict[int, int],
+    ) -> None:
+        """Write decoded values for this batch into a snapshot value list."""
+        for (slot, kind, scale, scale_reg), val in zip(self._numeric, raw):
+            if kind == _KIND_SCALED:
+                sf = scale_factors.get(scale_reg) if scale_reg is not None else None
+                values[slot] = val * (10 ** sf) if sf is not None else val * scale
+            elif kind == _KIND_ENUM:
+                values[slot] = CHARGE_STATUS_ENUM.get(val, f"UNKNOWN({val})")
+            else:
+                values[slot] = val
+
+        if self._strings:
+            view = memoryview(buffer)
+            for slot, begin, end in self._strings:
+                # latin-1 maps each byte to the same code point as the old
+                # per-character chr() decoding, so non-ASCII bytes never raise.
+                values[slot] = str(view[begin:end], "latin-1").replace("\x00", "").strip()
+
+    def clear_into(self, values: list[Any]) -> None:
+        """Mark every register of this batch as not read."""
+        for address in self.addresses:
+            values[REGISTER_INDEX[address]] = MISSING
@@ -0,0 +1,70 @@
+"""Diagnostics support for the APstorage integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_FLEET, DOMAIN
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    if entry.data.get(CONF_FLEET):
+        return {"fleet": hass.data[DOMAIN][entry.entry_id]["fleet"].diagnostics()}
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    client = coordinator.modbus_client
+    proxy = hass.data[DOMAIN][entry.entry_id].get("proxy")
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval_seconds": coordinator.update_interval.total_seconds()
+            if coordinator.update_interval
+            else None,
+            "scan_interval_seconds": coordinator.scan_interval.total_seconds(),
+            "poll_schedule": coordinator.poll_scheduler.diagnostics(entry.entry_id)
+            if coordinator.poll_scheduler
+            else None,
+            "device_stale": coordinator.device_stale,
+            "sunspec_models": [
+                {"model_id": model.model_id, "start": model.start, "length": model.length}
+                for model in coordinator.sunspec_models
+            ],
+            "batches": coordinator.batch_statistics(),
+            "link": client.bus.unit_metrics(client.unit) if client.bus else None,
+            "pipeline": {
+                "window": coordinator.pipeline.window,
+                "window_reductions": coordinator.pipeline.window_reductions,
+            }
+            if coordinator.pipeline
+            else None,
+            "zero_export": coordinator.controller.diagnostics()
+            if coordinator.controller
+            else None,
+            "schedule": coordinator.schedule.diagnostics(),
+            "live": coordinator.live.diagnostics(),
+            "capture": coordinator.capture.diagnostics(),
+            "raw_recorder": coordinator.recorder.diagnostics()
+            if coordinator.recorder
+            else None,
+            "proxy": {
+                "port": proxy.port,
+                "requests": proxy.requests,
+                "rejected": proxy.rejected,
+            }
+            if proxy
+            else None,
+        },
+    }
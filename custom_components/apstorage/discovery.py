@@ -0,0 +1,263 @@
+"""SunSpec model-chain discovery and the per-firmware register map cache."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, replace
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    APSTORAGE_REGISTERS,
+    DATA_SUNSPEC_CACHE,
+    DOMAIN,
+    HEARTBEAT_REGISTER,
+    LOGGER_NAME,
+    SUNSPEC_CONFIRM_INTERVAL_SECONDS,
+    SUNSPEC_CONFIRM_READS,
+)
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+_STORAGE_KEY = f"{DOMAIN}.sunspec_models"
+_STORAGE_VERSION = 1
+
+# "SunS" as two big-endian registers, found at the SunSpec base address.
+SUNSPEC_MARKER = (0x5375, 0x6E53)
+SUNSPEC_BASE_ADDRESS = 40000
+# Model ID that terminates the model chain.
+_END_MODEL_ID = 0xFFFF
+# Guard against devices that never report the end model.
+_MAX_MODELS = 32
+_MAX_READ_COUNT = 125
+
+# SunSpec "not implemented" values per register type.
+_NOT_IMPLEMENTED = {
+    "uint16": 0xFFFF,
+    "enum16": 0xFFFF,
+    "int16": 0x8000,
+    "sunssf": 0x8000,
+    "uint32": 0xFFFFFFFF,
+    "bitfield32": 0xFFFFFFFF,
+}
+# Counters may legitimately pass through the sentinel value.
+_NEVER_UNIMPLEMENTED = frozenset({HEARTBEAT_REGISTER})
+
+_VERSION_REGISTER = 40044
+_SERIAL_REGISTER = 40052
+# Registers read to build the identity key: Version (8) and Serial Number (16).
+IDENTITY_SPAN = (_VERSION_REGISTER, _SERIAL_REGISTER + 16 - _VERSION_REGISTER)
+
+# Reads wire registers (already offset) and returns their words, or None.
+ReadWords = Callable[[int, int], Awaitable[list[int] | None]]
+
+
+@dataclass(frozen=True)
+class SunSpecModel:
+    """One model in the chain; ``start`` is the address of its Model ID header."""
+
+    model_id: int
+    start: int
+    length: int
+
+    @property
+    def end(self) -> int:
+        """Return the first address after this model."""
+        return self.start + 2 + self.length
+
+
+@dataclass(frozen=True)
+class SunSpecDiscovery:
+    """Models found on the device and the registers it does not implement.
+
+    ``unimplemented`` is None until ``async_confirm_unimplemented`` has read
+    every model enough times to trust it; only a confirmed set is stored.
+    """
+
+    offset: int
+    models: tuple[SunSpecModel, ...]
+    unimplemented: frozenset[int] | None = None
+
+    def implemented_addresses(self) -> frozenset[int]:
+        """Return table registers that lie inside a model and are implemented."""
+        return frozenset(
+            address
+            for address, (_, count, _, _, _, _) in APSTORAGE_REGISTERS.items()
+            if address not in (self.unimplemented or ())
+            and any(model.start <= address and address + count <= model.end for model in self.models)
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a JSON-serializable form for storage."""
+        data: dict[str, Any] = {
+            "offset": self.offset,
+            "models": [[model.model_id, model.start, model.length] for model in self.models],
+        }
+        if self.unimplemented is not None:
+            data["unimplemented"] = sorted(self.unimplemented)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> SunSpecDiscovery:
+        """Rebuild a discovery result from its stored form."""
+        unimplemented = data.get("unimplemented")
+        return cls(
+            offset=int(data["offset"]),
+            models=tuple(SunSpecModel(*model) for model in data["models"]),
+            unimplemented=None if unimplemented is None else frozenset(map(int, unimplemented)),
+        )
+
+
+def decode_string(words: Iterable[int]) -> str:
+    """Decode a SunSpec string from big-endian register words."""
+    return (
+        b"".join(word.to_bytes(2, "big") for word in words)
+        .decode("latin-1")
+        .replace("\x00", "")
+        .strip()
+    )
+
+
+def identity_key(words: list[int]) -> str | None:
+    """Return the cache key from the Version..Serial Number register span."""
+    version = decode_string(words[: _SERIAL_REGISTER - _VERSION_REGISTER])
+    serial = decode_string(words[_SERIAL_REGISTER - _VERSION_REGISTER :])
+    if not serial:
+        return None
+    return f"{serial}|{version}"
+
+
+async def _async_read_span(read: ReadWords, address: int, count: int) -> list[int] | None:
+    """Read a span of any length in Modbus-sized chunks."""
+    words: list[int] = []
+    while count > 0:
+        chunk = min(count, _MAX_READ_COUNT)
+        part = await read(address, chunk)
+        if part is None or len(part) < chunk:
+            return None
+        words.extend(part[:chunk])
+        address += chunk
+        count -= chunk
+    return words
+
+
+def _unimplemented_registers(model: SunSpecModel, words: list[int]) -> set[int]:
+    """Return table registers of a model block that hold a not-implemented value."""
+    unimplemented = set()
+    for address, (_, count, value_type, _, _, _) in APSTORAGE_REGISTERS.items():
+        sentinel = _NOT_IMPLEMENTED.get(value_type)
+        if sentinel is None or address in _NEVER_UNIMPLEMENTED:
+            continue
+        if not (model.start <= address and address + count <= model.end):
+            continue
+        index = address - model.start
+        value = words[index] if count == 1 else (words[index] << 16) | words[index + 1]
+        if value == sentinel:
+            unimplemented.add(address)
+    return unimplemented
+
+
+async def async_discover_model_chain(
+    read: ReadWords, offsets: Iterable[int]
+) -> tuple[SunSpecDiscovery, str | None] | None:
+    """Find the SunSpec marker and walk the model chain.
+
+    ``offsets`` are tried in order; the first one where the "SunS" marker is
+    found is used. Returns the discovery result and the identity key read
+    from the common model, or None if no marker was found.
+    """
+    for offset in dict.fromkeys(offsets):
+        marker = await read(SUNSPEC_BASE_ADDRESS + offset, 2)
+        if marker is not None and tuple(marker[:2]) == SUNSPEC_MARKER:
+            break
+    else:
+        return None
+
+    models: list[SunSpecModel] = []
+    identity: str | None = None
+    address = SUNSPEC_BASE_ADDRESS + 2
+    for _ in range(_MAX_MODELS):
+        header = await read(address + offset, 2)
+        if header is None or len(header) < 2:
+            break
+        model_id, length = header[0], header[1]
+        if model_id == _END_MODEL_ID:
+            break
+        model = SunSpecModel(model_id, address, length)
+        models.append(model)
+        span_start, span_count = IDENTITY_SPAN
+        if model.start <= span_start and span_start + span_count <= model.end:
+            words = await read(span_start + offset, span_count)
+            if words is not None and len(words) >= span_count:
+                identity = identity_key(words)
+        address = model.end
+
+    if not models:
+        return None
+    return SunSpecDiscovery(offset, tuple(models)), identity
+
+
+async def async_confirm_unimplemented(
+    read: ReadWords, discovery: SunSpecDiscovery
+) -> SunSpecDiscovery:
+    """Return ``discovery`` with the registers that are reliably not implemented.
+
+    Each model is read ``SUNSPEC_CONFIRM_READS`` times; a register is only
+    flagged if it holds its sentinel in every read. A failed read confirms
+    nothing: ``unimplemented`` stays None and every register is read.
+    """
+    candidates: set[int] | None = None
+    for attempt in range(SUNSPEC_CONFIRM_READS):
+        if attempt:
+            await asyncio.sleep(SUNSPEC_CONFIRM_INTERVAL_SECONDS)
+        seen: set[int] = set()
+        for model in discovery.models:
+            words = await _async_read_span(read, model.start + discovery.offset, 2 + model.length)
+            if words is None:
+                return replace(discovery, unimplemented=None)
+            seen |= _unimplemented_registers(model, words)
+        candidates = seen if candidates is None else candidates & seen
+        if not candidates:
+            break
+    return replace(discovery, unimplemented=frozenset(candidates or ()))
+
+
+class APstorageModelCache:
+    """Discovery results stored in Home Assistant storage, keyed by serial and firmware."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[dict[str, Any]] = Store(hass, _STORAGE_VERSION, _STORAGE_KEY)
+        self._data: dict[str, Any] | None = None
+
+    async def _async_data(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = await self._store.async_load() or {}
+        return self._data
+
+    async def async_get(self, key: str) -> SunSpecDiscovery | None:
+        """Return the cached discovery for a device identity."""
+        stored = (await self._async_data()).get(key)
+        if stored is None:
+            return None
+        try:
+            return SunSpecDiscovery.from_dict(stored)
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.debug("Ignoring malformed cached SunSpec models for %s", key)
+            return None
+
+    async def async_set(self, key: str, discovery: SunSpecDiscovery) -> None:
+        """Store the discovery for a device identity."""
+        data = await self._async_data()
+        data[key] = discovery.as_dict()
+        await self._store.async_save(data)
+
+
+def async_get_model_cache(hass: HomeAssistant) -> APstorageModelCache:
+    """Return the integration-wide model cache."""
+    cache = hass.data.get(DATA_SUNSPEC_CACHE)
+    if cache is None:
+        cache = hass.data[DATA_SUNSPEC_CACHE] = APstorageModelCache(hass)
+    return cache
@@ -4,9 +4,12 @@ from __future__ import annotations
 from typing import Any
 
 from homeassistant.const import CONF_HOST
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
 
 from .const import DOMAIN
+from .entity_naming import get_suggested_object_id
+from .snapshot import APstorageSnapshot, get_register_value
 
 
 class APstorageEntityMixin:
@@ -14,6 +17,52 @@ class APstorageEntityMixin:
 
     _coordinator: Any
     _entry: Any
+    _name: str
+    # Registers whose changes require a state write for this entity.
+    _watched_addresses: tuple[int, ...] = ()
+    _last_written_available: bool | None = None
+    # (coordinator identity_version, value) caches for identity-derived data.
+    _device_info_cache: tuple[int, DeviceInfo] | None = None
+    _suggested_object_id_cache: tuple[int, str | None] | None = None
+
+    @property
+    def available(self) -> bool:
+        """Return if the entity's own register is available."""
+        if not self._coordinator.last_update_success:
+            return False
+        data = self._coordinator.data
+        if not data or not self._watched_addresses:
+            return bool(data)
+        return self._watched_addresses[0] in data
+
+    def _freshness_attributes(self) -> dict[str, Any] | None:
+        """Return stale/data_age attributes while showing last-known values."""
+        data = self._coordinator.data
+        if not data or not self._watched_addresses:
+            return None
+        address = self._watched_addresses[0]
+        if not isinstance(data, APstorageSnapshot) or not data.is_stale(address):
+            return None
+        data_age = self._coordinator.data_age(address)
+        return {
+            "stale": True,
+            "data_age": round(data_age) if data_age is not None else None,
+        }
+
+    @callback
+    def _async_handle_coordinator_update(self) -> None:
+        """Write state only when a watched register or availability changed."""
+        available = self.available
+        if not self._state_write_needed(available):
+            return
+        self._last_written_available = available
+        self.async_write_ha_state()
+
+    def _state_write_needed(self, available: bool) -> bool:
+        """Return True if a coordinator update should produce a state write."""
+        return available != self._last_written_available or self._coordinator.registers_changed(
+            self._watched_addresses
+        )
 
     @staticmethod
     def _model_from_serial(serial_number: str | None) -> str | None:
@@ -30,36 +79,52 @@ class APstorageEntityMixin:
 
     @property
     def device_info(self) -> DeviceInfo:
-        """Return device information for the APstorage device."""
+        """Return device information, rebuilt only when identity registers change."""
+        version = self._coordinator.identity_version
+        cached = self._device_info_cache
+        if cached is None or cached[0] != version:
+            cached = self._device_info_cache = (version, self._build_device_info())
+        return cached[1]
+
+    def _cached_suggested_object_id(self) -> str | None:
+        """Return the preferred object ID, recomputed only when identity changes."""
+        version = self._coordinator.identity_version
+        cached = self._suggested_object_id_cache
+        if cached is None or cached[0] != version:
+            cached = self._suggested_object_id_cache = (
+                version,
+                get_suggested_object_id(self._coordinator.data, self._name),
+            )
+        return cached[1]
+
+    def _build_device_info(self) -> DeviceInfo:
+        """Build device information for the APstorage device."""
         manufacturer = "APstorage"
         model = "Battery Management System"
         serial_number = None
         sw_version = None
 
-        if self._coordinator.data:
-            if 40004 in self._coordinator.data:
-                mfr = self._coordinator.data[40004].get("value")
-                if isinstance(mfr, str) and mfr.strip():
-                    manufacturer = mfr
+        data = self._coordinator.data
+        if data:
+            mfr = get_register_value(data, 40004)
+            if isinstance(mfr, str) and mfr.strip():
+                manufacturer = mfr
 
-            if 40020 in self._coordinator.data:
-                mdl = self._coordinator.data[40020].get("value")
-                if isinstance(mdl, str) and mdl.strip():
-                    model = mdl
+            mdl = get_register_value(data, 40020)
+            if isinstance(mdl, str) and mdl.strip():
+                model = mdl
 
-            if 40052 in self._coordinator.data:
-                sn = self._coordinator.data[40052].get("value")
-                if isinstance(sn, str) and sn.strip():
-                    serial_number = sn
+            sn = get_register_value(data, 40052)
+            if isinstance(sn, str) and sn.strip():
+                serial_number = sn
 
             mapped_model = self._model_from_serial(serial_number)
             if mapped_model:
                 model = mapped_model
 
-            if 40044 in self._coordinator.data:
-                ver = self._coordinator.data[40044].get("value")
-                if isinstance(ver, str) and ver.strip():
-                    sw_version = ver
+            ver = get_register_value(data, 40044)
+            if isinstance(ver, str) and ver.strip():
+                sw_version = ver
 
         device_info = DeviceInfo(
             identifiers={(DOMAIN, self._entry.entry_id)},
@@ -75,4 +140,32 @@ class APstorageEntityMixin:
         if sw_version:
             device_info["sw_version"] = sw_version
 
-        return device_info
\ No newline at end of file
+        return device_info
+
+
+class APstorageFleetEntityMixin:
+    """Shared logic for entities of the virtual fleet device."""
+
+    _fleet: Any
+    _entry: Any
+    _attr_should_poll = False
+
+    async def async_added_to_hass(self) -> None:
+        """Write state whenever a fleet total changes."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._fleet.async_add_listener(self.async_write_ha_state))
+
+    @property
+    def available(self) -> bool:
+        """Return True while at least one battery reports data."""
+        return self._fleet.reporting_members > 0
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return the virtual fleet device."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._entry.entry_id)},
+            name="APstorage Fleet",
+            manufacturer="APstorage",
+            model="Battery Fleet",
+        )
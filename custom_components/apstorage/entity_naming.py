@@ -1,24 +1,30 @@
 """Helpers for APstorage entity naming."""
 from __future__ import annotations
 
+import logging
 import re
+from functools import lru_cache
+from collections.abc import Mapping
 from typing import Any
 
 from homeassistant.helpers import entity_registry as er
 
+from .const import LOGGER_NAME
+from .snapshot import get_register_value
 
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+@lru_cache(maxsize=512)
 def slugify_fragment(value: str) -> str:
     """Convert a string to a Home Assistant-friendly slug fragment."""
     slug = re.sub(r"[^a-z0-9]+", "_", value.strip().lower())
     return slug.strip("_")
 
 
-def get_serial_number(data: dict[int, dict[str, Any]] | None) -> str | None:
+def get_serial_number(data: Mapping[int, Any] | None) -> str | None:
     """Return the device serial number from coordinator data if available."""
-    if not data or 40052 not in data:
-        return None
-
-    serial_number = data[40052].get("value")
+    serial_number = get_register_value(data, 40052)
     if not isinstance(serial_number, str):
         return None
 
@@ -27,7 +33,7 @@ def get_serial_number(data: dict[int, dict[str, Any]] | None) -> str | None:
 
 
 def get_suggested_object_id(
-    data: dict[int, dict[str, Any]] | None, entity_name: str
+    data: Mapping[int, Any] | None, entity_name: str
 ) -> str | None:
     """Build the preferred object ID for an entity using the device serial."""
     name_slug = slugify_fragment(entity_name)
@@ -47,7 +53,7 @@ def get_suggested_object_id(
 
 def build_prefixed_entity_id(
     current_entity_id: str | None,
-    data: dict[int, dict[str, Any]] | None,
+    data: Mapping[int, Any] | None,
     entity_name: str,
 ) -> str | None:
     """Build the full entity ID with the serial-based prefix."""
@@ -62,7 +68,7 @@ def build_prefixed_entity_id(
 def async_migrate_entity_id(
     hass,
     current_entity_id: str | None,
-    data: dict[int, dict[str, Any]] | None,
+    data: Mapping[int, Any] | None,
     entity_name: str,
 ) -> bool:
     """Rename an entity registry entry to the serial-prefixed entity ID."""
@@ -79,5 +85,29 @@ def async_migrate_entity_id(
     if not registry_entry:
         return False
 
-    registry.async_update_entity(current_entity_id, new_entity_id=new_entity_id)
-    return True
\ No newline at end of file
+    try:
+        registry.async_update_entity(current_entity_id, new_entity_id=new_entity_id)
+    except ValueError:
+        _LOGGER.warning("Unable to rename entity %s", current_entity_id)
+        return False
+    return True
+
+
+def async_migrate_config_entry_entity_ids(
+    hass,
+    config_entry_id: str,
+    data: Mapping[int, Any] | None,
+) -> int:
+    """Rename all of a config entry's registry entries to serial-prefixed IDs.
+
+    Returns the number of renamed entities.
+    """
+    if not get_serial_number(data):
+        return 0
+
+    registry = er.async_get(hass)
+    return sum(
+        async_migrate_entity_id(hass, registry_entry.entity_id, data, registry_entry.original_name)
+        for registry_entry in er.async_entries_for_config_entry(registry, config_entry_id)
+        if registry_entry.original_name
+    )
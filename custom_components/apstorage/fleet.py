@@ -0,0 +1,298 @@
+"""Fleet aggregator combining every APstorage battery into one virtual device."""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+
+from .const import CONF_FLEET, DATA_FLEET, DOMAIN, LOGGER_NAME, SET_POWER_REGISTER
+from .snapshot import get_register_value
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+FLEET_PLATFORMS = [Platform.SENSOR, Platform.NUMBER]
+
+_ENERGY_CAPACITY = 40073
+_MAX_CHARGE_RATE = 40074
+_MAX_DISCHARGE_RATE = 40075
+_SOC_MAX = 40077
+_SOC_MIN = 40078
+_SOC = 40081
+
+# Fleet totals that are plain sums of one register across members.
+FLEET_SUMS = {
+    "energy_capacity": _ENERGY_CAPACITY,
+    "battery_power": 40117,
+    "charge_energy": 40148,
+    "discharge_energy": 40150,
+    "max_charge_rate": _MAX_CHARGE_RATE,
+    "max_discharge_rate": _MAX_DISCHARGE_RATE,
+    "set_power": SET_POWER_REGISTER,
+}
+# Cumulative counters: a dip in their sum would be recorded as a meter reset.
+FLEET_COUNTERS = frozenset({"charge_energy", "discharge_energy"})
+# Running sums behind the capacity-weighted SoC.
+_WEIGHTED_SOC = "_weighted_soc"
+_SOC_CAPACITY = "_soc_capacity"
+
+
+class APstorageFleet:
+    """Totals across every loaded battery, updated as each battery polls.
+
+    Every member contributes a small set of values; when a member's
+    coordinator updates, only its old contribution is replaced in the running
+    totals, so fleet values are current as soon as any unit's poll completes.
+
+    After a failed poll or an unload only the member's energy counters stay
+    in the totals, so the counter sums never dip. They are only reported while every battery entry is loaded and
+    polling, since a partial sum would be recorded as a reset.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.members: dict[str, APstorageCoordinator] = {}
+        self._unsubs: dict[str, Callable[[], None]] = {}
+        self._contributions: dict[str, dict[str, float]] = {}
+        # Members whose latest poll succeeded.
+        self._reporting: set[str] = set()
+        self._totals: dict[str, float] = dict.fromkeys((*FLEET_SUMS, _WEIGHTED_SOC, _SOC_CAPACITY), 0.0)
+        self._listeners: list[Callable[[], None]] = []
+        self.last_split: dict[str, float] = {}
+
+    @callback
+    def async_add_member(self, coordinator: APstorageCoordinator) -> None:
+        """Start aggregating a battery's coordinator."""
+        entry_id = coordinator.entry_id
+        if entry_id in self.members:
+            return
+        self.members[entry_id] = coordinator
+        self._unsubs[entry_id] = coordinator.async_add_listener(
+            functools.partial(self._async_member_updated, entry_id)
+        )
+        self._async_member_updated(entry_id)
+
+    @callback
+    def async_remove_member(self, entry_id: str) -> None:
+        """Stop aggregating a battery; only its energy counters are kept."""
+        if (unsub := self._unsubs.pop(entry_id, None)) is not None:
+            unsub()
+        self.members.pop(entry_id, None)
+        self._reporting.discard(entry_id)
+        old = self._contributions.get(entry_id, {})
+        self._async_apply(entry_id, {key: old[key] for key in FLEET_COUNTERS if key in old})
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Detach from every member."""
+        for entry_id in list(self.members):
+            self.async_remove_member(entry_id)
+
+    @staticmethod
+    def _contribution(data: Any) -> dict[str, float]:
+        """Return the values one battery adds to the fleet totals."""
+        contribution: dict[str, float] = {}
+        for key, address in FLEET_SUMS.items():
+            value = get_register_value(data, address)
+            if isinstance(value, (int, float)):
+                contribution[key] = float(value)
+        soc = get_register_value(data, _SOC)
+        capacity = contribution.get("energy_capacity")
+        if isinstance(soc, (int, float)) and capacity:
+            contribution[_WEIGHTED_SOC] = capacity * soc
+            contribution[_SOC_CAPACITY] = capacity
+        return contribution
+
+    @callback
+    def _async_member_updated(self, entry_id: str) -> None:
+        coordinator = self.members.get(entry_id)
+        if coordinator is None:
+            return
+        if not coordinator.last_update_success or coordinator.data is None:
+            # Only the energy counters are kept until the member polls again;
+            # its power and SoC leave the totals.
+            if entry_id in self._reporting:
+                self._reporting.discard(entry_id)
+                old = self._contributions.get(entry_id, {})
+                counters = {key: old[key] for key in FLEET_COUNTERS if key in old}
+                if not self._async_apply(entry_id, counters):
+                    self._async_notify()
+            return
+        contribution = self._contribution(coordinator.data)
+        old = self._contributions.get(entry_id, {})
+        for key in FLEET_COUNTERS:
+            if key not in contribution and key in old:
+                contribution[key] = old[key]
+        reporting = entry_id in self._reporting
+        self._reporting.add(entry_id)
+        if not self._async_apply(entry_id, contribution) and not reporting:
+            self._async_notify()
+
+    @callback
+    def _async_apply(self, entry_id: str, contribution: dict[str, float]) -> bool:
+        """Replace a member's contribution; return True if the totals changed."""
+        old = self._contributions.pop(entry_id, {})
+        if contribution:
+            self._contributions[entry_id] = contribution
+        if old == contribution:
+            return False
+        for key in self._totals:
+            self._totals[key] += contribution.get(key, 0.0) - old.get(key, 0.0)
+        self._async_notify()
+        return True
+
+    @callback
+    def _async_notify(self) -> None:
+        for listener in list(self._listeners):
+            listener()
+
+    @callback
+    def async_add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call ``listener`` whenever a fleet total changes."""
+        self._listeners.append(listener)
+        return functools.partial(self._listeners.remove, listener)
+
+    @property
+    def reporting_members(self) -> int:
+        """Return how many members' latest poll succeeded."""
+        return len(self._reporting)
+
+    @property
+    def complete(self) -> bool:
+        """Return True while every enabled battery entry is a member and reporting."""
+        expected = {
+            entry.entry_id
+            for entry in self.hass.config_entries.async_entries(DOMAIN)
+            if not entry.data.get(CONF_FLEET) and entry.disabled_by is None
+        }
+        return bool(self._reporting) and expected <= self._reporting
+
+    def online_members(self) -> list[str]:
+        """Return the members whose latest poll succeeded and has data."""
+        return [
+            entry_id
+            for entry_id, coordinator in self.members.items()
+            if coordinator.last_update_success and coordinator.data is not None
+        ]
+
+    def value(self, key: str) -> float | None:
+        """Return a fleet total, or None while no member reports it.
+
+        Energy counters are None unless every battery reports.
+        """
+        if key in FLEET_COUNTERS and not self.complete:
+            return None
+        if key == "soc":
+            capacity = self._totals[_SOC_CAPACITY]
+            return round(self._totals[_WEIGHTED_SOC] / capacity, 1) if capacity > 0 else None
+        if not any(key in contribution for contribution in self._contributions.values()):
+            return None
+        return round(self._totals[key], 3)
+
+    def headroom(self, entry_id: str, discharge: bool) -> float:
+        """Return how much power a member can add in one direction, in W."""
+        data = self.members[entry_id].data
+        soc = get_register_value(data, _SOC)
+        if discharge:
+            limit = get_register_value(data, _SOC_MIN)
+            rate = get_register_value(data, _MAX_DISCHARGE_RATE)
+            exhausted = isinstance(soc, (int, float)) and isinstance(limit, (int, float)) and soc <= limit
+        else:
+            limit = get_register_value(data, _SOC_MAX)
+            rate = get_register_value(data, _MAX_CHARGE_RATE)
+            exhausted = isinstance(soc, (int, float)) and isinstance(limit, (int, float)) and soc >= limit
+        if exhausted or not isinstance(rate, (int, float)) or rate <= 0:
+            return 0.0
+        return float(rate)
+
+    def split_power(self, power: float) -> dict[str, float]:
+        """Split a fleet Set Power across members in proportion to their headroom.
+
+        Positive power discharges and negative charges. Members without
+        headroom in the requested direction get 0 W; members that are offline
+        are left out.
+        """
+        discharge = power >= 0
+        headrooms = {
+            entry_id: self.headroom(entry_id, discharge) for entry_id in self.online_members()
+        }
+        available = sum(headrooms.values())
+        if available <= 0:
+            return dict.fromkeys(headrooms, 0.0)
+        share = min(abs(power), available) / available
+        sign = 1.0 if discharge else -1.0
+        return {entry_id: round(sign * headroom * share) for entry_id, headroom in headrooms.items()}
+
+    async def async_set_power(self, power: float) -> bool:
+        """Write each online member's share of a fleet Set Power concurrently."""
+        split = self.split_power(power)
+        self.last_split = split
+        if offline := sorted(self.members.keys() - split.keys()):
+            _LOGGER.warning("Fleet Set Power skips offline batteries %s", offline)
+        if not split:
+            return False
+        if abs(power) > sum(abs(value) for value in split.values()) + len(split):
+            _LOGGER.warning(
+                "Fleet Set Power %.0f W exceeds the available headroom; writing %.0f W",
+                power,
+                sum(split.values()),
+            )
+
+        async def write(entry_id: str, value: float) -> bool:
+            coordinator = self.members[entry_id]
+            raw = coordinator.writer.to_raw(SET_POWER_REGISTER, value)
+            success = await self.hass.async_add_executor_job(
+                coordinator.modbus_client.write_register, SET_POWER_REGISTER, raw
+            )
+            if success:
+                coordinator.async_set_optimistic_value(SET_POWER_REGISTER, value)
+                coordinator.async_notify_register_changed(SET_POWER_REGISTER)
+            else:
+                _LOGGER.error(
+                    "Fleet write of %.0f W to %s failed: %s",
+                    value,
+                    entry_id,
+                    coordinator.modbus_client.last_write_error or "unknown error",
+                )
+            return success
+
+        results = await asyncio.gather(*(write(entry_id, value) for entry_id, value in split.items()))
+        return all(results)
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return totals and the last power split."""
+        return {
+            "members": sorted(self.members),
+            "reporting_members": self.reporting_members,
+            "complete": self.complete,
+            "totals": {key: self.value(key) for key in (*FLEET_SUMS, "soc")},
+            "last_split": self.last_split,
+        }
+
+
+async def async_setup_fleet_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up the fleet entry and attach every loaded battery."""
+    fleet = hass.data[DATA_FLEET] = APstorageFleet(hass)
+    for entry_data in hass.data.get(DOMAIN, {}).values():
+        if (coordinator := entry_data.get("coordinator")) is not None:
+            fleet.async_add_member(coordinator)
+    hass.data[DOMAIN][entry.entry_id] = {"fleet": fleet}
+    await hass.config_entries.async_forward_entry_setups(entry, FLEET_PLATFORMS)
+    return True
+
+
+async def async_unload_fleet_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload the fleet entry."""
+    if unload_ok := await hass.config_entries.async_unload_platforms(entry, FLEET_PLATFORMS):
+        fleet: APstorageFleet = hass.data[DOMAIN].pop(entry.entry_id)["fleet"]
+        fleet.async_shutdown()
+        hass.data.pop(DATA_FLEET, None)
+    return unload_ok
@@ -0,0 +1,283 @@
+"""Append-only binary log of every poll's raw register frames.
+
+Each log file starts with a header describing the batch layout, followed by
+one record per poll::
+
+    file header   ">6sBH"  magic b"APSRAW", format version, batch count
+    per batch     ">HH"    start register, register count
+    record header ">HdQH"  sync word 0xA55A, Unix timestamp, bitmask of the
+                           batches that were read, word count
+    record body            the batches' big-endian uint16 words in layout
+                           order; batches that failed are zero-filled
+
+A sparse ``.apidx`` file next to each log holds ``">dQ"`` entries (timestamp,
+byte offset of that record), so readers can seek to a time without scanning.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import os
+import struct
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .const import (
+    DOMAIN,
+    LOGGER_NAME,
+    RAW_RECORDER_FILE_BYTES,
+    RAW_RECORDER_FLUSH_BYTES,
+    RAW_RECORDER_FLUSH_SECONDS,
+    RAW_RECORDER_INDEX_SECONDS,
+    RAW_RECORDER_MAX_FILES,
+)
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+    from .decoder import BatchDecoder
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+FILE_MAGIC = b"APSRAW"
+FILE_VERSION = 1
+LOG_SUFFIX = ".apraw"
+INDEX_SUFFIX = ".apidx"
+RECORD_SYNC = 0xA55A
+_FILE_HEADER = struct.Struct(">6sBH")
+_BATCH = struct.Struct(">HH")
+_RECORD_HEADER = struct.Struct(">HdQH")
+_INDEX_ENTRY = struct.Struct(">dQ")
+
+Layout = tuple[tuple[int, int], ...]
+
+
+class RawRecord(NamedTuple):
+    """One poll read back from a log: its time and the words of each batch."""
+
+    timestamp: float
+    frames: dict[int, tuple[int, ...] | None]
+
+
+class APstorageFrameRecorder:
+    """Buffers raw poll frames and appends them to rotating log files.
+
+    Recording a poll only packs its frames into the in-memory buffer. The
+    buffer is written by an executor job once it holds
+    ``RAW_RECORDER_FLUSH_BYTES`` or its oldest poll is
+    ``RAW_RECORDER_FLUSH_SECONDS`` old, and on stop. A new file is started
+    when the current one would exceed ``max_file_bytes`` or the read plan
+    changes, and only the newest ``max_files`` files are kept.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        directory: str | os.PathLike[str],
+        prefix: str,
+        max_file_bytes: int = RAW_RECORDER_FILE_BYTES,
+        max_files: int = RAW_RECORDER_MAX_FILES,
+        flush_bytes: int = RAW_RECORDER_FLUSH_BYTES,
+        flush_seconds: float = RAW_RECORDER_FLUSH_SECONDS,
+        index_seconds: float = RAW_RECORDER_INDEX_SECONDS,
+    ) -> None:
+        self.hass = hass
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.index_seconds = index_seconds
+        self._buffer: list[tuple[float, Layout, bytes]] = []
+        self._buffered_bytes = 0
+        self._buffer_started: float | None = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        # Executor-side state of the file being appended to.
+        self._path: Path | None = None
+        self._layout: Layout | None = None
+        self._file_bytes = 0
+        self._last_indexed: float | None = None
+        self.records = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+
+    def async_record(
+        self, frames: list[tuple[BatchDecoder, bytes | None]], timestamp: float | None = None
+    ) -> None:
+        """Buffer one poll's frames; flush in the background when due."""
+        layout = tuple((decoder.start, decoder.count) for decoder, _ in frames)
+        valid = 0
+        body = []
+        for position, (decoder, frame) in enumerate(frames):
+            if frame is None:
+                body.append(bytes(decoder.count * 2))
+            else:
+                valid |= 1 << position
+                body.append(frame)
+        payload = b"".join(body)
+        if timestamp is None:
+            timestamp = time.time()
+        record = _RECORD_HEADER.pack(RECORD_SYNC, timestamp, valid, len(payload) // 2) + payload
+        self._buffer.append((timestamp, layout, record))
+        self._buffered_bytes += len(record)
+        now = time.monotonic()
+        if self._buffer_started is None:
+            self._buffer_started = now
+        due = (
+            self._buffered_bytes >= self.flush_bytes
+            or now - self._buffer_started >= self.flush_seconds
+        )
+        if due and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = self.hass.async_create_background_task(
+                self.async_flush(), f"{DOMAIN} raw recorder flush {self.prefix}"
+            )
+
+    async def async_flush(self) -> None:
+        """Write the buffered records to disk in the executor."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            entries, self._buffer = self._buffer, []
+            self._buffered_bytes = 0
+            self._buffer_started = None
+            try:
+                await self.hass.async_add_executor_job(self._write, entries)
+            except OSError as err:
+                self.write_errors += 1
+                _LOGGER.error("Could not write raw frame log in %s: %s", self.directory, err)
+
+    async def async_stop(self) -> None:
+        """Flush what is buffered; the log files stay on disk."""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self.async_flush()
+
+    def _write(self, entries: list[tuple[float, Layout, bytes]]) -> None:
+        """Append records, rotating files as needed. Runs in the executor.
+
+        The file offset and counters only advance once records are on disk.
+        After a failed write the next records start a new file, so a partly
+        written record is never followed by more.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        pending: list[bytes] = []
+        index: list[bytes] = []
+
+        def drain() -> None:
+            if pending:
+                data = b"".join(pending)
+                with self._path.open("ab") as log:
+                    log.write(data)
+                self._file_bytes += len(data)
+                self.records += len(pending)
+                self.bytes_written += len(data)
+                pending.clear()
+            if index:
+                with self._path.with_suffix(INDEX_SUFFIX).open("ab") as index_file:
+                    index_file.write(b"".join(index))
+                index.clear()
+
+        try:
+            pending_bytes = 0
+            for timestamp, layout, record in entries:
+                if (
+                    self._path is None
+                    or layout != self._layout
+                    or self._file_bytes + pending_bytes + len(record) > self.max_file_bytes
+                ):
+                    drain()
+                    pending_bytes = 0
+                    self._start_file(timestamp, layout)
+                if self._last_indexed is None or timestamp - self._last_indexed >= self.index_seconds:
+                    index.append(_INDEX_ENTRY.pack(timestamp, self._file_bytes + pending_bytes))
+                    self._last_indexed = timestamp
+                pending.append(record)
+                pending_bytes += len(record)
+            drain()
+        except OSError:
+            self._path = None
+            raise
+
+    def _start_file(self, timestamp: float, layout: Layout) -> None:
+        """Begin a new log file for ``layout`` and drop the oldest ones."""
+        path = self.directory / f"{self.prefix}-{int(timestamp * 1000):013d}{LOG_SUFFIX}"
+        header = _FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, len(layout)) + b"".join(
+            _BATCH.pack(start, count) for start, count in layout
+        )
+        path.write_bytes(header)
+        path.with_suffix(INDEX_SUFFIX).write_bytes(b"")
+        self._path = path
+        self._layout = layout
+        self._file_bytes = len(header)
+        self._last_indexed = None
+        self.bytes_written += len(header)
+        for old in log_files(self.directory, self.prefix)[: -self.max_files]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(INDEX_SUFFIX).unlink(missing_ok=True)
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the current file and write counters."""
+        return {
+            "file": self._path.name if self._path else None,
+            "file_bytes": self._file_bytes,
+            "buffered_records": len(self._buffer),
+            "records": self.records,
+            "bytes_written": self.bytes_written,
+            "write_errors": self.write_errors,
+        }
+
+
+def log_files(directory: str | os.PathLike[str], prefix: str) -> list[Path]:
+    """Return an entry's log files, oldest first."""
+    return sorted(Path(directory).glob(f"{prefix}-*{LOG_SUFFIX}"))
+
+
+def read_records(path: str | os.PathLike[str], since: float | None = None) -> Iterator[RawRecord]:
+    """Yield the records of one log file, starting at ``since`` if given.
+
+    The index is used to seek close to ``since``; a truncated last record,
+    left by a crash mid-write, ends the iteration.
+    """
+    path = Path(path)
+    with path.open("rb") as log:
+        magic, version, batch_count = _FILE_HEADER.unpack(log.read(_FILE_HEADER.size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError(f"{path} is not an APstorage raw frame log")
+        layout = [_BATCH.unpack(log.read(_BATCH.size)) for _ in range(batch_count)]
+        if since is not None and (offset := _seek_offset(path.with_suffix(INDEX_SUFFIX), since)):
+            log.seek(offset)
+        while len(header := log.read(_RECORD_HEADER.size)) == _RECORD_HEADER.size:
+            sync, timestamp, valid, word_count = _RECORD_HEADER.unpack(header)
+            if sync != RECORD_SYNC:
+                raise ValueError(f"Corrupt record at offset {log.tell() - len(header)} of {path}")
+            body = log.read(word_count * 2)
+            if len(body) < word_count * 2:
+                return
+            if since is not None and timestamp < since:
+                continue
+            words = struct.unpack(f">{word_count}H", body)
+            frames: dict[int, tuple[int, ...] | None] = {}
+            position = 0
+            for batch, (start, count) in enumerate(layout):
+                frames[start] = words[position : position + count] if valid >> batch & 1 else None
+                position += count
+            yield RawRecord(timestamp, frames)
+
+
+def _seek_offset(index_path: Path, since: float) -> int | None:
+    """Return the offset of the last indexed record at or before ``since``."""
+    try:
+        data = index_path.read_bytes()
+    except FileNotFoundError:
+        return None
+    entries = [
+        _INDEX_ENTRY.unpack_from(data, position)
+        for position in range(0, len(data) - _INDEX_ENTRY.size + 1, _INDEX_ENTRY.size)
+    ]
+    position = bisect.bisect_right([timestamp for timestamp, _ in entries], since)
+    return entries[position - 1][1] if position else None
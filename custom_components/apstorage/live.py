@@ -0,0 +1,200 @@
+"""Live register streaming to websocket subscribers, outside the state machine."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from .const import DOMAIN, LIVE_MAX_QUEUED_SAMPLES, LIVE_MAX_RATE_HZ, LOGGER_NAME
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+    from .decoder import BatchDecoder
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+@dataclass
+class _Subscriber:
+    """One websocket subscription with its own rate limit and send buffer."""
+
+    registers: tuple[int, ...]
+    min_interval: float
+    batch_seconds: float
+    send: Callable[[dict[str, Any]], None]
+    close: Callable[[], None] | None = None
+    ready: Callable[[], bool] | None = None
+    queue: deque = field(default_factory=lambda: deque(maxlen=LIVE_MAX_QUEUED_SAMPLES))
+    last_sample: float = float("-inf")
+    last_flush: float = float("-inf")
+    dropped: int = 0
+    dropped_total: int = 0
+
+
+class APstorageLiveStream:
+    """Samples a few registers at a fast rate while anyone subscribes.
+
+    The fast poll reads only the union of the subscribed registers, and only
+    while at least one subscriber is connected; samples go straight to the
+    subscribers and never become entity states. Each subscriber gets samples
+    no faster than its own rate, in batches sent every ``batch_seconds`` or
+    as soon as its buffer is full. While its ``ready`` callback reports the
+    connection backed up, batches are held; once the buffer is full the
+    oldest samples are dropped, and every batch reports how many were
+    dropped since the previous one and in total. When the entry unloads,
+    each subscriber gets a final message with ``closed`` set and its
+    subscription ends.
+    """
+
+    def __init__(self, coordinator: APstorageCoordinator) -> None:
+        self._coordinator = coordinator
+        self._subscribers: dict[int, _Subscriber] = {}
+        self._ids = itertools.count(1)
+        self._plan: list[BatchDecoder] = []
+        self._task: asyncio.Task | None = None
+        self.samples = 0
+        self.read_failures = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        """Return the number of connected subscribers."""
+        return len(self._subscribers)
+
+    def async_subscribe(
+        self,
+        registers: tuple[int, ...],
+        max_rate: float,
+        batch_seconds: float,
+        send: Callable[[dict[str, Any]], None],
+        close: Callable[[], None] | None = None,
+        ready: Callable[[], bool] | None = None,
+    ) -> Callable[[], None]:
+        """Add a subscriber and return the callback that removes it.
+
+        ``close`` is called after the final message when the stream ends
+        the subscription itself; ``ready`` returns False while the
+        subscriber cannot take another message.
+        """
+        subscriber_id = next(self._ids)
+        self._subscribers[subscriber_id] = _Subscriber(
+            registers=tuple(registers),
+            min_interval=1.0 / min(max_rate, LIVE_MAX_RATE_HZ),
+            batch_seconds=batch_seconds,
+            send=send,
+            close=close,
+            ready=ready,
+        )
+        self._rebuild_plan()
+        if self._task is None:
+            self._task = self._coordinator.hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} live stream {self._coordinator.entry_id}"
+            )
+
+        def unsubscribe() -> None:
+            if self._subscribers.pop(subscriber_id, None) is None:
+                return
+            self._rebuild_plan()
+            if not self._subscribers and self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+        return unsubscribe
+
+    def _rebuild_plan(self) -> None:
+        addresses = frozenset(
+            address for subscriber in self._subscribers.values() for address in subscriber.registers
+        )
+        self._plan = self._coordinator.build_sample_plan(addresses) if addresses else []
+
+    @property
+    def interval(self) -> float:
+        """Return the fast-poll interval: the fastest subscriber's rate."""
+        return min(
+            (subscriber.min_interval for subscriber in self._subscribers.values()),
+            default=1.0,
+        )
+
+    async def _async_run(self) -> None:
+        while self._subscribers:
+            started = time.monotonic()
+            try:
+                await self.async_sample_once()
+            except Exception as err:  # pragma: no cover
+                _LOGGER.exception("Live sample failed: %s", err)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def async_sample_once(self) -> None:
+        """Read the subscribed registers once and feed every subscriber."""
+        coordinator = self._coordinator
+        frames = await coordinator.async_sample(self._plan)
+        values = coordinator.decode_sample(frames)
+        if not values:
+            self.read_failures += 1
+            return
+        self.samples += 1
+        now = time.monotonic()
+        timestamp = round(time.time(), 3)
+        for subscriber in list(self._subscribers.values()):
+            if now - subscriber.last_sample >= subscriber.min_interval * 0.9:
+                subscriber.last_sample = now
+                if len(subscriber.queue) == subscriber.queue.maxlen:
+                    subscriber.dropped += 1
+                    subscriber.dropped_total += 1
+                    self.dropped += 1
+                subscriber.queue.append(
+                    [timestamp, *(values.get(address) for address in subscriber.registers)]
+                )
+            due = (
+                now - subscriber.last_flush >= subscriber.batch_seconds
+                or len(subscriber.queue) == subscriber.queue.maxlen
+            )
+            if subscriber.queue and due and (subscriber.ready is None or subscriber.ready()):
+                self._flush(subscriber, now)
+
+    @staticmethod
+    def _flush(subscriber: _Subscriber, now: float, closed: str | None = None) -> None:
+        message: dict[str, Any] = {
+            "registers": list(subscriber.registers),
+            "samples": list(subscriber.queue),
+            "dropped": subscriber.dropped,
+            "dropped_total": subscriber.dropped_total,
+        }
+        if closed is not None:
+            message["closed"] = closed
+        subscriber.queue.clear()
+        subscriber.dropped = 0
+        subscriber.last_flush = now
+        subscriber.send(message)
+
+    async def async_stop(self, reason: str = "entry_unloaded") -> None:
+        """End every subscription with a final message and stop the fast poll."""
+        subscribers = list(self._subscribers.values())
+        self._subscribers.clear()
+        self._plan = []
+        now = time.monotonic()
+        for subscriber in subscribers:
+            self._flush(subscriber, now, closed=reason)
+            if subscriber.close is not None:
+                subscriber.close()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return subscriber and sampling counters."""
+        return {
+            "subscribers": self.subscriber_count,
+            "interval": self.interval if self._subscribers else None,
+            "samples": self.samples,
+            "read_failures": self.read_failures,
+            "dropped": self.dropped,
+        }
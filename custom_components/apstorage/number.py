@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Callable
+from typing import Any
 
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
@@ -13,23 +13,20 @@ from homeassistant.components.number import (
 )
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.entity import EntityCategory
-from homeassistant.helpers.event import async_call_later
-
-# How long to wait after the last Set Power call before sending to the device.
-_WRITE_DEBOUNCE_SECONDS = 0.4
 
 from . import APstorageCoordinator
 from .const import (
+    CONF_FLEET,
     DOMAIN,
     APSTORAGE_REGISTERS,
     APSTORAGE_READONLY_NUMBER_REGISTERS,
-    APSTORAGE_SCALE_REGISTERS,
     APSTORAGE_WRITABLE_REGISTERS,
     DIAGNOSTIC_REGISTERS,
     LOGGER_NAME,
+    SET_POWER_REGISTER,
 )
-from .entity_base import APstorageEntityMixin
-from .entity_naming import async_migrate_entity_id, get_suggested_object_id
+from .entity_base import APstorageEntityMixin, APstorageFleetEntityMixin
+from .snapshot import get_register_value
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
@@ -38,6 +35,11 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     """Set up number platform from ConfigEntry."""
+    if entry.data.get(CONF_FLEET):
+        fleet = hass.data[DOMAIN][entry.entry_id]["fleet"]
+        async_add_entities([APstorageFleetSetPower(fleet, entry)])
+        return
+
     coordinator: APstorageCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
 
     entities = []
@@ -59,7 +61,7 @@ async def async_setup_entry(
             )
 
     for address in APSTORAGE_READONLY_NUMBER_REGISTERS:
-        if address in APSTORAGE_REGISTERS:
+        if address in APSTORAGE_REGISTERS and address not in coordinator.unimplemented_registers:
             name, count, value_type, scale, unit, device_class = APSTORAGE_REGISTERS[address]
             entities.append(
                 APstorageReadonlyNumber(
@@ -93,6 +95,7 @@ class APstorageReadonlyNumber(APstorageEntityMixin, NumberEntity):
         self._name = name
         self._unit_of_measurement = unit_of_measurement
         self._device_class = device_class
+        self._watched_addresses = (address,)
 
     @property
     def name(self) -> str:
@@ -107,7 +110,7 @@ class APstorageReadonlyNumber(APstorageEntityMixin, NumberEntity):
     @property
     def suggested_object_id(self) -> str | None:
         """Return the preferred object ID for this number."""
-        return get_suggested_object_id(self._coordinator.data, self._name)
+        return self._cached_suggested_object_id()
 
     @property
     def native_unit_of_measurement(self) -> str | None:
@@ -129,10 +132,9 @@ class APstorageReadonlyNumber(APstorageEntityMixin, NumberEntity):
     @property
     def native_value(self) -> float | None:
         """Return the current numeric value."""
-        if self._coordinator.data and self._address in self._coordinator.data:
-            value = self._coordinator.data[self._address].get("value")
-            if isinstance(value, (int, float)):
-                return float(value)
+        value = get_register_value(self._coordinator.data, self._address)
+        if isinstance(value, (int, float)):
+            return float(value)
         return None
 
     @property
@@ -156,9 +158,9 @@ class APstorageReadonlyNumber(APstorageEntityMixin, NumberEntity):
         return NumberMode.BOX
 
     @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self._coordinator.last_update_success
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return stale/data_age attributes while showing last-known values."""
+        return self._freshness_attributes()
 
     @property
     def should_poll(self) -> bool:
@@ -173,27 +175,12 @@ class APstorageReadonlyNumber(APstorageEntityMixin, NumberEntity):
         """Register with coordinator."""
         await super().async_added_to_hass()
         self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+            self._coordinator.async_add_listener(self._async_handle_coordinator_update)
         )
 
-        self._async_ensure_prefixed_entity_id()
-
-    def _async_ensure_prefixed_entity_id(self) -> None:
-        """Rename the entity once the device serial number is available."""
-        try:
-            async_migrate_entity_id(
-                self.hass,
-                self.entity_id,
-                self._coordinator.data,
-                self._name,
-            )
-        except ValueError:
-            _LOGGER.warning("Unable to rename entity %s", self.entity_id)
-
     async def async_update(self) -> None:
         """Update via coordinator."""
         await self._coordinator.async_request_refresh()
-        self._async_ensure_prefixed_entity_id()
 
 
 class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
@@ -219,13 +206,10 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
         self._device_class = device_class
         self._value_type = value_type
         self._scale = scale
-        self._min_value = float(meta.get("min", 0))
-        self._max_value = float(meta.get("max", 100))
         self._step = float(meta.get("step", 1))
         self._mode = str(meta.get("mode", "box"))
-        # Debounce state: cancel handle + the last requested (value, int_value) pair.
-        self._debounce_unsub: Callable | None = None
-        self._pending_write: tuple[float, int] | None = None
+        # Set Power range follows the dynamic max charge/discharge rates.
+        self._watched_addresses = (address, 40074, 40075)
 
     @property
     def name(self) -> str:
@@ -240,7 +224,7 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
     @property
     def suggested_object_id(self) -> str | None:
         """Return the preferred object ID for this number."""
-        return get_suggested_object_id(self._coordinator.data, self._name)
+        return self._cached_suggested_object_id()
 
     @property
     def native_unit_of_measurement(self) -> str | None:
@@ -255,29 +239,17 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
     @property
     def native_value(self) -> float | None:
         """Return the sensor state."""
-        if self._coordinator.data and self._address in self._coordinator.data:
-            return self._coordinator.data[self._address].get("value")
-        return None
+        return get_register_value(self._coordinator.data, self._address)
 
     @property
     def native_min_value(self) -> float:
         """Return the minimum value."""
-        if self._address == 40183 and self._coordinator.data:
-            max_charge = self._coordinator.data.get(40074, {}).get("value")
-            # Only trust dynamic limits when they are sane positive values.
-            if isinstance(max_charge, (int, float)) and max_charge > 0:
-                return -float(max_charge)
-        return self._min_value
+        return self._coordinator.writer.value_range(self._address)[0]
 
     @property
     def native_max_value(self) -> float:
         """Return the maximum value."""
-        if self._address == 40183 and self._coordinator.data:
-            max_discharge = self._coordinator.data.get(40075, {}).get("value")
-            # Only trust dynamic limits when they are sane positive values.
-            if isinstance(max_discharge, (int, float)) and max_discharge > 0:
-                return float(max_discharge)
-        return self._max_value
+        return self._coordinator.writer.value_range(self._address)[1]
 
     @property
     def native_step(self) -> float:
@@ -289,11 +261,6 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
         """Return the number mode."""
         return NumberMode.SLIDER if self._mode == "slider" else NumberMode.BOX
 
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self._coordinator.last_update_success
-
     @property
     def entity_registry_enabled_default(self) -> bool:
         """Expose writable controls by default in Home Assistant."""
@@ -302,11 +269,13 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
     @property
     def extra_state_attributes(self) -> dict[str, Any] | None:
         """Return extra attributes for writable control entities."""
-        if self._address == 40183:
+        freshness = self._freshness_attributes()
+        if self._address == SET_POWER_REGISTER:
             return {
                 "sign_convention": "positive=discharge, negative=charge, zero=standby",
+                **(freshness or {}),
             }
-        return None
+        return freshness
 
     @property
     def should_poll(self) -> bool:
@@ -315,113 +284,53 @@ class APstorageWritableNumber(APstorageEntityMixin, NumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Set the register value, debouncing rapid calls so only the last write is sent."""
-        effective_scale = self._scale
-        scale_reg = APSTORAGE_SCALE_REGISTERS.get(self._address)
-        if scale_reg is not None and self._coordinator.data and scale_reg in self._coordinator.data:
-            sf = self._coordinator.data[scale_reg].get("value")
-            if sf is not None:
-                effective_scale = 10 ** int(sf)
-
-        # Convert displayed value back to raw register value.
-        # Example: scale 0.1 means 85.6% is stored as 856.
-        raw_value = value
-        if effective_scale not in (0, 1):
-            raw_value = value / effective_scale
-
-        int_value = int(round(raw_value))
-
-        _LOGGER.debug(
-            "Set Power write requested (debounce): value=%s effective_scale=%s raw=%s int=%s range=%s..%s",
-            value,
-            effective_scale,
-            raw_value,
-            int_value,
-            self.native_min_value,
-            self.native_max_value,
-        )
-
-        if int_value < -32768 or int_value > 32767:
-            raise HomeAssistantError(
-                f"Requested value {value} is outside the supported int16 range for register {self._address}"
-            )
-
-        if value < self.native_min_value or value > self.native_max_value:
-            raise HomeAssistantError(
-                f"Requested value {value} is outside the safe range {self.native_min_value}..{self.native_max_value}"
-            )
-
-        # Cancel any previously scheduled write; this new value supersedes it.
-        if self._debounce_unsub is not None:
-            self._debounce_unsub()
-            self._debounce_unsub = None
-
-        # Store the latest requested write.
-        self._pending_write = (value, int_value)
-
+        self._coordinator.writer.async_request_write(self._address, value)
         # Update the UI immediately so the slider/box feels responsive.
-        if self._coordinator.data and self._address in self._coordinator.data:
-            self._coordinator.data[self._address]["value"] = value
         self.async_write_ha_state()
 
-        # Schedule the actual Modbus write after the debounce window.
-        self._debounce_unsub = async_call_later(
-            self.hass, _WRITE_DEBOUNCE_SECONDS, self._async_execute_pending_write
-        )
-
-    async def _async_execute_pending_write(self, _now: Any) -> None:
-        """Perform the Modbus write for the last pending value."""
-        self._debounce_unsub = None
-        if self._pending_write is None:
-            return
-        value, int_value = self._pending_write
-        self._pending_write = None
-
-        try:
-            success = await self._coordinator.hass.async_add_executor_job(
-                self._coordinator.modbus_client.write_register, self._address, int_value
-            )
-            if success:
-                _LOGGER.info("Set register %d to %d", self._address, int_value)
-            else:
-                detail = self._coordinator.modbus_client.last_write_error
-                _LOGGER.error(
-                    "Failed to set register %d to %d: %s",
-                    self._address,
-                    int_value,
-                    detail or "unknown error",
-                )
-        except Exception as err:
-            _LOGGER.exception("Error writing register %d: %s", self._address, err)
-
     async def async_added_to_hass(self) -> None:
         """Register with coordinator."""
         await super().async_added_to_hass()
         self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+            self._coordinator.async_add_listener(self._async_handle_coordinator_update)
         )
 
-        self._async_ensure_prefixed_entity_id()
-
-    async def async_will_remove_from_hass(self) -> None:
-        """Cancel any pending debounced write when the entity is removed."""
-        if self._debounce_unsub is not None:
-            self._debounce_unsub()
-            self._debounce_unsub = None
-        self._pending_write = None
-
-    def _async_ensure_prefixed_entity_id(self) -> None:
-        """Rename the entity once the device serial number is available."""
-        try:
-            async_migrate_entity_id(
-                self.hass,
-                self.entity_id,
-                self._coordinator.data,
-                self._name,
-            )
-        except ValueError:
-            _LOGGER.warning("Unable to rename entity %s", self.entity_id)
-
     async def async_update(self) -> None:
         """Update via coordinator."""
         await self._coordinator.async_request_refresh()
-        self._async_ensure_prefixed_entity_id()
+
+
+class APstorageFleetSetPower(APstorageFleetEntityMixin, NumberEntity):
+    """Fleet-wide Set Power, split across batteries by their headroom."""
+
+    _attr_name = "Fleet Set Power"
+    _attr_native_unit_of_measurement = "W"
+    _attr_device_class = "power"
+    _attr_native_step = 1
+    _attr_mode = NumberMode.BOX
+
+    def __init__(self, fleet: Any, entry: ConfigEntry):
+        self._fleet = fleet
+        self._entry = entry
+        self._attr_unique_id = f"apstorage_{entry.entry_id}_{SET_POWER_REGISTER}"
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the sum of every battery's Set Power."""
+        return self._fleet.value("set_power")
+
+    @property
+    def native_min_value(self) -> float:
+        """Return the fleet's combined max charge rate as a negative bound."""
+        return -(self._fleet.value("max_charge_rate") or 0)
+
+    @property
+    def native_max_value(self) -> float:
+        """Return the fleet's combined max discharge rate."""
+        return self._fleet.value("max_discharge_rate") or 0
+
+    async def async_set_native_value(self, value: float) -> None:
+        """Split the value across batteries and write every share at once."""
+        if not await self._fleet.async_set_power(value):
+            raise HomeAssistantError(f"Failed to set fleet power to {value} W on every battery")
+
@@ -0,0 +1,198 @@
+"""Link probing for the config flow: register offset, unit ID and link speed."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .const import DEFAULT_MAX_BATCH_SIZE, LOGGER_NAME
+from .discovery import SUNSPEC_BASE_ADDRESS, SUNSPEC_MARKER
+from .transport import APstorageModbusTcpPipeline
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+PROBE_OFFSETS = (0, -1, 1)
+PROBE_UNITS = (1, 2, 3)
+PROBE_TIMEOUT_SECONDS = 1.0
+
+# The SunSpec common model (ID 1): marker, header and 66 registers of body.
+_COMMON_MODEL_ID = 1
+_HEADER_COUNT = 4
+_TIMING_COUNT = 70
+_RTT_SAMPLES = 3
+# A single batch read should finish well within the Modbus client timeout.
+_BATCH_TIME_BUDGET_SECONDS = 1.0
+# Never split the longest table field (a 16-register string).
+_MIN_BATCH_SIZE = 16
+# Polls should keep the link busy for at most a tenth of the scan interval.
+_POLL_DUTY_FACTOR = 10
+_MIN_SCAN_INTERVAL = 5
+_MAX_SCAN_INTERVAL = 300
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    """The configuration that answered with a valid SunSpec header."""
+
+    unit: int
+    offset: int
+    # Round trip of a minimal request, and the extra time per register read.
+    rtt: float
+    register_time: float
+
+    @property
+    def recommended_batch_size(self) -> int:
+        """Return the largest batch that reads within the time budget."""
+        if self.register_time <= 0:
+            return DEFAULT_MAX_BATCH_SIZE
+        fits = int((_BATCH_TIME_BUDGET_SECONDS - self.rtt) / self.register_time)
+        return max(_MIN_BATCH_SIZE, min(DEFAULT_MAX_BATCH_SIZE, fits))
+
+    def recommended_scan_interval(self, batches: list[tuple[int, int]]) -> int:
+        """Return a scan interval that keeps polls to a small share of link time.
+
+        ``batches`` are the (first, last) register spans read per poll.
+        """
+        registers = sum(end - start + 1 for start, end in batches)
+        poll_seconds = len(batches) * self.rtt + registers * self.register_time
+        interval = math.ceil(poll_seconds * _POLL_DUTY_FACTOR)
+        return max(_MIN_SCAN_INTERVAL, min(_MAX_SCAN_INTERVAL, interval))
+
+
+def candidates(unit: int, offset: int = 0) -> list[tuple[int, int]]:
+    """Return (unit, offset) pairs to probe, the user's choice first."""
+    units = dict.fromkeys((int(unit), *PROBE_UNITS))
+    offsets = dict.fromkeys((int(offset), *PROBE_OFFSETS))
+    return [(u, o) for u in units for o in offsets]
+
+
+def valid_header(words: Iterable[int] | None) -> bool:
+    """Return True for "SunS" followed by the common model header."""
+    if words is None:
+        return False
+    words = list(words)
+    return (
+        len(words) >= _HEADER_COUNT
+        and tuple(words[:2]) == SUNSPEC_MARKER
+        and words[2] == _COMMON_MODEL_ID
+    )
+
+
+def _words(payload: bytes | None) -> list[int] | None:
+    if payload is None:
+        return None
+    return [int.from_bytes(payload[i : i + 2], "big") for i in range(0, len(payload), 2)]
+
+
+async def async_probe_tcp(
+    hass: HomeAssistant,
+    host: str,
+    port: int,
+    probes: list[tuple[int, int]],
+    timeout: float = PROBE_TIMEOUT_SECONDS,
+) -> ProbeResult | None:
+    """Probe every (unit, offset) candidate concurrently over one connection."""
+    pipeline = APstorageModbusTcpPipeline(hass, host, port, window=len(probes), timeout=timeout)
+    try:
+        if not await pipeline.async_connect():
+            return None
+        answers = await asyncio.gather(
+            *(
+                pipeline.async_read(unit, SUNSPEC_BASE_ADDRESS + offset, _HEADER_COUNT)
+                for unit, offset in probes
+            )
+        )
+        valid = [probe for probe, answer in zip(probes, answers) if valid_header(_words(answer))]
+        if not valid and pipeline.window < len(probes):
+            # The device mishandled concurrent probes; retry them one by one.
+            valid = [
+                (unit, offset)
+                for unit, offset in probes
+                if valid_header(
+                    _words(await pipeline.async_read(unit, SUNSPEC_BASE_ADDRESS + offset, _HEADER_COUNT))
+                )
+            ]
+        if not valid:
+            return None
+
+        unit, offset = valid[0]
+
+        async def timed(count: int) -> float | None:
+            started = time.monotonic()
+            answer = await pipeline.async_read(unit, SUNSPEC_BASE_ADDRESS + offset, count)
+            return time.monotonic() - started if answer is not None else None
+
+        return await _async_measure(unit, offset, timed)
+    finally:
+        await pipeline.async_close()
+
+
+def probe_serial(
+    port: str,
+    baudrate: int,
+    probes: list[tuple[int, int]],
+    timeout: float = PROBE_TIMEOUT_SECONDS,
+) -> ProbeResult | None:
+    """Probe (unit, offset) candidates in turn on a serial port.
+
+    RTU allows one transaction on the bus at a time, so candidates cannot be
+    probed concurrently. Runs in the executor.
+    """
+    from pymodbus.client import ModbusSerialClient
+
+    client = ModbusSerialClient(
+        port=port, baudrate=baudrate, stopbits=1, bytesize=8, parity="N", timeout=timeout
+    )
+    if not client.connect():
+        return None
+    try:
+
+        def read(unit: int, offset: int, count: int) -> list[int] | None:
+            try:
+                response = client.read_holding_registers(
+                    address=SUNSPEC_BASE_ADDRESS + offset, count=count, device_id=unit
+                )
+            except Exception as err:  # pragma: no cover
+                _LOGGER.debug("Probe of unit %d offset %d failed: %s", unit, offset, err)
+                return None
+            return None if response.isError() else response.registers
+
+        for unit, offset in probes:
+            if valid_header(read(unit, offset, _HEADER_COUNT)):
+                break
+        else:
+            return None
+
+        def timed(count: int) -> float | None:
+            started = time.monotonic()
+            answer = read(unit, offset, count)
+            return time.monotonic() - started if answer is not None else None
+
+        samples = [timed(_HEADER_COUNT) for _ in range(_RTT_SAMPLES)]
+        return _result(unit, offset, samples, timed(_TIMING_COUNT))
+    finally:
+        client.close()
+
+
+async def _async_measure(unit, offset, timed) -> ProbeResult:
+    samples = [await timed(_HEADER_COUNT) for _ in range(_RTT_SAMPLES)]
+    return _result(unit, offset, samples, await timed(_TIMING_COUNT))
+
+
+def _result(
+    unit: int, offset: int, samples: list[float | None], long_read: float | None
+) -> ProbeResult:
+    """Build the result from short-read samples and one long read."""
+    measured = [sample for sample in samples if sample is not None]
+    rtt = min(measured) if measured else PROBE_TIMEOUT_SECONDS
+    register_time = 0.0
+    if long_read is not None:
+        register_time = max(0.0, (long_read - rtt) / (_TIMING_COUNT - _HEADER_COUNT))
+    return ProbeResult(unit, offset, rtt, register_time)
@@ -0,0 +1,180 @@
+"""Local Modbus TCP server sharing the APstorage connection with other consumers."""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import logging
+import struct
+from typing import TYPE_CHECKING
+
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DEFAULT_PROXY_BIND_HOST, LOGGER_NAME, SET_POWER_REGISTER
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+_MBAP_HEADER = struct.Struct(">HHHB")
+_ADDRESS_COUNT = struct.Struct(">HH")
+_WRITE_MULTIPLE = struct.Struct(">HHBH")
+
+_READ_HOLDING_REGISTERS = 0x03
+_WRITE_SINGLE_REGISTER = 0x06
+_WRITE_MULTIPLE_REGISTERS = 0x10
+_MAX_READ_COUNT = 125
+
+_ILLEGAL_FUNCTION = 0x01
+_ILLEGAL_DATA_ADDRESS = 0x02
+_ILLEGAL_DATA_VALUE = 0x03
+# The proxied device has not delivered these registers (yet).
+_GATEWAY_TARGET_FAILED = 0x0B
+
+# Registers consumers may write; everything else is rejected.
+_PROXY_WRITABLE_REGISTERS = frozenset({SET_POWER_REGISTER})
+
+
+class APstorageModbusProxy:
+    """Modbus TCP server answering from the coordinator's latest raw frames.
+
+    Reads of holding registers are served from memory and never reach the
+    device. Writes to Set Power go through the coordinator's writer, so they
+    get the same range checks, debouncing and rate limiting as the number
+    entity. Addresses use the device's own wire addressing, so consumers can
+    point at the proxy without changing their register maps.
+
+    The server has no authentication: anyone who can reach ``host`` can read
+    the battery and change its Set Power, so it binds to loopback by default.
+    """
+
+    def __init__(
+        self,
+        coordinator: APstorageCoordinator,
+        port: int,
+        host: str = DEFAULT_PROXY_BIND_HOST,
+    ) -> None:
+        self._coordinator = coordinator
+        self.host = host
+        self.port = port
+        self._server: asyncio.AbstractServer | None = None
+        self.requests = 0
+        self.rejected = 0
+
+    async def async_start(self) -> None:
+        """Start listening for Modbus TCP clients."""
+        self._server = await asyncio.start_server(
+            self._async_handle_client, self.host, self.port
+        )
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        _LOGGER.info("APstorage Modbus proxy listening on %s:%d", self.host, self.port)
+        if not is_loopback(self.host):
+            _LOGGER.warning(
+                "APstorage Modbus proxy on %s:%d accepts unauthenticated Set Power writes "
+                "from any host that can reach it",
+                self.host,
+                self.port,
+            )
+
+    async def async_stop(self) -> None:
+        """Stop the server and disconnect its clients."""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _async_handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(_MBAP_HEADER.size)
+                transaction_id, protocol_id, length, unit = _MBAP_HEADER.unpack(header)
+                if length < 2:
+                    break
+                pdu = await reader.readexactly(length - 1)
+                if protocol_id != 0:
+                    continue
+                response = self.handle_pdu(pdu)
+                writer.write(
+                    _MBAP_HEADER.pack(transaction_id, 0, len(response) + 1, unit) + response
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def handle_pdu(self, pdu: bytes) -> bytes:
+        """Return the response PDU for a request PDU."""
+        self.requests += 1
+        function = pdu[0]
+        if function == _READ_HOLDING_REGISTERS and len(pdu) == 5:
+            address, count = _ADDRESS_COUNT.unpack_from(pdu, 1)
+            if not 1 <= count <= _MAX_READ_COUNT:
+                return self._exception(function, _ILLEGAL_DATA_VALUE)
+            return self._read(function, address, count)
+        if function == _WRITE_SINGLE_REGISTER and len(pdu) == 5:
+            address, value = _ADDRESS_COUNT.unpack_from(pdu, 1)
+            code = self._write(address, value)
+            return pdu if code is None else self._exception(function, code)
+        if function == _WRITE_MULTIPLE_REGISTERS and len(pdu) >= 6:
+            address, count, byte_count, value = _WRITE_MULTIPLE.unpack_from(pdu, 1)
+            if count != 1 or byte_count != 2:
+                return self._exception(function, _ILLEGAL_DATA_ADDRESS)
+            code = self._write(address, value)
+            return pdu[:5] if code is None else self._exception(function, code)
+        return self._exception(function, _ILLEGAL_FUNCTION)
+
+    def _exception(self, function: int, code: int) -> bytes:
+        self.rejected += 1
+        return bytes((function | 0x80, code))
+
+    def _read(self, function: int, wire_address: int, count: int) -> bytes:
+        """Assemble the requested span from the cached raw batch frames."""
+        coordinator = self._coordinator
+        address = wire_address - coordinator.modbus_client.register_address_offset
+        end = address + count
+        payload = bytearray()
+        for decoder in coordinator.read_plan:
+            batch_end = decoder.start + decoder.count
+            if batch_end <= address or decoder.start > address:
+                continue
+            frame = coordinator.raw_frames.get(decoder.start)
+            if not frame:
+                return self._exception(function, _GATEWAY_TARGET_FAILED)
+            take_end = min(end, batch_end)
+            payload += frame[(address - decoder.start) * 2 : (take_end - decoder.start) * 2]
+            address = take_end
+            if address == end:
+                return bytes((function, len(payload))) + payload
+        return self._exception(function, _ILLEGAL_DATA_ADDRESS)
+
+    def _write(self, wire_address: int, raw: int) -> int | None:
+        """Forward a single-register write; return an exception code on rejection."""
+        coordinator = self._coordinator
+        address = wire_address - coordinator.modbus_client.register_address_offset
+        if address not in _PROXY_WRITABLE_REGISTERS:
+            return _ILLEGAL_DATA_ADDRESS
+        signed = raw - 0x10000 if raw > 0x7FFF else raw
+        try:
+            coordinator.writer.async_request_write(
+                address, coordinator.writer.from_raw(address, signed)
+            )
+        except HomeAssistantError as err:
+            _LOGGER.debug("Rejected proxied write to register %d: %s", address, err)
+            return _ILLEGAL_DATA_VALUE
+        coordinator.async_notify_register_changed(address)
+        return None
+
+
+def is_loopback(host: str) -> bool:
+    """Return True if ``host`` is a loopback address or ``localhost``."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
@@ -0,0 +1,231 @@
+"""Timed Set Power schedule owned by the coordinator and persisted across restarts."""
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import APSTORAGE_WRITABLE_REGISTERS, DOMAIN, LOGGER_NAME, SET_POWER_REGISTER
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+_STORAGE_VERSION = 1
+# Hand the write to the executor this early, so thread scheduling does not
+# delay it; the executor thread then waits for the exact send time.
+_PREQUEUE_SECONDS = 0.5
+# Weight of the newest sample in the write round-trip average.
+_WRITE_TIME_WEIGHT = 0.3
+# A failed write is retried after this long, until the next point is due.
+_RETRY_SECONDS = 5.0
+
+
+class APstorageScheduleExecutor:
+    """Applies a timeline of Set Power points at their exact times.
+
+    Only the next point has a timer. It fires ``_PREQUEUE_SECONDS`` early
+    with the raw value already computed, and the executor job sends the
+    write half a measured write round trip before the scheduled time, so the
+    device applies it close to on time. Writes skip the writer's debounce and
+    rate limit. The remaining points are stored, so the schedule survives a
+    restart. Points missed while Home Assistant was down are dropped, except
+    the latest one, which is applied at startup.
+
+    New points must lie within the live Max Charge/Discharge Rate, and each
+    point is clamped to the limits again when it fires, since they may have
+    dropped since it was scheduled. A point whose write fails is retried
+    every ``_RETRY_SECONDS`` until it succeeds or the next point is due.
+    """
+
+    def __init__(self, coordinator: APstorageCoordinator) -> None:
+        self._coordinator = coordinator
+        self._store: Store[dict[str, Any]] = Store(
+            coordinator.hass, _STORAGE_VERSION, f"{DOMAIN}.schedule.{coordinator.entry_id}"
+        )
+        self.points: list[tuple[datetime, float]] = []
+        self._unsub: Callable[[], None] | None = None
+        self._write_seconds = 0.0
+        # Earliest time the timer may fire again after a failed write.
+        self._retry_after: datetime | None = None
+        self.applied = 0
+        self.failed = 0
+        self.last_error: str | None = None
+        self.last_latency: float | None = None
+        self.max_latency: float | None = None
+
+    @staticmethod
+    def _validate(
+        points: Iterable[tuple[datetime, float]], low: float, high: float
+    ) -> list[tuple[datetime, float]]:
+        timeline = sorted((dt_util.as_utc(at), float(power)) for at, power in points)
+        for at, power in timeline:
+            if not low <= power <= high:
+                raise HomeAssistantError(
+                    f"Scheduled power {power} W at {at.isoformat()} is outside "
+                    f"{low:.0f}..{high:.0f} W"
+                )
+        return timeline
+
+    async def async_load(self) -> None:
+        """Restore the stored schedule and arm the timer for its next point."""
+        stored = await self._store.async_load() or {}
+        try:
+            points = [
+                (dt_util.parse_datetime(at), float(power)) for at, power in stored.get("points", [])
+            ]
+            # Stored points are checked against the static range only; the
+            # live limits are applied when each point fires.
+            meta = APSTORAGE_WRITABLE_REGISTERS[SET_POWER_REGISTER]
+            timeline = self._validate(
+                (point for point in points if point[0] is not None), meta["min"], meta["max"]
+            )
+        except (HomeAssistantError, TypeError, ValueError):
+            _LOGGER.warning("Ignoring malformed stored Set Power schedule")
+            timeline = []
+        now = dt_util.utcnow()
+        missed = [point for point in timeline if point[0] <= now]
+        self.points = [point for point in timeline if point[0] > now]
+        if missed:
+            _LOGGER.info(
+                "Applying Set Power %.0f W scheduled for %s, missed during downtime",
+                missed[-1][1],
+                missed[-1][0].isoformat(),
+            )
+            self.points.insert(0, (now, missed[-1][1]))
+        self._async_arm()
+
+    async def async_set_points(self, points: Iterable[tuple[datetime, float]]) -> None:
+        """Replace the schedule; an empty timeline clears it."""
+        timeline = self._validate(
+            points, *self._coordinator.writer.value_range(SET_POWER_REGISTER)
+        )
+        now = dt_util.utcnow()
+        self.points = [point for point in timeline if point[0] > now]
+        if len(self.points) < len(timeline):
+            _LOGGER.debug("Dropped %d schedule points in the past", len(timeline) - len(self.points))
+        self._retry_after = None
+        await self._async_save()
+        self._async_arm()
+
+    async def _async_save(self) -> None:
+        await self._store.async_save(
+            {"points": [[at.isoformat(), power] for at, power in self.points]}
+        )
+
+    @callback
+    def _async_arm(self) -> None:
+        """Point the single timer at the next scheduled point."""
+        self.async_cancel()
+        if not self.points:
+            return
+        at = self.points[0][0]
+        fire_at = max(dt_util.utcnow(), at - timedelta(seconds=_PREQUEUE_SECONDS))
+        if self._retry_after is not None:
+            fire_at = max(fire_at, self._retry_after)
+        self._unsub = async_track_point_in_utc_time(self._coordinator.hass, self._async_fire, fire_at)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Cancel the timer; the stored schedule is kept."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    async def _async_fire(self, _now: datetime) -> None:
+        """Send the pre-computed write for the next point at its scheduled time."""
+        self._unsub = None
+        if not self.points:
+            return
+        # Take the point out now: async_set_points may replace the timeline
+        # while the write is in the executor.
+        timeline = self.points
+        at, power = timeline.pop(0)
+        coordinator = self._coordinator
+        low, high = coordinator.writer.value_range(SET_POWER_REGISTER)
+        if not low <= power <= high:
+            _LOGGER.warning(
+                "Scheduled Set Power %.0f W is outside the current %.0f..%.0f W; clamping",
+                power,
+                low,
+                high,
+            )
+            power = min(max(power, low), high)
+        raw = coordinator.writer.to_raw(SET_POWER_REGISTER, power)
+        # Map the wall-clock point onto the monotonic clock the executor waits on.
+        send_at = (
+            time.monotonic()
+            + (at - dt_util.utcnow()).total_seconds()
+            - self._write_seconds / 2
+        )
+        try:
+            success = await coordinator.hass.async_add_executor_job(self._write_at, send_at, raw)
+        except Exception as err:  # pragma: no cover
+            _LOGGER.exception("Scheduled Set Power write failed: %s", err)
+            success = False
+        latency = (dt_util.utcnow() - at).total_seconds()
+        if success:
+            self._retry_after = None
+            self.applied += 1
+            self.last_latency = latency
+            self.max_latency = latency if self.max_latency is None else max(self.max_latency, latency)
+            _LOGGER.info("Applied scheduled Set Power %.0f W, %.3f s after schedule", power, latency)
+            coordinator.async_set_optimistic_value(SET_POWER_REGISTER, power)
+            coordinator.async_notify_register_changed(SET_POWER_REGISTER)
+        else:
+            self.failed += 1
+            self.last_error = coordinator.modbus_client.last_write_error or "unknown error"
+            retry_after = dt_util.utcnow() + timedelta(seconds=_RETRY_SECONDS)
+            # Retry only if the timeline was not replaced meanwhile and the
+            # next point is not due before the retry.
+            if self.points is timeline and (not timeline or timeline[0][0] > retry_after):
+                _LOGGER.warning(
+                    "Failed to apply scheduled Set Power %.0f W: %s; retrying in %.0f s",
+                    power,
+                    self.last_error,
+                    _RETRY_SECONDS,
+                )
+                timeline.insert(0, (at, power))
+                self._retry_after = retry_after
+            else:
+                _LOGGER.error(
+                    "Failed to apply scheduled Set Power %.0f W: %s", power, self.last_error
+                )
+                self._retry_after = None
+        await self._async_save()
+        self._async_arm()
+
+    def _write_at(self, send_at: float, raw: int) -> bool:
+        """Wait for the send time, then write Set Power. Runs in the executor."""
+        delay = send_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.monotonic()
+        success = self._coordinator.modbus_client.write_register(SET_POWER_REGISTER, raw)
+        duration = time.monotonic() - started
+        self._write_seconds += _WRITE_TIME_WEIGHT * (duration - self._write_seconds)
+        return success
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the pending points, failed writes and the applied-vs-scheduled latency."""
+        return {
+            "pending_points": len(self.points),
+            "next_point": self.points[0][0].isoformat() if self.points else None,
+            "retry_after": self._retry_after.isoformat() if self._retry_after else None,
+            "applied": self.applied,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "last_latency_seconds": self.last_latency,
+            "max_latency_seconds": self.max_latency,
+            "write_seconds": self._write_seconds,
+        }
+
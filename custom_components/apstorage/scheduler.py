@@ -0,0 +1,118 @@
+"""Integration-wide poll staggering for APstorage config entries."""
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+@dataclass
+class _Member:
+    """Scheduling state for one config entry."""
+
+    link: str
+    interval: float
+    duration: float | None = None
+
+
+class APstoragePollScheduler:
+    """Assign each entry sharing a Modbus link a phase within the scan interval.
+
+    Entries on the same link (TCP host:port or serial port) are spread across
+    the interval in registration order. Each entry's slot is sized by its
+    measured poll duration, with the remaining slack shared evenly, and every
+    poll gets a small bounded random jitter so they never lock into step.
+    """
+
+    # Poll duration assumed before the first measurement.
+    _DEFAULT_DURATION_SECONDS = 1.0
+    # Weight of the newest sample in the poll-duration moving average.
+    _DURATION_SMOOTHING = 0.3
+    # Jitter is bounded by both a fraction of the interval and an absolute cap.
+    _JITTER_FRACTION = 0.05
+    _MAX_JITTER_SECONDS = 2.0
+    # Never schedule the next poll sooner than this fraction of the interval.
+    _MIN_DELAY_FRACTION = 0.5
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._anchor = clock()
+        self._members: dict[str, _Member] = {}
+
+    def register(self, entry_id: str, link: str, interval_seconds: float) -> None:
+        """Add (or update) an entry polling over the given link."""
+        member = self._members.get(entry_id)
+        if member is None:
+            self._members[entry_id] = _Member(link, float(interval_seconds))
+            return
+        member.link = link
+        member.interval = float(interval_seconds)
+
+    def unregister(self, entry_id: str) -> None:
+        """Remove an entry; the remaining entries on its link are re-spread."""
+        self._members.pop(entry_id, None)
+
+    def record_duration(self, entry_id: str, seconds: float) -> None:
+        """Feed a measured poll duration into the entry's moving average."""
+        member = self._members.get(entry_id)
+        if member is None:
+            return
+        if member.duration is None:
+            member.duration = seconds
+        else:
+            member.duration += self._DURATION_SMOOTHING * (seconds - member.duration)
+
+    def phase_offset(self, entry_id: str) -> float:
+        """Return the entry's phase offset in seconds within its interval."""
+        member = self._members[entry_id]
+        peers = [
+            (peer_id, peer) for peer_id, peer in self._members.items() if peer.link == member.link
+        ]
+        if len(peers) == 1:
+            return 0.0
+
+        interval = min(peer.interval for _, peer in peers)
+        durations = [
+            peer.duration if peer.duration is not None else self._DEFAULT_DURATION_SECONDS
+            for _, peer in peers
+        ]
+        gap = max(0.0, interval - sum(durations)) / len(peers)
+        offset = 0.0
+        for (peer_id, _), duration in zip(peers, durations):
+            if peer_id == entry_id:
+                break
+            offset += duration + gap
+        return offset % member.interval
+
+    def next_delay(self, entry_id: str, now: float | None = None) -> float:
+        """Return seconds until the entry's next phase-aligned, jittered poll."""
+        if now is None:
+            now = self._clock()
+        member = self._members[entry_id]
+        interval = member.interval
+        phase = self._anchor + self.phase_offset(entry_id)
+        earliest = now + interval * self._MIN_DELAY_FRACTION
+        slot = phase + math.ceil((earliest - phase) / interval) * interval
+        jitter = self._rng.uniform(
+            0.0, min(self._MAX_JITTER_SECONDS, interval * self._JITTER_FRACTION)
+        )
+        return slot - now + jitter
+
+    def diagnostics(self, entry_id: str) -> dict[str, float | int | None]:
+        """Return the entry's scheduling state for diagnostics."""
+        member = self._members.get(entry_id)
+        if member is None:
+            return {}
+        return {
+            "link_peers": sum(1 for peer in self._members.values() if peer.link == member.link),
+            "interval": member.interval,
+            "phase_offset": round(self.phase_offset(entry_id), 3),
+            "poll_duration": round(member.duration, 3) if member.duration is not None else None,
+        }
@@ -2,6 +2,10 @@
 from __future__ import annotations
 
 import logging
+import time
+from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Any
 
 from homeassistant.core import HomeAssistant
@@ -19,29 +23,93 @@ from homeassistant.helpers.entity import EntityCategory
 
 from . import APstorageCoordinator
 from .const import (
+    CONF_DEADBANDS,
+    CONF_FLEET,
     DOMAIN,
     APSTORAGE_REGISTERS,
     APSTORAGE_READONLY_NUMBER_REGISTERS,
     APSTORAGE_WRITABLE_REGISTERS,
     APSTORAGE_SCALE_REGISTERS,
     BATTERY_ALARM_BITS,
+    DEADBAND_MAX_SILENCE_SECONDS,
     PCS_ALARM_BITS,
     DIAGNOSTIC_REGISTERS,
     LOGGER_NAME,
     TOTAL_ENERGY_REGISTERS,
     TOTAL_INCREASING_ENERGY_REGISTERS,
 )
-from .entity_base import APstorageEntityMixin
-from .entity_naming import async_migrate_entity_id, get_suggested_object_id
+from .deadband import ATTR_DEADBAND, default_deadband, parse_deadbands, resolve_deadband
+from .entity_base import APstorageEntityMixin, APstorageFleetEntityMixin
+from .fleet import FLEET_COUNTERS
+from .snapshot import APstorageSnapshot, get_register_value
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Alarm bit definitions per bitfield register.
+_ALARM_BITS_BY_REGISTER = {
+    40096: BATTERY_ALARM_BITS,
+    40100: PCS_ALARM_BITS,
+}
+
+# Fleet totals: (key, name, unit, device class, state class).
+_FLEET_SENSORS = (
+    ("soc", "Fleet State of Charge", "%", "battery", SensorStateClass.MEASUREMENT),
+    ("battery_power", "Fleet Battery Power", "W", "power", SensorStateClass.MEASUREMENT),
+    ("set_power", "Fleet Set Power", "W", "power", SensorStateClass.MEASUREMENT),
+    ("energy_capacity", "Fleet Energy Capacity", "kWh", "energy", None),
+    ("max_charge_rate", "Fleet Max Charge Rate", "W", "power", None),
+    ("max_discharge_rate", "Fleet Max Discharge Rate", "W", "power", None),
+    ("charge_energy", "Fleet Charge Energy", "kWh", "energy", SensorStateClass.TOTAL_INCREASING),
+    ("discharge_energy", "Fleet Discharge Energy", "kWh", "energy", SensorStateClass.TOTAL_INCREASING),
+)
+
+# Per-bit attributes duplicate raw_value/active_alarms; keep them out of the
+# recorder, along with the constantly moving data_age and the fixed deadband.
+_UNRECORDED_ATTRIBUTES = frozenset(
+    {
+        f"bit_{bit}_{name}"
+        for alarm_bits in _ALARM_BITS_BY_REGISTER.values()
+        for bit, name in alarm_bits.items()
+    }
+    | {"data_age", ATTR_DEADBAND}
+)
+
+
+@lru_cache(maxsize=64)
+def _bitfield_attributes(address: int, bitfield_value: int) -> Mapping[str, Any]:
+    """Build the attribute dict for one distinct bitfield value."""
+    alarm_bits = _ALARM_BITS_BY_REGISTER.get(address, {})
+
+    # Build attributes showing which alarms are active
+    active_alarms = []
+    attributes: dict[str, Any] = {"raw_value": bitfield_value}
+
+    for bit, name in alarm_bits.items():
+        is_set = bool((bitfield_value >> bit) & 1)
+        attributes[f"bit_{bit}_{name}"] = is_set
+        if is_set:
+            active_alarms.append(name)
+
+    attributes["active_alarms"] = ", ".join(active_alarms) if active_alarms else "None"
+    attributes["active_count"] = len(active_alarms)
+    return MappingProxyType(attributes)
+
 
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     """Set up sensor platform from ConfigEntry."""
+    if entry.data.get(CONF_FLEET):
+        fleet = hass.data[DOMAIN][entry.entry_id]["fleet"]
+        async_add_entities(APstorageFleetSensor(fleet, entry, *spec) for spec in _FLEET_SENSORS)
+        return
+
     coordinator: APstorageCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    try:
+        deadbands = parse_deadbands(entry.options.get(CONF_DEADBANDS))
+    except ValueError as err:
+        _LOGGER.warning("Ignoring invalid deadbands option: %s", err)
+        deadbands = {}
 
     entities = []
     scale_factor_registers = set(APSTORAGE_SCALE_REGISTERS.values())
@@ -52,6 +120,7 @@ async def async_setup_entry(
             address in scale_factor_registers
             or address in writable_registers
             or address in readonly_number_registers
+            or address in coordinator.unimplemented_registers
         ):
             continue
         entities.append(
@@ -63,6 +132,7 @@ async def async_setup_entry(
                 unit,
                 device_class,
                 value_type,
+                deadbands.get(address),
             )
         )
 
@@ -72,6 +142,8 @@ async def async_setup_entry(
 class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
     """Sensor entity for a single APstorage Modbus register."""
 
+    _unrecorded_attributes = _UNRECORDED_ATTRIBUTES
+
     def __init__(
         self,
         coordinator: APstorageCoordinator,
@@ -81,6 +153,7 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
         unit_of_measurement: str | None,
         device_class: str | None,
         value_type: str,
+        deadband: tuple[float, float] | None = None,
     ):
         self._coordinator = coordinator
         self._entry = entry
@@ -89,6 +162,48 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
         self._unit_of_measurement = unit_of_measurement
         self._device_class = device_class
         self._value_type = value_type
+        # The Model sensor shows a serial-derived model name when known.
+        self._watched_addresses = (address, 40052) if address == 40020 else (address,)
+        self._deadband = resolve_deadband(address, unit_of_measurement, device_class, deadband)
+        # Tell the significant_change platform about a non-default deadband.
+        default = default_deadband(unit_of_measurement, device_class)
+        self._deadband_attributes = (
+            None
+            if self._deadband == (default if default and any(default) else None)
+            else {ATTR_DEADBAND: list(self._deadband or (0, 0))}
+        )
+        self._last_written_value: Any = None
+        self._last_written_stale = False
+        self._last_written_monotonic = 0.0
+
+    def _state_write_needed(self, available: bool) -> bool:
+        """Suppress writes for jitter inside the register's deadband."""
+        if not super()._state_write_needed(available):
+            return False
+
+        data = self._coordinator.data
+        value = get_register_value(data, self._address)
+        stale = isinstance(data, APstorageSnapshot) and data.is_stale(self._address)
+        now = time.monotonic()
+        last = self._last_written_value
+        if (
+            self._deadband is not None
+            and available == self._last_written_available
+            and stale == self._last_written_stale
+            and isinstance(value, (int, float))
+            and isinstance(last, (int, float))
+            # Always report transitions to or from exactly zero (e.g. standby).
+            and (value == 0) == (last == 0)
+            and now - self._last_written_monotonic < DEADBAND_MAX_SILENCE_SECONDS
+        ):
+            absolute, relative = self._deadband
+            if abs(value - last) < max(absolute, relative * abs(last)):
+                return False
+
+        self._last_written_value = value
+        self._last_written_stale = stale
+        self._last_written_monotonic = now
+        return True
 
     @property
     def name(self) -> str:
@@ -103,7 +218,7 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
     @property
     def suggested_object_id(self) -> str | None:
         """Return the preferred object ID for this sensor."""
-        return get_suggested_object_id(self._coordinator.data, self._name)
+        return self._cached_suggested_object_id()
 
     @property
     def unit_of_measurement(self) -> str | None:
@@ -139,14 +254,15 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
     @property
     def state(self) -> Any:
         """Return the sensor state."""
-        if self._coordinator.data and self._address in self._coordinator.data:
+        data = self._coordinator.data
+        if data and self._address in data:
             if self._address == 40020:
-                serial_number = self._coordinator.data.get(40052, {}).get("value")
+                serial_number = get_register_value(data, 40052)
                 mapped_model = self._model_from_serial(serial_number)
                 if mapped_model:
                     return mapped_model
 
-            value = self._coordinator.data[self._address].get("value")
+            value = get_register_value(data, self._address)
             # Format bitfield values as hex for better readability
             if self._value_type == "bitfield32" and value is not None:
                 return f"0x{value:08X}"
@@ -154,44 +270,22 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
         return STATE_UNKNOWN
 
     @property
-    def extra_state_attributes(self) -> dict[str, Any] | None:
-        """Return extra attributes for bitfield sensors."""
+    def extra_state_attributes(self) -> Mapping[str, Any] | None:
+        """Return extra attributes for bitfield, stale and non-default deadband sensors."""
+        freshness = self._freshness_attributes()
+        if self._deadband_attributes is not None:
+            freshness = {**self._deadband_attributes, **(freshness or {})}
         if self._value_type != "bitfield32":
-            return None
-            
-        if not self._coordinator.data or self._address not in self._coordinator.data:
-            return None
-            
-        bitfield_value = self._coordinator.data[self._address].get("value")
+            return freshness
+
+        bitfield_value = get_register_value(self._coordinator.data, self._address)
         if bitfield_value is None:
-            return None
-        
-        # Determine which alarm bits to use based on address
-        alarm_bits = {}
-        if self._address == 40096:
-            alarm_bits = BATTERY_ALARM_BITS
-        elif self._address == 40100:
-            alarm_bits = PCS_ALARM_BITS
-        
-        # Build attributes showing which alarms are active
-        active_alarms = []
-        attributes = {"raw_value": bitfield_value}
-        
-        for bit, name in alarm_bits.items():
-            is_set = bool((bitfield_value >> bit) & 1)
-            attributes[f"bit_{bit}_{name}"] = is_set
-            if is_set:
-                active_alarms.append(name)
-        
-        attributes["active_alarms"] = ", ".join(active_alarms) if active_alarms else "None"
-        attributes["active_count"] = len(active_alarms)
-        
-        return attributes
+            return freshness
 
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self._coordinator.last_update_success
+        attributes = _bitfield_attributes(self._address, bitfield_value)
+        if freshness:
+            return {**attributes, **freshness}
+        return attributes
 
     @property
     def should_poll(self) -> bool:
@@ -202,25 +296,45 @@ class APstorageRegisterSensor(APstorageEntityMixin, SensorEntity):
         """Register with coordinator."""
         await super().async_added_to_hass()
         self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+            self._coordinator.async_add_listener(self._async_handle_coordinator_update)
         )
 
-        self._async_ensure_prefixed_entity_id()
-
-    def _async_ensure_prefixed_entity_id(self) -> None:
-        """Rename the entity once the device serial number is available."""
-        try:
-            async_migrate_entity_id(
-                self.hass,
-                self.entity_id,
-                self._coordinator.data,
-                self._name,
-            )
-        except ValueError:
-            _LOGGER.warning("Unable to rename entity %s", self.entity_id)
-
     async def async_update(self) -> None:
         """Update via coordinator."""
         await self._coordinator.async_request_refresh()
-        self._async_ensure_prefixed_entity_id()
+
+
+class APstorageFleetSensor(APstorageFleetEntityMixin, SensorEntity):
+    """Sensor for one total of the virtual fleet device."""
+
+    def __init__(
+        self,
+        fleet: Any,
+        entry: ConfigEntry,
+        key: str,
+        name: str,
+        unit_of_measurement: str,
+        device_class: str | None,
+        state_class: str | None,
+    ):
+        self._fleet = fleet
+        self._entry = entry
+        self._key = key
+        self._attr_name = name
+        self._attr_unique_id = f"apstorage_{entry.entry_id}_{key}"
+        self._attr_native_unit_of_measurement = unit_of_measurement
+        self._attr_device_class = device_class
+        self._attr_state_class = state_class
+
+    @property
+    def available(self) -> bool:
+        """Return False for energy counters unless every battery reports."""
+        if self._key in FLEET_COUNTERS:
+            return self._fleet.complete
+        return super().available
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the current fleet total."""
+        return self._fleet.value(self._key)
 
@@ -0,0 +1,92 @@
+"""Services for the APstorage integration."""
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+
+from .const import CAPTURE_MAX_RATE_HZ, CAPTURE_MAX_SECONDS, DOMAIN
+
+SERVICE_SET_SCHEDULE = "set_schedule"
+SERVICE_CAPTURE = "capture"
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_POINTS = "points"
+ATTR_AT = "at"
+ATTR_POWER = "power"
+ATTR_REGISTERS = "registers"
+ATTR_DURATION = "duration"
+ATTR_RATE = "rate"
+ATTR_INCLUDE_RAW = "include_raw"
+
+SET_SCHEDULE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_POINTS): vol.All(
+            cv.ensure_list,
+            [
+                vol.Schema(
+                    {
+                        vol.Required(ATTR_AT): cv.datetime,
+                        vol.Required(ATTR_POWER): vol.Coerce(float),
+                    }
+                )
+            ],
+        ),
+    }
+)
+
+CAPTURE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_REGISTERS): vol.All(
+            cv.ensure_list, [vol.Coerce(int)], vol.Length(min=1, max=16)
+        ),
+        vol.Required(ATTR_DURATION): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=CAPTURE_MAX_SECONDS)
+        ),
+        vol.Optional(ATTR_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=CAPTURE_MAX_RATE_HZ)
+        ),
+        vol.Optional(ATTR_INCLUDE_RAW, default=False): cv.boolean,
+    }
+)
+
+
+def _async_get_coordinator(hass: HomeAssistant, entry_id: str):
+    """Return the coordinator of a loaded APstorage entry."""
+    entry_data = hass.data.get(DOMAIN, {}).get(entry_id)
+    if not entry_data or "coordinator" not in entry_data:
+        raise HomeAssistantError(f"APstorage entry {entry_id} is not loaded")
+    return entry_data["coordinator"]
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration's services."""
+
+    async def async_set_schedule(call: ServiceCall) -> None:
+        coordinator = _async_get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        await coordinator.schedule.async_set_points(
+            (point[ATTR_AT], point[ATTR_POWER]) for point in call.data[ATTR_POINTS]
+        )
+
+    async def async_capture(call: ServiceCall) -> ServiceResponse:
+        coordinator = _async_get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        return await coordinator.capture.async_capture(
+            call.data[ATTR_REGISTERS],
+            call.data[ATTR_DURATION],
+            call.data.get(ATTR_RATE),
+            call.data[ATTR_INCLUDE_RAW],
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_SCHEDULE, async_set_schedule, schema=SET_SCHEDULE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CAPTURE,
+        async_capture,
+        schema=CAPTURE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
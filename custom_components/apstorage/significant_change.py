@@ -0,0 +1,81 @@
+"""Helper to test significant APstorage state changes."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.const import ATTR_DEVICE_CLASS, ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.significant_change import (
+    check_absolute_change,
+    check_valid_float,
+)
+
+from .deadband import ATTR_DEADBAND, default_deadband
+
+# Minimum changes that matter for register types without a write deadband.
+_SIGNIFICANT_CHANGE_BY_DEVICE_CLASS = {
+    "battery": 1.0,
+    "energy": 0.1,
+}
+
+# Attributes that change without the underlying value changing.
+_VOLATILE_ATTRIBUTES = {"data_age"}
+
+
+@callback
+def async_check_significant_change(
+    hass: HomeAssistant,
+    old_state: str,
+    old_attrs: dict,
+    new_state: str,
+    new_attrs: dict,
+    **kwargs: Any,
+) -> bool | None:
+    """Test if a state change is significant."""
+    if old_attrs.get("stale") != new_attrs.get("stale"):
+        return True
+
+    # Bitfield alarm sensors: any alarm bit flipping is significant, and the
+    # per-bit attributes add nothing beyond the raw value.
+    if "active_alarms" in new_attrs:
+        return old_state != new_state
+
+    if old_state == new_state:
+        changed = {
+            key
+            for key in old_attrs.keys() | new_attrs.keys()
+            if old_attrs.get(key) != new_attrs.get(key)
+        }
+        return bool(changed - _VOLATILE_ATTRIBUTES)
+
+    if not (check_valid_float(old_state) and check_valid_float(new_state)):
+        # Strings and enums (model, firmware, charge status): any change.
+        return True
+
+    old_value = float(old_state)
+    new_value = float(new_state)
+    # Crossing zero flips charge/discharge or import/export direction.
+    if (old_value == 0) != (new_value == 0) or (old_value < 0) != (new_value < 0):
+        return True
+
+    device_class = new_attrs.get(ATTR_DEVICE_CLASS)
+    # Sensors publish their deadband only when the entry's option or a
+    # per-register override changed it from the default.
+    if ATTR_DEADBAND in new_attrs:
+        absolute, relative = new_attrs[ATTR_DEADBAND]
+        if not (absolute or relative):
+            return True
+        deadband = (absolute, relative)
+    else:
+        deadband = default_deadband(new_attrs.get(ATTR_UNIT_OF_MEASUREMENT), device_class)
+    if deadband is not None:
+        absolute, relative = deadband
+        return check_absolute_change(
+            old_value, new_value, max(absolute, relative * abs(old_value))
+        )
+
+    change = _SIGNIFICANT_CHANGE_BY_DEVICE_CLASS.get(device_class)
+    if change is not None:
+        return check_absolute_change(old_value, new_value, change)
+
+    return True
@@ -0,0 +1,170 @@
+"""Compact register snapshot used by the APstorage coordinator."""
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+from .const import APSTORAGE_REGISTERS
+
+# Precompiled register index: every register in the table gets a fixed slot so
+# a poll only needs one flat value list instead of one dict per register.
+REGISTER_ADDRESSES: tuple[int, ...] = tuple(APSTORAGE_REGISTERS)
+REGISTER_INDEX: dict[int, int] = {
+    address: slot for slot, address in enumerate(REGISTER_ADDRESSES)
+}
+
+# Marker for registers that were not read in a poll.
+MISSING = object()
+
+
+def new_value_list() -> list[Any]:
+    """Return an empty per-slot value list for a new snapshot."""
+    return [MISSING] * len(REGISTER_ADDRESSES)
+
+
+class RegisterRecord(Mapping[str, Any]):
+    """Read-only view of one register, shaped like the legacy per-register dict.
+
+    Static metadata is looked up in ``APSTORAGE_REGISTERS`` on access; only the
+    value lives in the snapshot.
+    """
+
+    __slots__ = ("_snapshot", "_address")
+
+    _KEYS = ("name", "value", "unit", "type")
+
+    def __init__(self, snapshot: APstorageSnapshot, address: int) -> None:
+        self._snapshot = snapshot
+        self._address = address
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "value":
+            return self._snapshot.value(self._address)
+        name, _, value_type, _, unit, _ = APSTORAGE_REGISTERS[self._address]
+        if key == "name":
+            return name
+        if key == "unit":
+            return unit
+        if key == "type":
+            return value_type
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"RegisterRecord({self._address}, {dict(self)!r})"
+
+
+class APstorageSnapshot(Mapping[int, RegisterRecord]):
+    """Decoded register values from one poll, indexed by register slot.
+
+    Behaves as a read-only ``{address: {"name", "value", "unit", "type"}}``
+    mapping for backward compatibility. Hot paths should use ``value()``,
+    which avoids building a record view.
+
+    ``stale`` is set when the device controller heartbeat stopped advancing,
+    ``stale_addresses`` holds registers whose batch failed to read and which
+    still show their last value under the grace policy, and ``device_time``
+    is the sample time in seconds on the monotonic clock, advanced by
+    heartbeat deltas rather than by host receive time.
+    """
+
+    __slots__ = ("_values", "stale", "stale_addresses", "device_time")
+
+    def __init__(
+        self,
+        values: list[Any] | None = None,
+        *,
+        stale: bool = False,
+        stale_addresses: frozenset[int] = frozenset(),
+        device_time: float | None = None,
+    ) -> None:
+        self._values = values if values is not None else new_value_list()
+        self.stale = stale
+        self.stale_addresses = stale_addresses
+        self.device_time = device_time
+
+    def is_stale(self, address: int) -> bool:
+        """Return True if a register shows an old value instead of a fresh read."""
+        return self.stale or address in self.stale_addresses
+
+    def value(self, address: int, default: Any = None) -> Any:
+        """Return the decoded value for a register, or default if not read."""
+        slot = REGISTER_INDEX.get(address)
+        if slot is None:
+            return default
+        value = self._values[slot]
+        return default if value is MISSING else value
+
+    def set_value(self, address: int, value: Any) -> None:
+        """Store the decoded value for a register."""
+        self._values[REGISTER_INDEX[address]] = value
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, APstorageSnapshot):
+            return (
+                self.stale == other.stale
+                and self.stale_addresses == other.stale_addresses
+                and self._values == other._values
+            )
+        return super().__eq__(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def copy_values(self) -> list[Any]:
+        """Return a copy of the per-slot value list."""
+        return list(self._values)
+
+    def copy(self) -> APstorageSnapshot:
+        """Return a shallow copy of this snapshot."""
+        return APstorageSnapshot(
+            self.copy_values(),
+            stale=self.stale,
+            stale_addresses=self.stale_addresses,
+            device_time=self.device_time,
+        )
+
+    def __getitem__(self, address: int) -> RegisterRecord:
+        slot = REGISTER_INDEX.get(address)
+        if slot is None or self._values[slot] is MISSING:
+            raise KeyError(address)
+        return RegisterRecord(self, address)
+
+    def __contains__(self, address: object) -> bool:
+        slot = REGISTER_INDEX.get(address)  # type: ignore[arg-type]
+        return slot is not None and self._values[slot] is not MISSING
+
+    def __iter__(self) -> Iterator[int]:
+        values = self._values
+        return (
+            address
+            for slot, address in enumerate(REGISTER_ADDRESSES)
+            if values[slot] is not MISSING
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for value in self._values if value is not MISSING)
+
+    def __bool__(self) -> bool:
+        return any(value is not MISSING for value in self._values)
+
+    def __repr__(self) -> str:
+        values = {address: self.value(address) for address in self}
+        return f"APstorageSnapshot({values!r})"
+
+
+def get_register_value(data: Mapping[int, Any] | None, address: int, default: Any = None) -> Any:
+    """Return a register value from a snapshot or a legacy per-register dict."""
+    if not data:
+        return default
+    if isinstance(data, APstorageSnapshot):
+        return data.value(address, default)
+    record = data.get(address)
+    if not record:
+        return default
+    value = record.get("value")
+    return default if value is None else value
@@ -0,0 +1,269 @@
+"""Pipelined Modbus TCP reads for the APstorage coordinator."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import struct
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DATA_MODBUS_PIPELINES,
+    DEFAULT_PIPELINE_WINDOW,
+    DOMAIN,
+    LOGGER_NAME,
+    PIPELINE_RECOVERY_ROUNDS,
+)
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# MBAP header plus a function 3 request: transaction ID, protocol ID, length,
+# unit ID, function code, start address, register count.
+_READ_REQUEST = struct.Struct(">HHHBBHH")
+_MBAP_HEADER = struct.Struct(">HHHB")
+_READ_HOLDING_REGISTERS = 0x03
+_EXCEPTION_FLAG = 0x80
+# Modbus exception code 6: the device is busy and dropped the request.
+_SERVER_DEVICE_BUSY = 0x06
+
+
+class APstorageModbusTcpPipeline:
+    """Modbus TCP connection that keeps several read requests in flight.
+
+    Requests are written back to back, each with its own MBAP transaction ID,
+    and a reader task matches responses to requests as they arrive, so a
+    poll costs about one round trip instead of one per batch. The number of
+    outstanding requests is bounded by ``window``; when the device times out,
+    reports itself busy or answers an unknown transaction while several
+    requests are outstanding, the window is halved (down to 1) and the
+    connection is reopened. After ``PIPELINE_RECOVERY_ROUNDS`` rounds of
+    reads in a row where every request succeeded, the window doubles again,
+    up to its initial size.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        host: str,
+        port: int,
+        window: int = DEFAULT_PIPELINE_WINDOW,
+        timeout: float = 3.0,
+    ) -> None:
+        self.hass = hass
+        self.host = host
+        self.port = port
+        self.window = self.max_window = max(1, int(window))
+        self.timeout = timeout
+        self.users = 0
+        self.window_reductions = 0
+        self._clean_rounds = 0
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._pending: dict[int, asyncio.Future[bytes]] = {}
+        self._next_transaction_id = 1
+        self._in_flight = 0
+        self._slots: asyncio.Condition | None = None
+        self._connect_lock: asyncio.Lock | None = None
+
+    @property
+    def connected(self) -> bool:
+        """Return True while the connection is open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def async_connect(self) -> bool:
+        """Open the connection if it is not open yet."""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), timeout=self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as err:
+                _LOGGER.debug(
+                    "Pipelined Modbus connection to %s:%s failed: %s", self.host, self.port, err
+                )
+                self._reader = self._writer = None
+                return False
+            self._reader_task = self.hass.async_create_background_task(
+                self._async_read_responses(self._reader),
+                f"{DOMAIN} pipelined Modbus reader {self.host}:{self.port}",
+            )
+            return True
+
+    async def async_close(self) -> None:
+        """Close the connection and fail every outstanding request."""
+        self._fail_pending()
+        writer, self._writer, self._reader = self._writer, None, None
+        task, self._reader_task = self._reader_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, asyncio.CancelledError):  # pragma: no cover
+                pass
+
+    def _fail_pending(self) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Modbus connection closed"))
+
+    async def _async_read_responses(self, reader: asyncio.StreamReader) -> None:
+        """Match incoming responses to outstanding requests by transaction ID."""
+        try:
+            while True:
+                header = await reader.readexactly(_MBAP_HEADER.size)
+                transaction_id, _, length, _ = _MBAP_HEADER.unpack(header)
+                # The length counts the unit ID; a shorter value leaves no PDU.
+                pdu = await reader.readexactly(max(0, length - 1))
+                future = self._pending.pop(transaction_id, None)
+                if future is None:
+                    self._reduce_window(f"unknown transaction {transaction_id}")
+                    continue
+                if not future.done():
+                    future.set_result(pdu)
+        except (asyncio.IncompleteReadError, OSError) as err:
+            _LOGGER.debug("Pipelined Modbus connection to %s:%s closed: %s", self.host, self.port, err)
+        finally:
+            if reader is self._reader:
+                self._writer = self._reader = None
+                self._fail_pending()
+
+    def _reduce_window(self, reason: str) -> None:
+        """Halve the in-flight window after the device mishandled pipelining."""
+        if self.window <= 1 or self._in_flight <= 1:
+            return
+        self.window = max(1, self.window // 2)
+        self.window_reductions += 1
+        self._clean_rounds = 0
+        _LOGGER.warning(
+            "Modbus device at %s:%s mishandled pipelined requests (%s); reducing window to %d",
+            self.host,
+            self.port,
+            reason,
+            self.window,
+        )
+
+    async def _async_acquire_slot(self) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self.window)
+            self._in_flight += 1
+
+    async def _async_release_slot(self) -> None:
+        async with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    async def async_read(self, unit: int, address: int, count: int) -> bytes | None:
+        """Read holding registers; return the raw big-endian register bytes."""
+        await self._async_acquire_slot()
+        try:
+            return await self._async_transact(unit, address, count)
+        finally:
+            await self._async_release_slot()
+
+    async def async_read_many(
+        self, unit: int, requests: list[tuple[int, int]]
+    ) -> list[bytes | None]:
+        """Read several (address, count) spans with overlapping round trips."""
+        reductions = self.window_reductions
+        payloads = list(
+            await asyncio.gather(
+                *(self.async_read(unit, address, count) for address, count in requests)
+            )
+        )
+        if None in payloads or self.window_reductions != reductions:
+            self._clean_rounds = 0
+        else:
+            self._recover_window()
+        return payloads
+
+    def _recover_window(self) -> None:
+        """Double a reduced window once the device has coped for a while."""
+        if self.window >= self.max_window:
+            return
+        self._clean_rounds += 1
+        if self._clean_rounds < PIPELINE_RECOVERY_ROUNDS:
+            return
+        self._clean_rounds = 0
+        self.window = min(self.max_window, self.window * 2)
+        _LOGGER.info(
+            "Modbus device at %s:%s handled pipelined requests cleanly; raising window to %d",
+            self.host,
+            self.port,
+            self.window,
+        )
+
+    async def _async_transact(self, unit: int, address: int, count: int) -> bytes | None:
+        if not await self.async_connect():
+            return None
+        transaction_id = self._next_transaction_id
+        self._next_transaction_id = transaction_id % 0xFFFF + 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[transaction_id] = future
+        self._writer.write(
+            _READ_REQUEST.pack(
+                transaction_id, 0, 6, unit, _READ_HOLDING_REGISTERS, address, count
+            )
+        )
+        try:
+            pdu = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(transaction_id, None)
+            self._reduce_window("timeout")
+            await self.async_close()
+            return None
+        except ConnectionError:
+            return None
+
+        if not pdu:
+            self._reduce_window("empty response")
+            return None
+        if pdu[0] & _EXCEPTION_FLAG:
+            code = pdu[1] if len(pdu) > 1 else None
+            if code == _SERVER_DEVICE_BUSY:
+                self._reduce_window("device busy")
+            _LOGGER.debug(
+                "Pipelined Modbus read address=%d count=%d device_id=%d failed with exception %s",
+                address,
+                count,
+                unit,
+                code,
+            )
+            return None
+        if pdu[0] != _READ_HOLDING_REGISTERS or len(pdu) != 2 + 2 * count or pdu[1] != 2 * count:
+            self._reduce_window("malformed response")
+            return None
+        return pdu[2:]
+
+
+def async_get_pipeline(hass: HomeAssistant, host: str, port: int) -> APstorageModbusTcpPipeline:
+    """Return the pipelined connection for a Modbus TCP endpoint."""
+    pipelines: dict[str, APstorageModbusTcpPipeline] = hass.data.setdefault(
+        DATA_MODBUS_PIPELINES, {}
+    )
+    key = f"{host}:{port}"
+    pipeline = pipelines.get(key)
+    if pipeline is None:
+        pipeline = pipelines[key] = APstorageModbusTcpPipeline(hass, host, port)
+    pipeline.users += 1
+    return pipeline
+
+
+async def async_release_pipeline(
+    hass: HomeAssistant, pipeline: APstorageModbusTcpPipeline
+) -> None:
+    """Drop one user of a pipelined connection and close it when unused."""
+    pipeline.users -= 1
+    if pipeline.users > 0:
+        return
+    hass.data.get(DATA_MODBUS_PIPELINES, {}).pop(f"{pipeline.host}:{pipeline.port}", None)
+    await pipeline.async_close()
@@ -0,0 +1,98 @@
+"""Websocket API for the APstorage integration."""
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    APSTORAGE_REGISTERS,
+    DOMAIN,
+    LIVE_MAX_PENDING_MESSAGES,
+    LIVE_MAX_QUEUED_SAMPLES,
+    LIVE_MAX_RATE_HZ,
+    NUMERIC_REGISTER_TYPES,
+)
+
+# Battery power and grid power phases A-C.
+DEFAULT_LIVE_REGISTERS = [40117, 40153, 40154, 40155]
+
+
+def _pending_messages(connection: websocket_api.ActiveConnection) -> int:
+    """Return the messages waiting to be written to the socket, or 0 if unknown.
+
+    Home Assistant has no public accessor; ``send_message`` is bound to the
+    socket handler that owns the pending-message queue.
+    """
+    handler = getattr(connection.send_message, "__self__", None)
+    queue = getattr(handler, "_message_queue", None)
+    return len(queue) if queue is not None else 0
+
+
+@callback
+def async_register_websocket_commands(hass: HomeAssistant) -> None:
+    """Register the integration's websocket commands."""
+    websocket_api.async_register_command(hass, ws_subscribe_live)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe_live",
+        vol.Required("entry_id"): str,
+        vol.Optional("registers", default=DEFAULT_LIVE_REGISTERS): [vol.Coerce(int)],
+        vol.Optional("max_rate", default=1.0): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=LIVE_MAX_RATE_HZ)
+        ),
+        vol.Optional("batch_seconds", default=1.0): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=60)
+        ),
+    }
+)
+@callback
+def ws_subscribe_live(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Stream batched samples of numeric registers from one battery."""
+    entry_data = hass.data.get(DOMAIN, {}).get(msg["entry_id"])
+    if not entry_data or "coordinator" not in entry_data:
+        connection.send_error(msg["id"], "not_found", "APstorage entry is not loaded")
+        return
+    registers = tuple(dict.fromkeys(msg["registers"]))
+    invalid = [
+        address
+        for address in registers
+        if address not in APSTORAGE_REGISTERS or APSTORAGE_REGISTERS[address][2] not in NUMERIC_REGISTER_TYPES
+    ]
+    if invalid or not registers:
+        connection.send_error(
+            msg["id"], "invalid_format", f"Registers {invalid} are not numeric APstorage registers"
+        )
+        return
+    if msg["max_rate"] * msg["batch_seconds"] > LIVE_MAX_QUEUED_SAMPLES:
+        connection.send_error(
+            msg["id"],
+            "invalid_format",
+            f"max_rate * batch_seconds must not exceed {LIVE_MAX_QUEUED_SAMPLES} samples",
+        )
+        return
+
+    @callback
+    def send(payload: dict[str, Any]) -> None:
+        connection.send_message(websocket_api.event_message(msg["id"], payload))
+
+    @callback
+    def close() -> None:
+        # The stream ended on its own; the final event carried the reason.
+        connection.subscriptions.pop(msg["id"], None)
+
+    @callback
+    def ready() -> bool:
+        return _pending_messages(connection) <= LIVE_MAX_PENDING_MESSAGES
+
+    connection.subscriptions[msg["id"]] = entry_data["coordinator"].live.async_subscribe(
+        registers, msg["max_rate"], msg["batch_seconds"], send, close, ready
+    )
+    connection.send_result(msg["id"])
@@ -0,0 +1,167 @@
+"""Validated, debounced and rate-limited writes to APstorage registers."""
+from __future__ import annotations
+
+import functools
+import logging
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    APSTORAGE_REGISTERS,
+    APSTORAGE_SCALE_REGISTERS,
+    APSTORAGE_WRITABLE_REGISTERS,
+    LOGGER_NAME,
+    SET_POWER_REGISTER,
+)
+from .snapshot import get_register_value
+
+if TYPE_CHECKING:
+    from . import APstorageCoordinator
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# How long to wait after the last write request before sending to the device.
+_WRITE_DEBOUNCE_SECONDS = 0.4
+# Minimum time between two writes of the same register reaching the device.
+_MIN_WRITE_INTERVAL_SECONDS = 1.0
+
+
+class APstorageRegisterWriter:
+    """The single write path to the device for every entity and consumer.
+
+    Requests are checked against the int16 range and the register's safe
+    range (for Set Power, the device's live max charge/discharge rates),
+    shown optimistically, and coalesced: only the last value requested within
+    the debounce window is written, and a register is written at most once
+    per ``_MIN_WRITE_INTERVAL_SECONDS``.
+    """
+
+    def __init__(self, coordinator: APstorageCoordinator) -> None:
+        self._coordinator = coordinator
+        self._pending: dict[int, int] = {}
+        self._unsubs: dict[int, Callable[[], None]] = {}
+        self._last_write: dict[int, float] = {}
+
+    def value_range(self, address: int) -> tuple[float, float]:
+        """Return the safe (min, max) range for a writable register."""
+        meta = APSTORAGE_WRITABLE_REGISTERS.get(address, {})
+        low = float(meta.get("min", 0))
+        high = float(meta.get("max", 100))
+        data = self._coordinator.data
+        if address == SET_POWER_REGISTER and data:
+            max_charge = get_register_value(data, 40074)
+            max_discharge = get_register_value(data, 40075)
+            # Only trust dynamic limits when they are sane positive values.
+            if isinstance(max_charge, (int, float)) and max_charge > 0:
+                low = -float(max_charge)
+            if isinstance(max_discharge, (int, float)) and max_discharge > 0:
+                high = float(max_discharge)
+        return low, high
+
+    def effective_scale(self, address: int) -> float:
+        """Return the scale between register and displayed value."""
+        scale = APSTORAGE_REGISTERS[address][3]
+        scale_reg = APSTORAGE_SCALE_REGISTERS.get(address)
+        if scale_reg is not None:
+            sf = get_register_value(self._coordinator.data, scale_reg)
+            if sf is not None:
+                scale = 10 ** int(sf)
+        return scale
+
+    def to_raw(self, address: int, value: float) -> int:
+        """Convert a displayed value to the raw register value."""
+        # Example: scale 0.1 means 85.6% is stored as 856.
+        scale = self.effective_scale(address)
+        raw_value = value / scale if scale not in (0, 1) else value
+        return int(round(raw_value))
+
+    def from_raw(self, address: int, raw: int) -> float:
+        """Convert a raw register value to the displayed value."""
+        scale = self.effective_scale(address)
+        return raw * scale if scale != 0 else raw
+
+    @callback
+    def async_request_write(self, address: int, value: float) -> None:
+        """Validate a write and schedule it after the debounce window.
+
+        Raises HomeAssistantError when the value is outside the safe range.
+        """
+        if address not in APSTORAGE_WRITABLE_REGISTERS:
+            raise HomeAssistantError(f"Register {address} is not writable")
+
+        int_value = self.to_raw(address, value)
+        low, high = self.value_range(address)
+        _LOGGER.debug(
+            "Write requested (debounce): register=%d value=%s int=%s range=%s..%s",
+            address,
+            value,
+            int_value,
+            low,
+            high,
+        )
+
+        if int_value < -32768 or int_value > 32767:
+            raise HomeAssistantError(
+                f"Requested value {value} is outside the supported int16 range for register {address}"
+            )
+
+        if value < low or value > high:
+            raise HomeAssistantError(
+                f"Requested value {value} is outside the safe range {low}..{high}"
+            )
+
+        # Cancel any previously scheduled write; this new value supersedes it.
+        if (unsub := self._unsubs.pop(address, None)) is not None:
+            unsub()
+        self._pending[address] = int_value
+
+        # Show the requested value right away.
+        self._coordinator.async_set_optimistic_value(address, value)
+
+        delay = _WRITE_DEBOUNCE_SECONDS
+        last_write = self._last_write.get(address)
+        if last_write is not None:
+            delay = max(delay, last_write + _MIN_WRITE_INTERVAL_SECONDS - time.monotonic())
+        self._unsubs[address] = async_call_later(
+            self._coordinator.hass,
+            delay,
+            functools.partial(self._async_execute_pending_write, address),
+        )
+
+    async def _async_execute_pending_write(self, address: int, _now: Any) -> None:
+        """Perform the Modbus write for the last pending value of a register."""
+        self._unsubs.pop(address, None)
+        int_value = self._pending.pop(address, None)
+        if int_value is None:
+            return
+
+        self._last_write[address] = time.monotonic()
+        client = self._coordinator.modbus_client
+        try:
+            success = await self._coordinator.hass.async_add_executor_job(
+                client.write_register, address, int_value
+            )
+            if success:
+                _LOGGER.info("Set register %d to %d", address, int_value)
+            else:
+                _LOGGER.error(
+                    "Failed to set register %d to %d: %s",
+                    address,
+                    int_value,
+                    client.last_write_error or "unknown error",
+                )
+        except Exception as err:
+            _LOGGER.exception("Error writing register %d: %s", address, err)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop every pending write."""
+        for unsub in self._unsubs.values():
+            unsub()
+        self._unsubs.clear()
+        self._pending.clear()
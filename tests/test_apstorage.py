@@ -1,9 +1,17 @@
 """Test APstorage integration register decoding."""
+import asyncio
+import importlib.util
+import struct
 import sys
+import tempfile
+import threading
 import time
 import types
 import unittest
-from unittest.mock import MagicMock, call
+import unittest.mock
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 
 def _install_homeassistant_stubs() -> None:
@@ -19,6 +27,25 @@ def _install_homeassistant_stubs() -> None:
     entity_registry = types.ModuleType("homeassistant.helpers.entity_registry")
     config_validation = types.ModuleType("homeassistant.helpers.config_validation")
     update_coordinator = types.ModuleType("homeassistant.helpers.update_coordinator")
+    device_registry = types.ModuleType("homeassistant.helpers.device_registry")
+    entity = types.ModuleType("homeassistant.helpers.entity")
+    entity_platform = types.ModuleType("homeassistant.helpers.entity_platform")
+    components = types.ModuleType("homeassistant.components")
+    sensor = types.ModuleType("homeassistant.components.sensor")
+    significant_change = types.ModuleType("homeassistant.helpers.significant_change")
+    binary_sensor = types.ModuleType("homeassistant.components.binary_sensor")
+    number = types.ModuleType("homeassistant.components.number")
+    exceptions = types.ModuleType("homeassistant.exceptions")
+    event = types.ModuleType("homeassistant.helpers.event")
+    storage = types.ModuleType("homeassistant.helpers.storage")
+    util = types.ModuleType("homeassistant.util")
+    dt_util = types.ModuleType("homeassistant.util.dt")
+    websocket_api = types.ModuleType("homeassistant.components.websocket_api")
+    data_entry_flow = types.ModuleType("homeassistant.data_entry_flow")
+    selector = types.ModuleType("homeassistant.helpers.selector")
+    service_info = types.ModuleType("homeassistant.helpers.service_info")
+    service_info_usb = types.ModuleType("homeassistant.helpers.service_info.usb")
+    usb = types.ModuleType("homeassistant.components.usb")
 
     class HomeAssistant:  # noqa: D401
         """Stub HomeAssistant class."""
@@ -26,6 +53,29 @@ def _install_homeassistant_stubs() -> None:
     class ConfigEntry:  # noqa: D401
         """Stub ConfigEntry class."""
 
+    class ConfigFlow:
+        """Stub ConfigFlow base class."""
+
+        def __init_subclass__(cls, domain=None, **kwargs):
+            super().__init_subclass__(**kwargs)
+
+    class OptionsFlow:
+        """Stub OptionsFlow base class."""
+
+    class AbortFlow(Exception):
+        """Stub AbortFlow exception."""
+
+    class UsbServiceInfo:
+        """Stub USB discovery info."""
+
+        def __init__(self, device, vid, pid, serial_number, manufacturer, description):
+            self.device = device
+            self.vid = vid
+            self.pid = pid
+            self.serial_number = serial_number
+            self.manufacturer = manufacturer
+            self.description = description
+
     class Platform:
         SENSOR = "sensor"
         NUMBER = "number"
@@ -39,19 +89,129 @@ def _install_homeassistant_stubs() -> None:
     class UpdateFailed(Exception):
         """Stub UpdateFailed exception."""
 
+    class Store:
+        """Stub in-memory storage helper."""
+
+        def __init__(self, hass, version, key):
+            self.saved = None
+
+        async def async_load(self):
+            return self.saved
+
+        async def async_save(self, data):
+            self.saved = data
+
+    class DeviceInfo(dict):
+        """Stub DeviceInfo typed dict."""
+
+    class EntityCategory:
+        DIAGNOSTIC = "diagnostic"
+
+    class SensorEntity:
+        """Stub SensorEntity base class."""
+
+        hass = None
+        entity_id = None
+
+        def async_write_ha_state(self):
+            """Stub state write."""
+
+    class BinarySensorEntity(SensorEntity):
+        """Stub BinarySensorEntity base class."""
+
+    class BinarySensorDeviceClass:
+        PROBLEM = "problem"
+
+    class NumberEntity(SensorEntity):
+        """Stub NumberEntity base class."""
+
+    class NumberMode:
+        BOX = "box"
+        SLIDER = "slider"
+
+    class HomeAssistantError(Exception):
+        """Stub HomeAssistantError exception."""
+
+    class SensorStateClass:
+        MEASUREMENT = "measurement"
+        TOTAL = "total"
+        TOTAL_INCREASING = "total_increasing"
+
+    class SensorDeviceClass:
+        """Stub SensorDeviceClass enum."""
+
     def async_get(_hass):
         return None
 
+    def async_entries_for_config_entry(_registry, _config_entry_id):
+        return []
+
     def config_entry_only_config_schema(_domain):
         return {}
 
     core.HomeAssistant = HomeAssistant
+    core.ServiceCall = object
+    core.ServiceResponse = dict
+    core.SupportsResponse = types.SimpleNamespace(NONE="none", OPTIONAL="optional", ONLY="only")
+    core.callback = lambda func: func
     config_entries.ConfigEntry = ConfigEntry
+    config_entries.ConfigFlow = ConfigFlow
+    config_entries.OptionsFlow = OptionsFlow
+    data_entry_flow.AbortFlow = AbortFlow
+    selector.selector = lambda config: config
+    service_info_usb.UsbServiceInfo = UsbServiceInfo
+    usb.get_serial_by_id = lambda device: device
     const.CONF_HOST = "host"
     const.CONF_PORT = "port"
     const.Platform = Platform
+    const.STATE_UNKNOWN = "unknown"
+    const.ATTR_DEVICE_CLASS = "device_class"
+    const.ATTR_UNIT_OF_MEASUREMENT = "unit_of_measurement"
+    device_registry.DeviceInfo = DeviceInfo
+    entity.EntityCategory = EntityCategory
+    entity_platform.AddEntitiesCallback = object
+    sensor.SensorEntity = SensorEntity
+    sensor.SensorStateClass = SensorStateClass
+    sensor.SensorDeviceClass = SensorDeviceClass
+
+    def check_absolute_change(val1, val2, change):
+        return abs(val1 - val2) >= change
+
+    def check_valid_float(value):
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+
+    binary_sensor.BinarySensorEntity = BinarySensorEntity
+    binary_sensor.BinarySensorDeviceClass = BinarySensorDeviceClass
+    number.NumberEntity = NumberEntity
+    number.NumberMode = NumberMode
+    exceptions.HomeAssistantError = HomeAssistantError
+    event.async_call_later = MagicMock()
+    event.async_track_point_in_utc_time = MagicMock()
+    dt_util.utcnow = lambda: datetime.now(timezone.utc)
+    dt_util.as_utc = lambda value: (
+        value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    )
+    dt_util.parse_datetime = datetime.fromisoformat
+    util.dt = dt_util
+    websocket_api.websocket_command = lambda schema: (lambda func: func)
+    websocket_api.async_register_command = MagicMock()
+    websocket_api.event_message = lambda msg_id, event: {"id": msg_id, "type": "event", "event": event}
+    websocket_api.ActiveConnection = object
+    components.websocket_api = websocket_api
+    storage.Store = Store
+    significant_change.check_absolute_change = check_absolute_change
+    significant_change.check_valid_float = check_valid_float
     entity_registry.async_get = async_get
+    entity_registry.async_entries_for_config_entry = async_entries_for_config_entry
     config_validation.config_entry_only_config_schema = config_entry_only_config_schema
+    config_validation.string = str
+    config_validation.ensure_list = lambda value: value if isinstance(value, list) else [value]
+    config_validation.datetime = datetime.fromisoformat
+    config_validation.boolean = bool
     helpers.entity_registry = entity_registry
     helpers.config_validation = config_validation
     update_coordinator.DataUpdateCoordinator = DataUpdateCoordinator
@@ -65,20 +225,87 @@ def _install_homeassistant_stubs() -> None:
     sys.modules["homeassistant.helpers.entity_registry"] = entity_registry
     sys.modules["homeassistant.helpers.config_validation"] = config_validation
     sys.modules["homeassistant.helpers.update_coordinator"] = update_coordinator
+    sys.modules["homeassistant.helpers.device_registry"] = device_registry
+    sys.modules["homeassistant.helpers.entity"] = entity
+    sys.modules["homeassistant.helpers.entity_platform"] = entity_platform
+    sys.modules["homeassistant.components"] = components
+    sys.modules["homeassistant.components.sensor"] = sensor
+    sys.modules["homeassistant.helpers.significant_change"] = significant_change
+    sys.modules["homeassistant.components.binary_sensor"] = binary_sensor
+    sys.modules["homeassistant.components.number"] = number
+    sys.modules["homeassistant.exceptions"] = exceptions
+    sys.modules["homeassistant.helpers.event"] = event
+    sys.modules["homeassistant.helpers.storage"] = storage
+    sys.modules["homeassistant.util"] = util
+    sys.modules["homeassistant.util.dt"] = dt_util
+    sys.modules["homeassistant.components.websocket_api"] = websocket_api
+    sys.modules["homeassistant.data_entry_flow"] = data_entry_flow
+    sys.modules["homeassistant.helpers.selector"] = selector
+    sys.modules["homeassistant.helpers.service_info"] = service_info
+    sys.modules["homeassistant.helpers.service_info.usb"] = service_info_usb
+    sys.modules["homeassistant.components.usb"] = usb
+    try:
+        import voluptuous  # noqa: F401
+    except ImportError:
+        sys.modules["voluptuous"] = MagicMock()
 
 
 _install_homeassistant_stubs()
 
+from homeassistant.helpers.service_info.usb import UsbServiceInfo
+
 from custom_components.apstorage import (
+    _async_update_listener,
+    APstorageCoordinator,
     APstorageModbusClient,
     DEFAULT_CONNECTION_MAX_AGE_SECONDS,
 )
-from custom_components.apstorage.const import APSTORAGE_REGISTERS, LOGGER_NAME
+from custom_components.apstorage.bus import APstorageRtuBus, APstorageTcpPool, rtu_frame_gap
+from custom_components.apstorage.const import (
+    APSTORAGE_REGISTERS,
+    APSTORAGE_SCALE_REGISTERS,
+    DATA_SERIAL_PORTS,
+    LOGGER_NAME,
+    PIPELINE_RECOVERY_ROUNDS,
+    SERIAL_PORTS_CACHE_SECONDS,
+)
+from custom_components.apstorage.config_flow import (
+    APstorageConfigFlow,
+    _async_serial_port_options,
+    _serial_port_options,
+)
+from custom_components.apstorage.controller import APstorageZeroExportController
+from custom_components.apstorage.deadband import parse_deadbands
+from custom_components.apstorage.discovery import (
+    APstorageModelCache,
+    SunSpecDiscovery,
+    SunSpecModel,
+    async_confirm_unimplemented,
+    async_discover_model_chain,
+)
 from custom_components.apstorage.entity_naming import (
     async_migrate_entity_id,
     build_prefixed_entity_id,
     get_suggested_object_id,
 )
+from custom_components.apstorage.fleet import APstorageFleet
+from custom_components.apstorage.frame_log import APstorageFrameRecorder, log_files, read_records
+from custom_components.apstorage.probe import ProbeResult, async_probe_tcp, candidates
+from custom_components.apstorage.proxy import APstorageModbusProxy, is_loopback
+from custom_components.apstorage.schedule import APstorageScheduleExecutor
+from custom_components.apstorage.scheduler import APstoragePollScheduler
+from custom_components.apstorage.sensor import APstorageFleetSensor, APstorageRegisterSensor
+from custom_components.apstorage.significant_change import async_check_significant_change
+from custom_components.apstorage.snapshot import APstorageSnapshot, get_register_value
+from custom_components.apstorage.transport import APstorageModbusTcpPipeline
+from custom_components.apstorage.websocket import ws_subscribe_live
+
+
+def _loop_hass() -> MagicMock:
+    """Return a hass stand-in that runs background tasks on the running loop."""
+    hass = MagicMock()
+    hass.async_create_background_task = lambda coro, name: asyncio.create_task(coro, name=name)
+    return hass
 
 
 class TestAPstorageDecoding(unittest.TestCase):
@@ -438,6 +665,45 @@ class TestAPstorageDecoding(unittest.TestCase):
         self.assertFalse(result_no_serial, "Should not migrate when serial register is missing")
         registry.async_update_entity.assert_not_called()
 
+    def test_bulk_migration_renames_all_entry_entities_once(self):
+        """Serial-prefixed entity IDs are applied to the whole entry in one pass."""
+        import custom_components.apstorage.entity_naming as entity_naming
+
+        registry = MagicMock()
+        entries = [
+            MagicMock(entity_id="sensor.charge_status", original_name="Charge Status"),
+            MagicMock(
+                entity_id="sensor.aps_serial_42_battery_power", original_name="Battery Power"
+            ),
+            MagicMock(entity_id="number.set_power", original_name="Set Power"),
+        ]
+        coordinator = APstorageCoordinator(
+            hass=object(), host="test", port=502, unit=1, connection_type="tcp", entry_id="entry"
+        )
+        snapshot = APstorageSnapshot()
+        snapshot.set_value(40052, "SERIAL-42")
+
+        original_async_get = entity_naming.er.async_get
+        original_entries = entity_naming.er.async_entries_for_config_entry
+        entity_naming.er.async_get = MagicMock(return_value=registry)
+        entity_naming.er.async_entries_for_config_entry = MagicMock(return_value=entries)
+        try:
+            coordinator._async_migrate_entity_ids(APstorageSnapshot())
+            self.assertFalse(coordinator.entity_ids_migrated)
+            coordinator._async_migrate_entity_ids(snapshot)
+        finally:
+            entity_naming.er.async_get = original_async_get
+            entity_naming.er.async_entries_for_config_entry = original_entries
+
+        self.assertTrue(coordinator.entity_ids_migrated)
+        registry.async_update_entity.assert_has_calls(
+            [
+                call("sensor.charge_status", new_entity_id="sensor.aps_serial_42_charge_status"),
+                call("number.set_power", new_entity_id="number.aps_serial_42_set_power"),
+            ]
+        )
+        self.assertEqual(registry.async_update_entity.call_count, 2)
+
     def test_reactive_power_registers_are_signed_int16(self):
         """Reactive power registers must decode signed values correctly."""
         for address in (40138, 40139, 40140):
@@ -451,5 +717,1911 @@ class TestAPstorageDecoding(unittest.TestCase):
             self.assertEqual(APSTORAGE_REGISTERS[address][2], "sunssf")
 
 
+
+class TestAPstorageSnapshot(unittest.TestCase):
+    """Test the compact coordinator snapshot."""
+
+    def _make_coordinator(self):
+        return APstorageCoordinator(
+            hass=None, host="test", port=502, unit=1, connection_type="tcp"
+        )
+
+    def _raw_batches(self, coordinator, words_by_address):
+        """Build packed raw frames for the coordinator read plan."""
+        batches = []
+        for decoder in coordinator._read_plan:
+            words = [0] * decoder.count
+            for address, registers in words_by_address.items():
+                offset = address - decoder.start
+                if 0 <= offset < decoder.count:
+                    words[offset : offset + len(registers)] = registers
+            batches.append((decoder, decoder.pack(words)))
+        return batches
+
+    def test_snapshot_exposes_legacy_mapping_view(self):
+        """Snapshot records look like the legacy per-register dicts."""
+        snapshot = APstorageSnapshot()
+        snapshot.set_value(40117, 1500)
+
+        self.assertIn(40117, snapshot)
+        self.assertNotIn(40081, snapshot)
+        self.assertEqual(
+            dict(snapshot[40117]),
+            {"name": "Battery Power", "value": 1500, "unit": "W", "type": "int16"},
+        )
+        self.assertEqual(snapshot.get(40081, {}).get("value"), None)
+        self.assertEqual(list(snapshot), [40117])
+
+    def test_get_register_value_accepts_snapshot_and_dict(self):
+        """Value helper supports both snapshot and legacy dict data."""
+        snapshot = APstorageSnapshot()
+        snapshot.set_value(40052, "SERIAL-42")
+
+        self.assertEqual(get_register_value(snapshot, 40052), "SERIAL-42")
+        self.assertEqual(get_register_value({40052: {"value": "SERIAL-42"}}, 40052), "SERIAL-42")
+        self.assertIsNone(get_register_value(None, 40052))
+        self.assertEqual(get_suggested_object_id(snapshot, "Charge Status"), "aps_serial_42_charge_status")
+
+    def test_decode_batches_applies_dynamic_scale_factors(self):
+        """Decoded snapshot applies SunSpec scale factors from the same poll."""
+        coordinator = self._make_coordinator()
+        batches = self._raw_batches(
+            coordinator,
+            {
+                40081: [856],
+                40126: [65535],  # SoC_SF = -1
+                40117: [65436],  # -100 W
+                40133: [0],
+                40052: [0x4230, 0x3530, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            },
+        )
+
+        snapshot = coordinator._decode_frames(batches)
+
+        self.assertIsInstance(snapshot, APstorageSnapshot)
+        self.assertAlmostEqual(snapshot.value(40081), 85.6)
+        self.assertEqual(snapshot.value(40117), -100)
+        self.assertEqual(snapshot.value(40126), -1)
+        self.assertEqual(snapshot.value(40052), "B050")
+
+    def test_batch_decoder_matches_per_register_decoding(self):
+        """Whole-batch struct decoding matches the per-register decoder."""
+        import random
+
+        coordinator = self._make_coordinator()
+        client = coordinator.modbus_client
+        rng = random.Random(1234)
+        words_by_address = {
+            address: [rng.randrange(0x20, 0x7F) << 8 | rng.randrange(0x20, 0x7F) for _ in range(count)]
+            if value_type == "string"
+            else [rng.randrange(0, 0x10000) for _ in range(count)]
+            for address, (_, count, value_type, _, _, _) in APSTORAGE_REGISTERS.items()
+        }
+        # Keep scale factors small so expected values stay comparable.
+        for address, (_, _, value_type, _, _, _) in APSTORAGE_REGISTERS.items():
+            if value_type == "sunssf":
+                words_by_address[address] = [0]
+
+        snapshot = coordinator._decode_frames(self._raw_batches(coordinator, words_by_address))
+
+        for address, (_, _, value_type, scale, _, _) in APSTORAGE_REGISTERS.items():
+            expected_scale = 1 if address in APSTORAGE_SCALE_REGISTERS else scale
+            expected = client.decode_register(words_by_address[address], value_type, expected_scale)
+            self.assertEqual(snapshot.value(address), expected, f"register {address}")
+
+    def test_unchanged_frames_skip_decode_and_dispatch(self):
+        """Identical raw frames return the previous snapshot untouched."""
+        coordinator = self._make_coordinator()
+        frames = self._raw_batches(coordinator, {40117: [100], 40081: [500], 40126: [65535]})
+        first = coordinator._decode_frames(frames)
+
+        second = coordinator._decode_frames(frames)
+
+        self.assertIs(second, first)
+        self.assertEqual(coordinator.changed_addresses, frozenset())
+        self.assertFalse(coordinator.registers_changed((40117,)))
+        stats = {batch["start"]: batch for batch in coordinator.batch_statistics()}
+        self.assertEqual(stats[40117]["unchanged"], 1)
+        self.assertEqual(stats[40117]["unchanged_ratio"], 0.5)
+
+    def test_changed_frame_only_redecodes_its_batch(self):
+        """Only registers of a changed batch are reported as changed."""
+        coordinator = self._make_coordinator()
+        coordinator._decode_frames(self._raw_batches(coordinator, {40117: [100], 40081: [500]}))
+
+        snapshot = coordinator._decode_frames(
+            self._raw_batches(coordinator, {40117: [250], 40081: [500]})
+        )
+
+        self.assertEqual(snapshot.value(40117), 250)
+        self.assertTrue(coordinator.registers_changed((40117,)))
+        self.assertFalse(coordinator.registers_changed((40081,)))
+
+    def _fail_batch(self, frames, address):
+        return [(decoder, None if address in decoder.addresses else frame) for decoder, frame in frames]
+
+    def test_failed_batch_stays_available_as_stale_during_grace(self):
+        """A failed batch keeps its last values, flagged stale, within grace."""
+        coordinator = self._make_coordinator()
+        coordinator.stale_grace_polls = 2
+        coordinator.stale_grace_seconds = 0
+        frames = self._raw_batches(coordinator, {40117: [100], 40081: [500]})
+        coordinator._decode_frames(frames, now=0.0)
+
+        snapshot = coordinator._decode_frames(self._fail_batch(frames, 40117), now=5.0)
+
+        self.assertEqual(snapshot.value(40117), 100)
+        self.assertTrue(snapshot.is_stale(40117))
+        self.assertFalse(snapshot.is_stale(40081))
+        self.assertEqual(coordinator.data_age(40117, now=5.0), 5.0)
+        self.assertTrue(coordinator.registers_changed((40117,)))
+        self.assertFalse(coordinator.registers_changed((40081,)))
+
+        second = coordinator._decode_frames(self._fail_batch(frames, 40117), now=10.0)
+        self.assertIs(second, snapshot)
+
+        expired = coordinator._decode_frames(self._fail_batch(frames, 40117), now=15.0)
+        self.assertNotIn(40117, expired)
+        self.assertIn(40081, expired)
+
+        recovered = coordinator._decode_frames(frames, now=20.0)
+        self.assertEqual(recovered.value(40117), 100)
+        self.assertFalse(recovered.is_stale(40117))
+
+    def test_failed_batch_is_dropped_without_grace(self):
+        """With grace disabled a failed batch only drops its own registers."""
+        coordinator = self._make_coordinator()
+        coordinator.stale_grace_polls = 0
+        coordinator.stale_grace_seconds = 0
+        frames = self._raw_batches(coordinator, {40117: [100], 40081: [500]})
+        coordinator._decode_frames(frames, now=0.0)
+
+        snapshot = coordinator._decode_frames(self._fail_batch(frames, 40117), now=5.0)
+
+        self.assertNotIn(40117, snapshot)
+        self.assertIn(40081, snapshot)
+
+    def test_whole_poll_failure_within_grace_keeps_data(self):
+        """A fully failed poll does not flip the coordinator to unavailable."""
+        coordinator = self._make_coordinator()
+        frames = self._raw_batches(coordinator, {40117: [100]})
+        coordinator._decode_frames(frames, now=0.0)
+
+        snapshot = coordinator._decode_frames([(decoder, None) for decoder, _ in frames], now=60.0)
+
+        self.assertEqual(snapshot.value(40117), 100)
+        self.assertTrue(snapshot.is_stale(40117))
+
+    def test_optimistic_value_forces_redecode(self):
+        """Optimistic UI values are replaced by the device value on the next poll."""
+        coordinator = self._make_coordinator()
+        frames = self._raw_batches(coordinator, {40183: [0]})
+        coordinator.data = coordinator._decode_frames(frames)
+
+        coordinator.async_set_optimistic_value(40183, 500)
+        snapshot = coordinator._decode_frames(frames)
+
+        self.assertEqual(snapshot.value(40183), 0)
+
+    def _poll(self, coordinator, words_by_address, now):
+        snapshot = coordinator._apply_heartbeat(
+            coordinator._decode_frames(self._raw_batches(coordinator, words_by_address)),
+            now,
+        )
+        coordinator.data = snapshot
+        return snapshot
+
+    def test_heartbeat_advances_device_time(self):
+        """Device time follows heartbeat deltas rather than host receive time."""
+        coordinator = self._make_coordinator()
+        first = self._poll(coordinator, {40089: [100], 40117: [1]}, now=1000.0)
+        # Host saw 5.4 s because of Modbus latency jitter; the device ticked 5 s.
+        second = self._poll(coordinator, {40089: [105], 40117: [2]}, now=1005.4)
+
+        self.assertEqual(first.device_time, 1000.0)
+        self.assertEqual(second.device_time, 1005.0)
+        self.assertFalse(second.stale)
+
+    def test_frame_log_records_polls_at_device_time(self):
+        """Logged polls are spaced by heartbeat deltas, not host receive time."""
+        coordinator = self._make_coordinator()
+        coordinator.entity_ids_migrated = True
+        coordinator.recorder = MagicMock()
+        clock = MagicMock()
+
+        def poll(heartbeat, monotonic, wall):
+            frames = self._raw_batches(coordinator, {40089: [heartbeat]})
+            coordinator._async_read_frames = AsyncMock(return_value=frames)
+            clock.monotonic.return_value = monotonic
+            clock.time.return_value = wall
+            with patch("custom_components.apstorage.time", clock):
+                coordinator.data = asyncio.run(coordinator._async_poll())
+            return coordinator.recorder.async_record.call_args.args[1]
+
+        self.assertEqual(poll(100, 1000.0, 5000.0), 5000.0)
+        # The host saw 5.4 s; the device ticked 5 s.
+        self.assertEqual(poll(105, 1005.4, 5005.4), 5005.0)
+
+    def test_frozen_heartbeat_marks_last_values_stale(self):
+        """A heartbeat that stops advancing republishes nothing new."""
+        coordinator = self._make_coordinator()
+        fresh = self._poll(coordinator, {40089: [100], 40117: [1]}, now=1000.0)
+
+        stale = self._poll(coordinator, {40089: [100], 40117: [2]}, now=1005.0)
+        still_stale = self._poll(coordinator, {40089: [100], 40117: [3]}, now=1010.0)
+
+        self.assertTrue(stale.stale)
+        self.assertTrue(coordinator.device_stale)
+        self.assertEqual(stale.value(40117), fresh.value(40117))
+        self.assertIs(still_stale, stale)
+
+        resumed = self._poll(coordinator, {40089: [115], 40117: [4]}, now=1015.0)
+
+        self.assertFalse(resumed.stale)
+        self.assertFalse(coordinator.device_stale)
+        self.assertEqual(resumed.value(40117), 4)
+
+
+
+class TestAPstorageSensorStateWrites(unittest.TestCase):
+    """Test sensor state-write suppression."""
+
+    def setUp(self):
+        self.coordinator = MagicMock()
+        self.coordinator.last_update_success = True
+        self.coordinator.registers_changed.return_value = True
+        self.entry = MagicMock()
+        self.entry.entry_id = "entry"
+
+    def _sensor(self, address):
+        name, _, value_type, _, unit, device_class = APSTORAGE_REGISTERS[address]
+        sensor = APstorageRegisterSensor(
+            self.coordinator, self.entry, address, name, unit, device_class, value_type
+        )
+        sensor.async_write_ha_state = MagicMock()
+        return sensor
+
+    def _publish(self, sensor, address, value):
+        snapshot = APstorageSnapshot()
+        snapshot.set_value(address, value)
+        self.coordinator.data = snapshot
+        sensor._async_handle_coordinator_update()
+
+    def test_power_jitter_inside_deadband_is_not_written(self):
+        """Battery Power jitter of a few watts does not write state."""
+        sensor = self._sensor(40117)
+
+        self._publish(sensor, 40117, 1500)
+        self._publish(sensor, 40117, 1504)
+        self._publish(sensor, 40117, 1509)
+        self._publish(sensor, 40117, 1530)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+
+    def test_deadband_is_relative_to_last_written_value(self):
+        """Slow drift is written once it leaves the deadband around the last write."""
+        sensor = self._sensor(40117)
+
+        for value in (1500, 1508, 1516):
+            self._publish(sensor, 40117, value)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+
+    def test_transition_to_zero_is_always_written(self):
+        """Going to exactly zero (standby) bypasses the deadband."""
+        sensor = self._sensor(40117)
+
+        self._publish(sensor, 40117, 5)
+        self._publish(sensor, 40117, 0)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+
+    def test_max_silence_forces_a_write(self):
+        """A suppressed value is still written after the max-silence period."""
+        sensor = self._sensor(40117)
+        self._publish(sensor, 40117, 1500)
+        sensor._last_written_monotonic -= 301
+
+        self._publish(sensor, 40117, 1502)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+
+    def test_energy_sensors_have_no_deadband(self):
+        """Energy totals write every change."""
+        sensor = self._sensor(40148)
+
+        self._publish(sensor, 40148, 10.0)
+        self._publish(sensor, 40148, 10.01)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+
+    def test_configured_deadband_overrides_the_default(self):
+        """The deadbands option replaces the device-class default per register."""
+        deadbands = parse_deadbands("40117=0/0, 40148=0.5")
+        name, _, value_type, _, unit, device_class = APSTORAGE_REGISTERS[40117]
+        sensor = APstorageRegisterSensor(
+            self.coordinator, self.entry, 40117, name, unit, device_class, value_type, deadbands[40117]
+        )
+        sensor.async_write_ha_state = MagicMock()
+
+        self._publish(sensor, 40117, 1500)
+        self._publish(sensor, 40117, 1501)
+
+        self.assertEqual(sensor.async_write_ha_state.call_count, 2)
+        self.assertEqual(sensor.extra_state_attributes, {"deadband": [0, 0]})
+        self.assertIsNone(self._sensor(40117).extra_state_attributes)
+        self.assertEqual(deadbands[40148], (0.5, 0.0))
+        with self.assertRaises(ValueError):
+            parse_deadbands("99999=5")
+        with self.assertRaises(ValueError):
+            parse_deadbands("40117=fast")
+
+    def test_bitfield_attributes_are_cached_per_value(self):
+        """Bitfield attribute dicts are built once per distinct value."""
+        sensor = self._sensor(40100)
+        snapshot = APstorageSnapshot()
+        snapshot.set_value(40100, 0b110)
+        self.coordinator.data = snapshot
+
+        first = sensor.extra_state_attributes
+        second = sensor.extra_state_attributes
+
+        self.assertIs(first, second)
+        self.assertEqual(first["active_count"], 2)
+        self.assertTrue(first["bit_1_AC_A_Voltage_stage1_Exceeding_Range"])
+        self.assertIn("bit_1_AC_A_Voltage_stage1_Exceeding_Range", sensor._unrecorded_attributes)
+        self.assertNotIn("active_alarms", sensor._unrecorded_attributes)
+
+    def test_device_info_is_cached_until_identity_changes(self):
+        """Device info and object IDs are rebuilt only on identity changes."""
+        self.coordinator.identity_version = 1
+        self.coordinator.data = {40052: {"value": "B050-1"}}
+        sensor = self._sensor(40117)
+
+        first = sensor.device_info
+        self.coordinator.data = {40052: {"value": "B050-2"}}
+        self.assertIs(sensor.device_info, first)
+        self.assertEqual(sensor.suggested_object_id, "aps_b050_2_battery_power")
+
+        self.coordinator.data = {40052: {"value": "B050-3"}}
+        self.assertEqual(sensor.suggested_object_id, "aps_b050_2_battery_power")
+
+        self.coordinator.identity_version = 2
+        self.assertEqual(sensor.device_info["serial_number"], "B050-3")
+        self.assertEqual(sensor.suggested_object_id, "aps_b050_3_battery_power")
+
+    def test_identity_version_tracks_identity_registers(self):
+        """The coordinator bumps identity_version only when identity changes."""
+        coordinator = APstorageCoordinator(
+            hass=None, host="test", port=502, unit=1, connection_type="tcp"
+        )
+        serial = [0x4230, 0x3530] + [0] * 14
+        helper = TestAPstorageSnapshot()
+
+        coordinator._decode_frames(helper._raw_batches(coordinator, {40052: serial, 40117: [1]}))
+        self.assertEqual(coordinator.identity_version, 1)
+        coordinator._decode_frames(helper._raw_batches(coordinator, {40052: serial, 40117: [2]}))
+        self.assertEqual(coordinator.identity_version, 1)
+        serial[2] = 0x3100
+        coordinator._decode_frames(helper._raw_batches(coordinator, {40052: serial, 40117: [2]}))
+        self.assertEqual(coordinator.identity_version, 2)
+
+
+class TestAPstorageSignificantChange(unittest.TestCase):
+    """Test the significant_change platform."""
+
+    def _check(self, old_state, new_state, old_attrs=None, new_attrs=None):
+        attrs = {"device_class": "power", "unit_of_measurement": "W"}
+        return async_check_significant_change(
+            None,
+            old_state,
+            old_attrs if old_attrs is not None else attrs,
+            new_state,
+            new_attrs if new_attrs is not None else attrs,
+        )
+
+    def test_power_jitter_is_not_significant(self):
+        self.assertFalse(self._check("1500", "1505"))
+        self.assertTrue(self._check("1500", "1530"))
+
+    def test_power_direction_change_is_significant(self):
+        self.assertTrue(self._check("3", "-3"))
+        self.assertTrue(self._check("4", "0"))
+
+    def test_bitfield_change_depends_on_raw_value(self):
+        attrs = {"active_alarms": "None", "raw_value": 0}
+        self.assertFalse(self._check("0x00000000", "0x00000000", attrs, dict(attrs)))
+        self.assertTrue(self._check("0x00000000", "0x00000002", attrs, dict(attrs)))
+
+    def test_configured_deadband_is_used(self):
+        attrs = {"device_class": "power", "unit_of_measurement": "W", "deadband": [100, 0]}
+        self.assertFalse(self._check("1500", "1550", attrs, dict(attrs)))
+        self.assertTrue(self._check("1500", "1600", attrs, dict(attrs)))
+
+        disabled = {**attrs, "deadband": [0, 0]}
+        self.assertTrue(self._check("1500", "1501", disabled, dict(disabled)))
+
+    def test_data_age_alone_is_not_significant(self):
+        old = {"device_class": "power", "stale": True, "data_age": 30}
+        new = {"device_class": "power", "stale": True, "data_age": 90}
+        self.assertFalse(self._check("1500", "1500", old, new))
+        self.assertTrue(self._check("1500", "1500", {"device_class": "power"}, new))
+
+    def test_text_change_is_significant(self):
+        self.assertTrue(self._check("CHARGING", "HOLDING", {}, {}))
+
+
+class TestAPstoragePollScheduler(unittest.TestCase):
+    """Test poll staggering across entries sharing a link."""
+
+    def setUp(self):
+        rng = MagicMock()
+        rng.uniform.return_value = 0.0
+        self.scheduler = APstoragePollScheduler(clock=lambda: 1000.0, rng=rng)
+
+    def test_single_entry_has_no_offset(self):
+        self.scheduler.register("a", "tcp:gw:502", 60)
+        self.assertEqual(self.scheduler.phase_offset("a"), 0.0)
+        self.assertEqual(self.scheduler.next_delay("a", now=1000.0), 60.0)
+
+    def test_entries_on_one_link_are_spread_across_the_interval(self):
+        for entry_id in ("a", "b", "c"):
+            self.scheduler.register(entry_id, "rtu:/dev/ttyUSB0", 60)
+            self.scheduler.record_duration(entry_id, 2.0)
+        self.scheduler.register("other", "tcp:gw:502", 60)
+
+        self.assertEqual(
+            [self.scheduler.phase_offset(entry_id) for entry_id in ("a", "b", "c")],
+            [0.0, 20.0, 40.0],
+        )
+        self.assertEqual(self.scheduler.phase_offset("other"), 0.0)
+        # A poll that ran late still lands on the entry's own slot next time.
+        self.assertAlmostEqual(self.scheduler.next_delay("b", now=1023.0), 57.0)
+
+    def test_measured_durations_size_the_slots(self):
+        self.scheduler.register("slow", "tcp:gw:502", 10)
+        self.scheduler.register("fast", "tcp:gw:502", 10)
+        self.scheduler.record_duration("slow", 6.0)
+        self.scheduler.record_duration("fast", 2.0)
+
+        self.assertEqual(self.scheduler.phase_offset("fast"), 7.0)
+
+        self.scheduler.unregister("slow")
+        self.assertEqual(self.scheduler.phase_offset("fast"), 0.0)
+
+    def test_jitter_is_bounded(self):
+        scheduler = APstoragePollScheduler(clock=lambda: 0.0)
+        scheduler.register("a", "tcp:gw:502", 60)
+        for _ in range(50):
+            self.assertTrue(60.0 <= scheduler.next_delay("a", now=0.0) <= 62.0)
+
+    def test_coordinator_reschedules_after_poll(self):
+        coordinator = APstorageCoordinator(
+            hass=None, host="gw", port=502, unit=1, connection_type="tcp", entry_id="a"
+        )
+        self.scheduler.register("a", coordinator.modbus_client.link_key, 60)
+        coordinator.poll_scheduler = self.scheduler
+
+        coordinator._schedule_next_poll(1.5)
+
+        self.assertEqual(self.scheduler.diagnostics("a")["poll_duration"], 1.5)
+        self.assertIsNotNone(coordinator.update_interval)
+
+
+class TestAPstorageRtuBus(unittest.TestCase):
+    """Test the shared serial bus for several unit IDs."""
+
+    def test_frame_gap_follows_rtu_timing(self):
+        self.assertAlmostEqual(rtu_frame_gap(9600), 3.5 * 11 / 9600)
+        self.assertEqual(rtu_frame_gap(115200), 0.00175)
+
+    def test_units_share_one_client(self):
+        bus = APstorageRtuBus("/dev/ttyUSB0", 9600)
+        first = APstorageModbusClient(
+            hass=None, host="/dev/ttyUSB0", port=502, unit=1, connection_type="rtu", bus=bus
+        )
+        second = APstorageModbusClient(
+            hass=None, host="/dev/ttyUSB0", port=502, unit=2, connection_type="rtu", bus=bus
+        )
+        response = MagicMock()
+        response.isError.return_value = False
+        response.registers = [7]
+        port = bus._connections[0]
+        port.client = MagicMock()
+        port.client.read_holding_registers.return_value = response
+
+        self.assertEqual(second.read_registers(40083, 1), [7])
+        port.client.read_holding_registers.assert_called_once_with(
+            address=40083, count=1, device_id=2
+        )
+        self.assertEqual(bus.transactions, {2: 1})
+
+    def test_error_reply_does_not_reopen_an_open_port(self):
+        bus = APstorageRtuBus("/dev/ttyUSB0", 9600)
+        bus._connections[0].client = MagicMock(connected=True)
+        create_client = MagicMock()
+
+        with bus.channel(1):
+            self.assertTrue(bus.connect(create_client, force_reconnect=True))
+        create_client.assert_not_called()
+
+    def test_connection_is_only_reachable_inside_a_channel(self):
+        bus = APstorageRtuBus("/dev/ttyUSB0", 9600)
+
+        with self.assertRaises(RuntimeError):
+            bus.connect(MagicMock())
+        with bus.channel(1):
+            self.assertIs(bus.client, bus._connections[0].client)
+
+    def test_units_write_through_the_bus(self):
+        bus = APstorageRtuBus("/dev/ttyUSB0", 9600)
+        client = APstorageModbusClient(
+            hass=None, host="/dev/ttyUSB0", port=502, unit=2, connection_type="rtu", bus=bus
+        )
+        port = bus._connections[0]
+        port.client = MagicMock(connected=True)
+        port.client.write_registers.return_value.isError.return_value = False
+
+        self.assertTrue(client.write_register(40183, -100))
+        port.client.write_registers.assert_called_once_with(
+            address=40183, values=[0xFF9C], device_id=2
+        )
+        self.assertIsNone(client.last_write_error)
+
+    def test_waiting_units_are_served_round_robin(self):
+        bus = APstorageRtuBus("/dev/ttyUSB0", 115200)
+        served = []
+
+        def transaction(unit):
+            with bus.channel(unit):
+                served.append(unit)
+
+        bus.acquire(1)
+        threads = []
+        for unit in (1, 1, 2, 3):
+            thread = threading.Thread(target=transaction, args=(unit,))
+            thread.start()
+            threads.append(thread)
+            while sum(len(tickets) for tickets in bus._waiters.values()) < len(threads):
+                time.sleep(0.001)
+        bus.release()
+        for thread in threads:
+            thread.join(timeout=2)
+
+        self.assertEqual(served, [2, 3, 1, 1])
+
+
+class TestAPstorageTcpPool(unittest.TestCase):
+    """Test the connection pool shared by units behind one TCP gateway."""
+
+    def _client(self, pool, unit):
+        return APstorageModbusClient(
+            hass=None, host="gw", port=502, unit=unit, connection_type="tcp", bus=pool
+        )
+
+    def test_units_multiplex_one_connection_with_metrics(self):
+        pool = APstorageTcpPool("gw", 502, connections=1)
+        first, second = self._client(pool, 3), self._client(pool, 4)
+        response = MagicMock()
+        response.isError.return_value = False
+        response.registers = [1]
+        failed = MagicMock()
+        failed.isError.return_value = True
+        create_client = MagicMock()
+        create_client.return_value.connect.return_value = False
+        second._create_client = create_client
+        connection = pool._connections[0]
+        connection.client = MagicMock(connected=True)
+        connection.client.read_holding_registers.side_effect = [response, failed]
+
+        self.assertEqual(first.read_registers(40083, 1), [1])
+        self.assertIsNone(second.read_registers(40083, 1))
+
+        self.assertEqual(pool.unit_metrics(3)["transactions"], 1)
+        self.assertEqual(pool.unit_metrics(3)["failures"], 0)
+        self.assertEqual(pool.unit_metrics(4)["failures"], 1)
+
+    def test_units_write_through_the_pool(self):
+        pool = APstorageTcpPool("gw", 502, connections=1)
+        client = self._client(pool, 3)
+        connection = pool._connections[0]
+        connection.client = MagicMock(connected=True)
+        connection.client.write_registers.return_value.isError.return_value = False
+
+        self.assertTrue(client.write_register(40183, 100))
+        connection.client.write_registers.assert_called_once_with(
+            address=40183, values=[100], device_id=3
+        )
+        self.assertEqual(pool.unit_metrics(3)["failures"], 0)
+
+    def test_old_connections_are_recycled(self):
+        pool = APstorageTcpPool("gw", 502, connections=1, max_age_seconds=60)
+        old = MagicMock(connected=True)
+        pool._connections[0].client = old
+        pool._connections[0].connected_at = time.monotonic() - 61
+        create_client = MagicMock()
+
+        with pool.channel(1):
+            self.assertTrue(pool.connect(create_client))
+        old.close.assert_called_once()
+        self.assertIs(pool._connections[0].client, create_client.return_value)
+
+    def test_each_concurrent_unit_gets_its_own_connection(self):
+        pool = APstorageTcpPool("gw", 502, connections=2)
+        pool.acquire(1)
+        held = pool._local.connection
+        seen = []
+
+        def transaction():
+            with pool.channel(2):
+                seen.append(pool._local.connection)
+
+        thread = threading.Thread(target=transaction)
+        thread.start()
+        thread.join(timeout=2)
+        pool.release()
+
+        self.assertEqual(len(seen), 1)
+        self.assertIsNot(seen[0], held)
+
+
+class TestAPstorageModbusTcpPipeline(unittest.TestCase):
+    """Test pipelined Modbus TCP reads against a local fake device."""
+
+    @staticmethod
+    async def _serve(answer_all: bool):
+        """Start a fake device; it answers in reverse order, or only the first request."""
+
+        async def handle(reader, writer):
+            answered = False
+            while True:
+                try:
+                    request = await reader.readexactly(12)
+                except asyncio.IncompleteReadError:
+                    return
+                transaction_id, _, _, unit, _, address, count = struct.unpack(">HHHBBHH", request)
+                if not answer_all and answered:
+                    continue
+                answered = True
+                payload = struct.pack(f">{count}H", *(address + i for i in range(count)))
+                pdu = bytes([3, len(payload)]) + payload
+                # Delay earlier requests more so responses arrive out of order.
+                await asyncio.sleep(0.01 * (3 - transaction_id % 3))
+                writer.write(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit) + pdu)
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    def test_responses_are_matched_by_transaction_id(self):
+        async def run():
+            server, port = await self._serve(answer_all=True)
+            async with server:
+                pipeline = APstorageModbusTcpPipeline(_loop_hass(), "127.0.0.1", port, window=4)
+                frames = await pipeline.async_read_many(1, [(100, 2), (200, 1), (300, 3)])
+                await pipeline.async_close()
+                return frames, pipeline.window
+
+        frames, window = asyncio.run(run())
+
+        self.assertEqual(frames[0], struct.pack(">2H", 100, 101))
+        self.assertEqual(frames[1], struct.pack(">H", 200))
+        self.assertEqual(frames[2], struct.pack(">3H", 300, 301, 302))
+        self.assertEqual(window, 4)
+
+    def test_window_shrinks_when_device_drops_pipelined_requests(self):
+        async def run():
+            server, port = await self._serve(answer_all=False)
+            async with server:
+                pipeline = APstorageModbusTcpPipeline(
+                    _loop_hass(), "127.0.0.1", port, window=4, timeout=0.2
+                )
+                frames = await pipeline.async_read_many(1, [(100, 1), (200, 1), (300, 1)])
+                await pipeline.async_close()
+                return frames, pipeline
+
+        frames, pipeline = asyncio.run(run())
+
+        self.assertIsNotNone(frames[0])
+        self.assertIn(None, frames)
+        self.assertLess(pipeline.window, 4)
+        self.assertGreaterEqual(pipeline.window_reductions, 1)
+
+    def test_window_recovers_after_clean_rounds(self):
+        async def run():
+            server, port = await self._serve(answer_all=True)
+            async with server:
+                pipeline = APstorageModbusTcpPipeline(_loop_hass(), "127.0.0.1", port, window=4)
+                pipeline.window = 1
+                windows = []
+                for _ in range(2 * PIPELINE_RECOVERY_ROUNDS):
+                    await pipeline.async_read_many(1, [(100, 1), (200, 1)])
+                    windows.append(pipeline.window)
+                await pipeline.async_close()
+                return windows
+
+        windows = asyncio.run(run())
+
+        self.assertEqual(windows[PIPELINE_RECOVERY_ROUNDS - 2], 1)
+        self.assertEqual(windows[PIPELINE_RECOVERY_ROUNDS - 1], 2)
+        self.assertEqual(windows[-1], 4)
+
+    def test_empty_response_fails_the_read(self):
+        async def handle(reader, writer):
+            request = await reader.readexactly(12)
+            transaction_id, _, _, unit = struct.unpack(">HHHB", request[:7])
+            # A length of 1 covers only the unit ID, leaving no PDU.
+            writer.write(struct.pack(">HHHB", transaction_id, 0, 1, unit))
+            await reader.read()
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                pipeline = APstorageModbusTcpPipeline(_loop_hass(), "127.0.0.1", port, timeout=0.5)
+                frame = await pipeline.async_read(1, 100, 1)
+                await pipeline.async_close()
+                return frame
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_coordinator_reads_frames_over_the_pipeline(self):
+        pipeline = MagicMock()
+        coordinator = APstorageCoordinator(
+            hass=None,
+            host="gw",
+            port=502,
+            unit=5,
+            connection_type="tcp",
+            register_address_offset=-1,
+            pipeline=pipeline,
+        )
+        plan = coordinator._read_plan
+        payloads = [bytes(decoder.count * 2) for decoder in plan]
+        payloads[-1] = None
+        pipeline.async_read_many = AsyncMock(return_value=payloads)
+
+        frames = asyncio.run(coordinator._async_read_frames_pipelined())
+
+        pipeline.async_read_many.assert_awaited_once_with(
+            5, [(decoder.start - 1, decoder.count) for decoder in plan]
+        )
+        self.assertEqual(frames[0], (plan[0], payloads[0]))
+        self.assertEqual(frames[-1], (plan[-1], None))
+
+
+class TestAPstorageModbusProxy(unittest.TestCase):
+    """Test the local Modbus TCP proxy and the shared write path."""
+
+    def setUp(self):
+        self.coordinator = APstorageCoordinator(
+            hass=None,
+            host="test",
+            port=502,
+            unit=1,
+            connection_type="tcp",
+            register_address_offset=-1,
+        )
+        self.coordinator.async_update_listeners = MagicMock()
+        plan = self.coordinator._read_plan
+        self.words = {
+            decoder.start: [(decoder.start + i) & 0xFFFF for i in range(decoder.count)]
+            for decoder in plan
+        }
+        for decoder in plan:
+            self.coordinator.raw_frames[decoder.start] = decoder.pack(self.words[decoder.start])
+        values = APstorageSnapshot()
+        values.set_value(40183, 0)
+        values.set_value(40133, 0)
+        values.set_value(40074, 5000)
+        values.set_value(40075, 5000)
+        self.coordinator.data = values
+        self.proxy = APstorageModbusProxy(self.coordinator, 0)
+
+    def test_listens_on_loopback_by_default(self):
+        async def run():
+            await self.proxy.async_start()
+            try:
+                return self.proxy._server.sockets[0].getsockname()[0]
+            finally:
+                await self.proxy.async_stop()
+
+        self.assertEqual(asyncio.run(run()), "127.0.0.1")
+        self.assertTrue(is_loopback("::1"))
+        self.assertFalse(is_loopback("0.0.0.0"))
+
+    def test_reads_are_served_from_raw_frames_in_wire_addressing(self):
+        first = self.coordinator._read_plan[0]
+        request = struct.pack(">BHH", 3, first.start + 1, 3)
+
+        response = self.proxy.handle_pdu(request)
+
+        self.assertEqual(response[:2], bytes((3, 6)))
+        self.assertEqual(struct.unpack(">3H", response[2:]), tuple(self.words[first.start][2:5]))
+
+    def test_unknown_or_missing_registers_are_rejected(self):
+        self.assertEqual(self.proxy.handle_pdu(struct.pack(">BHH", 3, 0, 1)), bytes((0x83, 2)))
+        first = self.coordinator._read_plan[0]
+        del self.coordinator.raw_frames[first.start]
+        self.assertEqual(
+            self.proxy.handle_pdu(struct.pack(">BHH", 3, first.start - 1, 1)), bytes((0x83, 0x0B))
+        )
+        self.assertEqual(self.proxy.handle_pdu(bytes((0x05, 0, 0, 0, 0))), bytes((0x85, 1)))
+
+    def test_set_power_writes_use_the_integration_write_path(self):
+        request = struct.pack(">BHH", 6, 40182, (-1500) & 0xFFFF)
+        with unittest.mock.patch(
+            "custom_components.apstorage.writer.async_call_later"
+        ) as call_later:
+            response = self.proxy.handle_pdu(request)
+
+        self.assertEqual(response, request)
+        self.assertEqual(self.coordinator.data.value(40183), -1500)
+        self.assertEqual(self.coordinator.writer._pending, {40183: -1500})
+        call_later.assert_called_once()
+        self.coordinator.async_update_listeners.assert_called_once()
+
+    def test_out_of_range_and_read_only_writes_are_rejected(self):
+        with unittest.mock.patch("custom_components.apstorage.writer.async_call_later"):
+            too_much = self.proxy.handle_pdu(struct.pack(">BHH", 6, 40182, 6000))
+            read_only = self.proxy.handle_pdu(struct.pack(">BHHBH", 16, 40073, 1, 2, 1))
+
+        self.assertEqual(too_much, bytes((0x86, 3)))
+        self.assertEqual(read_only, bytes((0x90, 2)))
+        self.assertEqual(self.coordinator.data.value(40183), 0)
+
+    def test_writes_are_rate_limited(self):
+        writer = self.coordinator.writer
+        writer._last_write[40183] = time.monotonic()
+        with unittest.mock.patch(
+            "custom_components.apstorage.writer.async_call_later"
+        ) as call_later:
+            writer.async_request_write(40183, 100)
+
+        self.assertGreater(call_later.call_args.args[1], 0.9)
+
+
+class TestAPstorageOptionsUpdate(unittest.TestCase):
+    """Test hot-applying options without reloading the entry."""
+
+    def setUp(self):
+        from datetime import timedelta
+
+        self.coordinator = APstorageCoordinator(
+            hass=None,
+            host="gw",
+            port=502,
+            unit=1,
+            connection_type="tcp",
+            scan_interval=timedelta(seconds=60),
+            entry_id="entry",
+        )
+        self.coordinator.async_request_refresh = AsyncMock()
+        self.coordinator.raw_frames[40000] = b"\x00\x01"
+        self.hass = MagicMock()
+        self.hass.config_entries.async_reload = AsyncMock()
+        self.hass.data = {
+            "apstorage": {"entry": {"coordinator": self.coordinator, "options": {}}}
+        }
+        self.entry = MagicMock(entry_id="entry", data={"host": "gw"}, options={})
+
+    def test_timing_options_are_applied_live(self):
+        self.entry.options = {
+            "scan_interval": 15,
+            "connection_max_age_seconds": 30,
+            "stale_grace_polls": 0,
+        }
+        # An offset corrected by SunSpec discovery at setup.
+        self.coordinator.modbus_client.register_address_offset = -1
+
+        asyncio.run(_async_update_listener(self.hass, self.entry))
+
+        self.hass.config_entries.async_reload.assert_not_called()
+        self.assertEqual(self.coordinator.update_interval.total_seconds(), 15)
+        self.assertEqual(self.coordinator.modbus_client.connection_max_age_seconds, 30)
+        self.assertEqual(self.coordinator.modbus_client.register_address_offset, -1)
+        self.assertEqual(self.coordinator.stale_grace_polls, 0)
+        self.assertEqual(self.coordinator.raw_frames, {40000: b"\x00\x01"})
+        self.coordinator.async_request_refresh.assert_awaited_once()
+
+    def test_transport_options_reload_the_entry(self):
+        self.entry.options = {"scan_interval": 15, "pipeline_requests": True}
+
+        asyncio.run(_async_update_listener(self.hass, self.entry))
+
+        self.hass.config_entries.async_reload.assert_awaited_once_with("entry")
+        self.assertEqual(self.coordinator.scan_interval.total_seconds(), 60)
+
+
+class TestAPstorageSunSpecDiscovery(unittest.TestCase):
+    """Test SunSpec model-chain discovery and the cached read plan."""
+
+    def setUp(self):
+        # A device that wants wire addresses one below the logical address.
+        self.offset = -1
+        registers = {40000: 0x5375, 40001: 0x6E53, 40002: 1, 40003: 66, 40070: 802, 40071: 50}
+        registers[40122] = 0xFFFF
+        registers[40083] = 0xFFFF  # SoH not implemented
+        for index, word in enumerate(struct.unpack(">4H", b"1.0\x00\x00\x00\x00\x00")):
+            registers[40044 + index] = word
+        for index, word in enumerate(struct.unpack(">3H", b"B05012")):
+            registers[40052 + index] = word
+        self.words = {address + self.offset: word for address, word in registers.items()}
+        self.reads = 0
+
+    def _read_wire(self, wire_address, count):
+        self.reads += 1
+        return [self.words.get(wire_address + i, 0) for i in range(count)]
+
+    def test_model_chain_is_walked_at_the_matching_offset(self):
+        async def read(wire_address, count):
+            return self._read_wire(wire_address, count)
+
+        async def run():
+            discovery, key = await async_discover_model_chain(read, (0, -1, 1))
+            return await async_confirm_unimplemented(read, discovery), key
+
+        with patch("custom_components.apstorage.discovery.SUNSPEC_CONFIRM_INTERVAL_SECONDS", 0):
+            discovery, key = asyncio.run(run())
+
+        self.assertEqual(discovery.offset, -1)
+        self.assertEqual(
+            [(model.model_id, model.start, model.length) for model in discovery.models],
+            [(1, 40002, 66), (802, 40070, 50)],
+        )
+        self.assertEqual(discovery.unimplemented, frozenset({40083}))
+        self.assertEqual(key, "B05012|1.0")
+        implemented = discovery.implemented_addresses()
+        self.assertIn(40081, implemented)
+        self.assertNotIn(40083, implemented)
+        self.assertNotIn(40183, implemented)
+
+    def test_sentinel_must_persist_across_reads(self):
+        async def read(wire_address, count):
+            words = self._read_wire(wire_address, count)
+            if self.reads > 1:
+                # SoH reports a real value from the second read on.
+                words = [
+                    96 if wire_address + i == 40083 + self.offset else word
+                    for i, word in enumerate(words)
+                ]
+            return words
+
+        discovery = SunSpecDiscovery(self.offset, (SunSpecModel(802, 40070, 50),))
+        with patch("custom_components.apstorage.discovery.SUNSPEC_CONFIRM_INTERVAL_SECONDS", 0):
+            confirmed = asyncio.run(async_confirm_unimplemented(read, discovery))
+
+        self.assertEqual(confirmed.unimplemented, frozenset())
+        self.assertIn(40083, confirmed.implemented_addresses())
+
+    def test_failed_confirming_read_keeps_the_models_unconfirmed(self):
+        async def read(wire_address, count):
+            return None
+
+        discovery = SunSpecDiscovery(self.offset, (SunSpecModel(802, 40070, 50),))
+        confirmed = asyncio.run(async_confirm_unimplemented(read, discovery))
+
+        self.assertIsNone(confirmed.unimplemented)
+        self.assertNotIn("unimplemented", confirmed.as_dict())
+        self.assertIn(40083, confirmed.implemented_addresses())
+
+    def test_discovered_plan_is_cached_per_serial_and_firmware(self):
+        hass = MagicMock()
+
+        async def executor(func, *args):
+            return func(*args)
+
+        hass.async_add_executor_job = executor
+        cache = APstorageModelCache(hass)
+
+        def discover():
+            coordinator = APstorageCoordinator(
+                hass=hass, host="gw", port=502, unit=1, connection_type="tcp",
+                register_address_offset=-1,
+            )
+            coordinator.hass = hass
+            client = coordinator.modbus_client
+            client.read_registers = lambda address, count: self._read_wire(
+                address + client.register_address_offset, count
+            )
+            with patch(
+                "custom_components.apstorage.discovery.SUNSPEC_CONFIRM_INTERVAL_SECONDS", 0
+            ):
+                asyncio.run(coordinator.async_discover_registers(cache))
+            return coordinator
+
+        first = discover()
+        first_reads = self.reads
+        second = discover()
+
+        # Only the identity is read once the confirmed result is stored.
+        self.assertEqual(self.reads - first_reads, 1)
+        self.assertEqual(next(iter(cache._data.values()))["unimplemented"], [40083])
+        self.assertEqual(second.unimplemented_registers, frozenset({40083}))
+        read_addresses = set().union(*(decoder.addresses for decoder in second._read_plan))
+        self.assertEqual(read_addresses, set().union(*(d.addresses for d in first._read_plan)))
+        self.assertIn(40081, read_addresses)
+        self.assertNotIn(40083, read_addresses)
+        self.assertLessEqual(max(d.start + d.count for d in second._read_plan), 40122)
+        self.assertEqual([model.model_id for model in second.sunspec_models], [1, 802])
+
+
+class TestAPstorageProbe(unittest.TestCase):
+    """Test unit ID and offset autodetection and the link recommendations."""
+
+    @staticmethod
+    async def _serve(unit: int, offset: int):
+        """Start a fake device that only answers one unit, at one offset."""
+        header = {40000 + offset: 0x5375, 40001 + offset: 0x6E53, 40002 + offset: 1, 40003 + offset: 66}
+
+        async def handle(reader, writer):
+            while True:
+                try:
+                    request = await reader.readexactly(12)
+                except asyncio.IncompleteReadError:
+                    return
+                transaction_id, _, _, device, _, address, count = struct.unpack(">HHHBBHH", request)
+                if device != unit:
+                    # Gateway path unavailable for unknown unit IDs.
+                    pdu = bytes([0x83, 0x0B])
+                else:
+                    payload = struct.pack(f">{count}H", *(header.get(address + i, 0) for i in range(count)))
+                    pdu = bytes([3, len(payload)]) + payload
+                writer.write(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, device) + pdu)
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    def test_candidates_put_entered_values_first(self):
+        probes = candidates(5)
+
+        self.assertEqual(probes[0], (5, 0))
+        self.assertIn((1, -1), probes)
+        self.assertEqual(len(probes), len(set(probes)))
+
+    def test_probe_finds_unit_and_offset(self):
+        async def run():
+            server, port = await self._serve(unit=2, offset=-1)
+            async with server:
+                return await async_probe_tcp(
+                    _loop_hass(), "127.0.0.1", port, candidates(1), timeout=0.5
+                )
+
+        result = asyncio.run(run())
+
+        self.assertEqual((result.unit, result.offset), (2, -1))
+        self.assertGreater(result.rtt, 0)
+
+    def test_probe_returns_none_without_sunspec_header(self):
+        async def run():
+            server, port = await self._serve(unit=9, offset=0)
+            async with server:
+                return await async_probe_tcp(
+                    _loop_hass(), "127.0.0.1", port, candidates(1), timeout=0.5
+                )
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_recommendations_follow_link_speed(self):
+        fast = ProbeResult(unit=1, offset=0, rtt=0.005, register_time=0.00005)
+        # 1200 baud RTU: about 18 ms per register and 100 ms per request.
+        slow = ProbeResult(unit=1, offset=0, rtt=0.1, register_time=0.018)
+
+        self.assertEqual(fast.recommended_batch_size, 125)
+        self.assertLess(slow.recommended_batch_size, 125)
+        batches = APstorageCoordinator._build_read_batches(max_count=slow.recommended_batch_size)
+        self.assertTrue(all(end - start + 1 <= slow.recommended_batch_size for start, end in batches))
+        self.assertEqual(fast.recommended_scan_interval(APstorageCoordinator._build_read_batches()), 5)
+        self.assertGreater(slow.recommended_scan_interval(batches), 5)
+
+
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestAPstorageSerialPortDiscovery(unittest.TestCase):
+    """Test serial port listing and USB discovery in the config flow."""
+
+    def setUp(self):
+        self.hass = MagicMock()
+        self.hass.data = {}
+        self.executor_jobs = []
+
+        async def executor(func, *args):
+            self.executor_jobs.append(func)
+            return func(*args)
+
+        self.hass.async_add_executor_job = executor
+        port = types.SimpleNamespace(device="/dev/ttyUSB0", description="FT232R USB UART")
+        list_ports = types.SimpleNamespace(comports=MagicMock(return_value=[port]))
+        serial_tools = types.SimpleNamespace(list_ports=list_ports)
+        self.comports = list_ports.comports
+        self.serial_modules = patch.dict(
+            sys.modules,
+            {
+                "serial": types.SimpleNamespace(tools=serial_tools),
+                "serial.tools": serial_tools,
+                "serial.tools.list_ports": list_ports,
+            },
+        )
+        self.serial_modules.start()
+        self.addCleanup(self.serial_modules.stop)
+
+    def test_ports_are_scanned_in_the_executor(self):
+        options = asyncio.run(_async_serial_port_options(self.hass))
+
+        self.assertEqual(self.executor_jobs, [_serial_port_options])
+        self.assertEqual(
+            options, [{"label": "/dev/ttyUSB0 (FT232R USB UART)", "value": "/dev/ttyUSB0"}]
+        )
+
+    def test_fresh_port_list_is_reused_from_hass_data(self):
+        with patch("custom_components.apstorage.config_flow.time.monotonic", return_value=100.0):
+            first = asyncio.run(_async_serial_port_options(self.hass))
+        with patch("custom_components.apstorage.config_flow.time.monotonic", return_value=129.0):
+            second = asyncio.run(_async_serial_port_options(self.hass))
+
+        self.assertIs(second, first)
+        self.comports.assert_called_once()
+        self.assertEqual(self.hass.data[DATA_SERIAL_PORTS], (100.0, first))
+
+    def test_stale_port_list_is_rescanned(self):
+        with patch("custom_components.apstorage.config_flow.time.monotonic", return_value=100.0):
+            asyncio.run(_async_serial_port_options(self.hass))
+        later = 100.0 + SERIAL_PORTS_CACHE_SECONDS
+        with patch("custom_components.apstorage.config_flow.time.monotonic", return_value=later):
+            asyncio.run(_async_serial_port_options(self.hass))
+
+        self.assertEqual(self.comports.call_count, 2)
+        self.assertEqual(self.hass.data[DATA_SERIAL_PORTS][0], later)
+
+    def test_usb_discovery_prefills_the_by_id_path(self):
+        by_id = "/dev/serial/by-id/usb-FTDI_FT232R_USB_UART_A10K-if00-port0"
+        flow = APstorageConfigFlow()
+        flow.hass = self.hass
+        flow.context = {}
+        flow._async_abort_entries_match = MagicMock()
+        flow.async_set_unique_id = AsyncMock()
+        flow._abort_if_unique_id_configured = MagicMock()
+        flow.async_show_form = MagicMock(return_value={"type": "form"})
+        info = UsbServiceInfo(
+            device="/dev/ttyUSB0",
+            vid="0403",
+            pid="6001",
+            serial_number="A10K",
+            manufacturer="FTDI",
+            description="FT232R USB UART",
+        )
+
+        with patch("homeassistant.components.usb.get_serial_by_id", return_value=by_id) as get:
+            result = asyncio.run(flow.async_step_usb(info))
+
+        get.assert_called_once_with("/dev/ttyUSB0")
+        self.assertIn(get, self.executor_jobs)
+        self.assertEqual(result, {"type": "form"})
+        self.assertEqual(flow.data, {"connection_type": "rtu", "host": by_id})
+        flow._async_abort_entries_match.assert_called_once_with({"host": by_id})
+        flow.async_set_unique_id.assert_awaited_once_with(f"{by_id}:1")
+        self.assertEqual(
+            flow.context["title_placeholders"], {"name": "FT232R USB UART - FTDI"}
+        )
+        self.assertEqual(flow.async_show_form.call_args.kwargs["step_id"], "rtu")
+
+
+class TestAPstorageZeroExportController(unittest.TestCase):
+    """Test the zero-export PI loop."""
+
+    def setUp(self):
+        self.coordinator = APstorageCoordinator(
+            hass=MagicMock(), host="gw", port=502, unit=1, connection_type="tcp"
+        )
+        self.coordinator.hass.async_add_executor_job = AsyncMock(
+            side_effect=lambda func, *args: func(*args)
+        )
+        self.coordinator.data = None
+        self.coordinator.async_update_listeners = MagicMock()
+        self.controller = APstorageZeroExportController(self.coordinator)
+
+    def test_integrator_does_not_wind_up_while_saturated(self):
+        for _ in range(20):
+            output = self.controller.update(5000, 1.0, -2000, 2000)
+        self.assertEqual(output, 2000)
+        self.assertTrue(self.controller.saturated)
+
+        # Export appears: the output must leave the limit on the next step.
+        output = self.controller.update(-500, 1.0, -2000, 2000)
+        self.assertLess(output, 2000)
+        self.assertFalse(self.controller.saturated)
+
+    def test_iteration_reads_grid_block_and_writes_set_power(self):
+        client = self.coordinator.modbus_client
+        # 300 W import on phase A, 100 W export on phase B; the battery is idle.
+        client.read_registers = MagicMock(side_effect=[[300, 0x10000 - 100, 0], [0]])
+        client.write_register = MagicMock(return_value=True)
+
+        asyncio.run(self.controller.async_iterate())
+
+        self.assertEqual(client.read_registers.call_args_list, [call(40153, 3), call(40117, 1)])
+        self.assertEqual(self.controller.grid_power, 200)
+        # Proportional plus one interval of integral on a 200 W error.
+        client.write_register.assert_called_once_with(40183, 160, False)
+        self.assertEqual(self.controller.output, 160)
+
+    def test_first_step_starts_from_battery_power_read_in_the_same_cycle(self):
+        client = self.coordinator.modbus_client
+        # The last poll saw the battery idle; it now discharges 1500 W.
+        values = APstorageSnapshot()
+        values.set_value(40183, 0)
+        self.coordinator.data = values
+        client.read_registers = MagicMock(side_effect=[[0, 0, 0], [1500]])
+        client.write_register = MagicMock(return_value=True)
+
+        asyncio.run(self.controller.async_iterate())
+
+        self.assertEqual(self.controller.battery_power, 1500)
+        # No error, so the output is the fresh Battery Power, not the polled 0.
+        self.assertEqual(self.controller.output, 1500)
+
+    def test_failed_read_holds_output(self):
+        client = self.coordinator.modbus_client
+        client.read_registers = MagicMock(return_value=None)
+        client.write_register = MagicMock()
+
+        asyncio.run(self.controller.async_iterate())
+
+        client.write_register.assert_not_called()
+        self.assertEqual(self.controller.read_failures, 1)
+
+    def test_control_writes_do_not_defer_polls(self):
+        client = self.coordinator.modbus_client
+        client.client = MagicMock()
+        client.client.write_registers.return_value.isError.return_value = False
+        client._ensure_connected = MagicMock(return_value=True)
+
+        self.assertTrue(client.write_register(40183, 100, False))
+        self.assertFalse(client.should_defer_reads())
+        self.assertTrue(client.write_register(40183, 100))
+        self.assertTrue(client.should_defer_reads())
+
+
+class TestAPstorageScheduleExecutor(unittest.TestCase):
+    """Test the timed, persisted Set Power schedule."""
+
+    def setUp(self):
+        hass = MagicMock()
+        hass.async_add_executor_job = AsyncMock(side_effect=lambda func, *args: func(*args))
+        self.coordinator = APstorageCoordinator(
+            hass=hass, host="gw", port=502, unit=1, connection_type="tcp", entry_id="entry"
+        )
+        self.coordinator.data = None
+        self.coordinator.async_update_listeners = MagicMock()
+        self.coordinator.modbus_client.write_register = MagicMock(return_value=True)
+        self.schedule = self.coordinator.schedule
+        self.track = sys.modules["homeassistant.helpers.event"].async_track_point_in_utc_time
+        self.track.reset_mock()
+
+    def test_points_are_sorted_persisted_and_one_timer_is_armed(self):
+        now = datetime.now(timezone.utc)
+        points = [(now + timedelta(hours=2), 0), (now - timedelta(hours=1), 500), (now + timedelta(hours=1), 2000)]
+
+        asyncio.run(self.schedule.async_set_points(points))
+
+        self.assertEqual([power for _, power in self.schedule.points], [2000, 0])
+        self.assertEqual(len(self.schedule._store.saved["points"]), 2)
+        self.track.assert_called_once()
+        fire_at = self.track.call_args.args[2]
+        self.assertEqual(fire_at, now + timedelta(hours=1) - timedelta(seconds=0.5))
+
+    def test_out_of_range_power_is_rejected(self):
+        now = datetime.now(timezone.utc)
+        with self.assertRaises(Exception):
+            asyncio.run(self.schedule.async_set_points([(now + timedelta(hours=1), 50000)]))
+        self.track.assert_not_called()
+
+    def _limit_to(self, max_charge, max_discharge):
+        values = APstorageSnapshot()
+        values.set_value(40074, max_charge)
+        values.set_value(40075, max_discharge)
+        self.coordinator.data = values
+
+    def test_power_outside_the_live_limits_is_rejected(self):
+        self._limit_to(3000, 3000)
+        now = datetime.now(timezone.utc)
+
+        with self.assertRaises(Exception):
+            asyncio.run(self.schedule.async_set_points([(now + timedelta(hours=1), 5000)]))
+        asyncio.run(self.schedule.async_set_points([(now + timedelta(hours=1), -3000)]))
+
+        self.assertEqual([power for _, power in self.schedule.points], [-3000])
+
+    def test_point_is_clamped_to_limits_that_dropped_before_it_fired(self):
+        self.schedule.points = [(datetime.now(timezone.utc), 5000)]
+        self._limit_to(3000, 2000)
+
+        asyncio.run(self.schedule._async_fire(datetime.now(timezone.utc)))
+
+        self.coordinator.modbus_client.write_register.assert_called_once_with(40183, 2000)
+
+    def test_points_replaced_during_the_write_are_kept(self):
+        now = datetime.now(timezone.utc)
+        self.schedule.points = [(now, 100)]
+        replacement = [(now + timedelta(hours=1), 700), (now + timedelta(hours=2), 800)]
+
+        def write(address, raw):
+            # The service replaces the timeline while the write is in flight.
+            self.schedule.points = list(replacement)
+            return True
+
+        self.coordinator.modbus_client.write_register = MagicMock(side_effect=write)
+
+        asyncio.run(self.schedule._async_fire(now))
+
+        self.assertEqual(self.schedule.points, replacement)
+
+    def test_fire_waits_for_the_point_and_records_latency(self):
+        at = datetime.now(timezone.utc) + timedelta(seconds=0.05)
+        self.schedule.points = [(at, -1500)]
+
+        asyncio.run(self.schedule._async_fire(datetime.now(timezone.utc)))
+
+        self.coordinator.modbus_client.write_register.assert_called_once_with(40183, -1500)
+        self.assertGreaterEqual(datetime.now(timezone.utc), at)
+        self.assertEqual(self.schedule.points, [])
+        self.assertEqual(self.schedule.applied, 1)
+        self.assertLess(abs(self.schedule.last_latency), 0.05)
+
+    def test_failed_write_is_retried_until_the_next_point_is_due(self):
+        now = datetime.now(timezone.utc)
+        later = (now + timedelta(hours=1), 300)
+        self.schedule.points = [(now, 100), later]
+        self.coordinator.modbus_client.write_register = MagicMock(return_value=False)
+
+        asyncio.run(self.schedule._async_fire(now))
+
+        self.assertEqual(self.schedule.points, [(now, 100), later])
+        self.assertEqual(self.schedule.diagnostics()["failed"], 1)
+        fire_at = self.track.call_args.args[2]
+        self.assertGreaterEqual(fire_at, now + timedelta(seconds=4))
+
+        self.coordinator.modbus_client.write_register.return_value = True
+        asyncio.run(self.schedule._async_fire(now))
+
+        self.assertEqual(self.schedule.points, [later])
+        self.assertEqual(self.schedule.applied, 1)
+        self.assertIsNone(self.schedule.diagnostics()["retry_after"])
+
+    def test_failed_write_is_not_retried_past_the_next_point(self):
+        now = datetime.now(timezone.utc)
+        soon = (now + timedelta(seconds=1), 300)
+        self.schedule.points = [(now, 100), soon]
+        self.coordinator.modbus_client.write_register = MagicMock(return_value=False)
+
+        asyncio.run(self.schedule._async_fire(now))
+
+        self.assertEqual(self.schedule.points, [soon])
+        self.assertEqual(self.schedule.failed, 1)
+
+    def test_latest_missed_point_is_applied_after_restart(self):
+        now = datetime.now(timezone.utc)
+        self.schedule._store.saved = {
+            "points": [
+                [(now - timedelta(hours=2)).isoformat(), 100],
+                [(now - timedelta(hours=1)).isoformat(), 200],
+                [(now + timedelta(hours=1)).isoformat(), 300],
+            ]
+        }
+
+        asyncio.run(self.schedule.async_load())
+
+        self.assertEqual([power for _, power in self.schedule.points], [200, 300])
+        self.track.assert_called_once()
+
+
+class TestAPstorageFleet(unittest.TestCase):
+    """Test fleet totals and the headroom-based Set Power split."""
+
+    @staticmethod
+    def _member(entry_id, values):
+        registers = {
+            40073: 10.0,  # capacity kWh
+            40074: 5000,  # max charge W
+            40075: 5000,  # max discharge W
+            40077: 100.0,
+            40078: 10.0,
+            40081: 50.0,
+            40117: 0,
+            40148: 100.0,  # charge energy kWh
+            40150: 80.0,  # discharge energy kWh
+            40183: 0,
+        }
+        registers.update(values)
+        member = MagicMock(entry_id=entry_id, last_update_success=True)
+        member.data = {address: {"value": value} for address, value in registers.items()}
+        member.listeners = []
+        member.async_add_listener = lambda listener: member.listeners.append(listener) or MagicMock()
+        member.writer.to_raw = lambda address, value: int(value)
+        member.modbus_client.write_register = MagicMock(return_value=True)
+        return member
+
+    def setUp(self):
+        hass = MagicMock()
+        hass.async_add_executor_job = AsyncMock(side_effect=lambda func, *args: func(*args))
+        self.fleet = APstorageFleet(hass)
+        self.small = self._member("small", {40073: 5.0, 40081: 20.0, 40117: 1000, 40075: 2500})
+        self.large = self._member("large", {40073: 15.0, 40081: 60.0, 40117: -400})
+        self.fleet.async_add_member(self.small)
+        self.fleet.async_add_member(self.large)
+
+    def test_totals_update_incrementally_on_member_poll(self):
+        self.assertEqual(self.fleet.value("battery_power"), 600)
+        self.assertEqual(self.fleet.value("energy_capacity"), 20)
+        self.assertEqual(self.fleet.value("soc"), 50.0)
+
+        listener = MagicMock()
+        self.fleet.async_add_listener(listener)
+        self.large.data[40117] = {"value": 200}
+        self.large.listeners[0]()
+
+        listener.assert_called_once()
+        self.assertEqual(self.fleet.value("battery_power"), 1200)
+
+        self.fleet.async_remove_member("small")
+        self.assertEqual(self.fleet.value("battery_power"), 200)
+        self.assertEqual(self.fleet.value("soc"), 60.0)
+
+    def test_power_is_split_by_headroom(self):
+        self.assertEqual(self.fleet.split_power(3000), {"small": 1000, "large": 2000})
+        # Requests beyond the combined headroom saturate every member.
+        self.assertEqual(self.fleet.split_power(10000), {"small": 2500, "large": 5000})
+
+        # A battery at its SoC minimum cannot discharge but can still charge.
+        self.small.data[40081] = {"value": 10.0}
+        self.assertEqual(self.fleet.split_power(3000), {"small": 0, "large": 3000})
+        self.assertEqual(self.fleet.split_power(-4000), {"small": -2000, "large": -2000})
+
+    def test_fleet_power_is_written_to_every_member(self):
+        self.assertTrue(asyncio.run(self.fleet.async_set_power(3000)))
+
+        self.small.modbus_client.write_register.assert_called_once_with(40183, 1000)
+        self.large.modbus_client.write_register.assert_called_once_with(40183, 2000)
+        self.large.async_set_optimistic_value.assert_called_once_with(40183, 2000)
+
+    def test_failed_poll_drops_power_and_hides_energy(self):
+        self.fleet.hass.config_entries.async_entries.return_value = [
+            MagicMock(entry_id=entry_id, data={}, disabled_by=None)
+            for entry_id in ("small", "large")
+        ]
+        sensor = APstorageFleetSensor(
+            self.fleet, MagicMock(entry_id="fleet"), "charge_energy", "Fleet Charge Energy",
+            "kWh", "energy", "total_increasing",
+        )
+        self.assertEqual(self.fleet.value("charge_energy"), 200)
+        self.assertTrue(sensor.available)
+
+        self.large.last_update_success = False
+        self.large.listeners[0]()
+
+        self.assertFalse(sensor.available)
+        self.assertIsNone(self.fleet.value("charge_energy"))
+        # Power and SoC now come from the reporting battery only.
+        self.assertEqual(self.fleet.value("battery_power"), 1000)
+        self.assertEqual(self.fleet.value("soc"), 20.0)
+
+        self.large.last_update_success = True
+        self.large.data[40148] = {"value": 101.0}
+        self.large.listeners[0]()
+
+        self.assertTrue(sensor.available)
+        self.assertEqual(self.fleet.value("charge_energy"), 201)
+
+    def test_unloaded_member_keeps_its_energy_counters(self):
+        self.fleet.async_remove_member("small")
+
+        self.assertEqual(self.fleet.value("charge_energy"), 200)
+        self.assertEqual(self.fleet.value("battery_power"), -400)
+
+    def test_battery_loaded_late_hides_energy_until_it_reports(self):
+        self.fleet.hass.config_entries.async_entries.return_value = [
+            MagicMock(entry_id=entry_id, data={}, disabled_by=None)
+            for entry_id in ("small", "large", "late")
+        ]
+
+        self.assertFalse(self.fleet.complete)
+        self.fleet.async_add_member(self._member("late", {}))
+        self.assertTrue(self.fleet.complete)
+        self.assertEqual(self.fleet.value("charge_energy"), 300)
+
+    def test_offline_member_is_skipped_when_writing_fleet_power(self):
+        self.small.last_update_success = False
+
+        self.assertTrue(asyncio.run(self.fleet.async_set_power(3000)))
+
+        self.small.modbus_client.write_register.assert_not_called()
+        self.large.modbus_client.write_register.assert_called_once_with(40183, 3000)
+        self.assertEqual(self.fleet.last_split, {"large": 3000})
+
+
+
+class TestAPstorageLiveStream(unittest.TestCase):
+    """Test the websocket live stream's fast poll and per-subscriber batching."""
+
+    def setUp(self):
+        hass = MagicMock()
+        hass.async_add_executor_job = AsyncMock(side_effect=lambda func, *args: func(*args))
+        self.coordinator = APstorageCoordinator(
+            hass=hass, host="gw", port=502, unit=1, connection_type="tcp", entry_id="entry"
+        )
+        self.coordinator.modbus_client.read_registers = MagicMock(
+            side_effect=lambda address, count: [7] * count
+        )
+        self.task = MagicMock()
+        hass.async_create_background_task = MagicMock(
+            side_effect=lambda coro, name: coro.close() or self.task
+        )
+        self.live = self.coordinator.live
+
+    def test_plan_covers_the_union_and_stops_after_last_unsubscribe(self):
+        first = self.live.async_subscribe((40117,), 1.0, 0, MagicMock())
+        second = self.live.async_subscribe((40153, 40154), 2.0, 0, MagicMock())
+
+        self.coordinator.hass.async_create_background_task.assert_called_once()
+        planned = set().union(*(decoder.addresses for decoder in self.live._plan))
+        self.assertTrue({40117, 40153, 40154} <= planned)
+        self.assertEqual(self.live.interval, 0.5)
+
+        task = self.task
+        first()
+        task.cancel.assert_not_called()
+        second()
+        task.cancel.assert_called_once()
+        self.assertEqual(self.live.subscriber_count, 0)
+        self.assertEqual(self.live._plan, [])
+
+    def test_samples_are_rate_limited_and_batched(self):
+        send = MagicMock()
+        self.live.async_subscribe((40117, 40153), 1.0, 10.0, send)
+
+        async def sample_twice():
+            await self.live.async_sample_once()
+            # A second sample within the subscriber's interval is not queued.
+            await self.live.async_sample_once()
+
+        asyncio.run(sample_twice())
+
+        # The first sample flushes immediately; the next waits for the batch window.
+        send.assert_called_once()
+        message = send.call_args.args[0]
+        self.assertEqual(message["registers"], [40117, 40153])
+        self.assertEqual(len(message["samples"]), 1)
+        self.assertEqual(len(message["samples"][0]), 3)
+        self.assertEqual(message["dropped"], 0)
+        self.assertEqual(self.live.samples, 2)
+
+    def test_backed_up_subscriber_holds_samples_then_drops_oldest(self):
+        send = MagicMock()
+        ready = MagicMock(return_value=False)
+        self.live.async_subscribe((40117,), 5.0, 0, send, ready=ready)
+        subscriber = next(iter(self.live._subscribers.values()))
+        subscriber.queue.extend([[0.0, 1]] * (subscriber.queue.maxlen - 1))
+
+        async def sample(times):
+            for _ in range(times):
+                subscriber.last_sample = float("-inf")
+                await self.live.async_sample_once()
+
+        asyncio.run(sample(3))
+        send.assert_not_called()
+        ready.return_value = True
+        asyncio.run(sample(1))
+
+        message = send.call_args.args[0]
+        self.assertEqual(message["dropped"], 3)
+        self.assertEqual(message["dropped_total"], 3)
+        self.assertEqual(len(message["samples"]), subscriber.queue.maxlen)
+        self.assertEqual(self.live.diagnostics()["dropped"], 3)
+
+    def test_full_buffer_is_sent_before_the_batch_window(self):
+        send = MagicMock()
+        self.live.async_subscribe((40117,), 5.0, 24.0, send)
+        subscriber = next(iter(self.live._subscribers.values()))
+        subscriber.last_flush = time.monotonic()
+        subscriber.queue.extend([[0.0, 1]] * (subscriber.queue.maxlen - 1))
+
+        asyncio.run(self.live.async_sample_once())
+
+        message = send.call_args.args[0]
+        self.assertEqual(len(message["samples"]), subscriber.queue.maxlen)
+        self.assertEqual(message["dropped"], 0)
+
+    def test_subscription_rejects_batches_larger_than_the_buffer(self):
+        hass = MagicMock()
+        hass.data = {"apstorage": {"entry": {"coordinator": self.coordinator}}}
+        connection = MagicMock(subscriptions={})
+        msg = {
+            "id": 5,
+            "entry_id": "entry",
+            "registers": [40117],
+            "max_rate": 5.0,
+            "batch_seconds": 60.0,
+        }
+
+        ws_subscribe_live(hass, connection, msg)
+
+        connection.send_error.assert_called_once()
+        self.assertEqual(connection.send_error.call_args.args[1], "invalid_format")
+        self.assertEqual(self.live.subscriber_count, 0)
+
+    def test_subscription_is_held_while_the_socket_is_backed_up(self):
+        handler = types.SimpleNamespace(_message_queue=[])
+        handler.send = MagicMock()
+        hass = MagicMock()
+        hass.data = {"apstorage": {"entry": {"coordinator": self.coordinator}}}
+        connection = MagicMock(subscriptions={})
+        connection.send_message = types.MethodType(
+            lambda _, message: handler.send(message), handler
+        )
+        msg = {
+            "id": 5,
+            "entry_id": "entry",
+            "registers": [40117],
+            "max_rate": 1.0,
+            "batch_seconds": 0,
+        }
+
+        ws_subscribe_live(hass, connection, msg)
+        subscriber = next(iter(self.live._subscribers.values()))
+        self.assertTrue(subscriber.ready())
+        handler._message_queue.extend([b"{}"] * 17)
+        self.assertFalse(subscriber.ready())
+
+    def test_stop_ends_every_subscription_with_a_close_message(self):
+        send, close = MagicMock(), MagicMock()
+        self.live.async_subscribe((40117,), 1.0, 1000.0, send, close)
+        subscriber = next(iter(self.live._subscribers.values()))
+        subscriber.queue.append([0.0, 1])
+        # The fast-poll task is a stand-in here; there is nothing to await.
+        self.live._task = None
+
+        asyncio.run(self.live.async_stop())
+
+        message = send.call_args.args[0]
+        self.assertEqual(message["closed"], "entry_unloaded")
+        self.assertEqual(message["samples"], [[0.0, 1]])
+        close.assert_called_once()
+        self.assertEqual(self.live.subscriber_count, 0)
+
+
+class TestAPstorageCapture(unittest.TestCase):
+    """Test the on-demand capture service backend."""
+
+    def setUp(self):
+        hass = MagicMock()
+        hass.async_add_executor_job = AsyncMock(side_effect=lambda func, *args: func(*args))
+        self.coordinator = APstorageCoordinator(
+            hass=hass, host="gw", port=502, unit=1, connection_type="tcp", entry_id="entry"
+        )
+        # A simulated clock: sleeps and reads advance it instead of real time.
+        self.now = 0.0
+        self.read_seconds = 0.001
+
+        def read(address, count):
+            self.now += self.read_seconds
+            return list(range(address, address + count))
+
+        async def sleep(seconds):
+            self.now += seconds
+
+        self.reads = MagicMock(side_effect=read)
+        self.coordinator.modbus_client.read_registers = self.reads
+        self.capture = self.coordinator.capture
+        clock = patch(
+            "custom_components.apstorage.capture.time", types.SimpleNamespace(monotonic=lambda: self.now)
+        )
+        sleeper = patch(
+            "custom_components.apstorage.capture.asyncio", types.SimpleNamespace(sleep=sleep)
+        )
+        clock.start()
+        sleeper.start()
+        self.addCleanup(clock.stop)
+        self.addCleanup(sleeper.stop)
+
+    def test_capture_reads_only_the_requested_registers_at_the_target_rate(self):
+        response = asyncio.run(self.capture.async_capture([40117, 40183], 0.25, 20.0, True))
+
+        self.assertEqual(response["registers"], [40117, 40183])
+        self.assertEqual(response["samples"], 5)
+        self.assertEqual(response["timestamps"], [0.0, 0.05, 0.1, 0.15, 0.2])
+        self.assertEqual(response["target_rate"], 20.0)
+        self.assertAlmostEqual(response["achieved_rate"], 20.0)
+        self.assertAlmostEqual(response["jitter_ms"], 0.0)
+        self.assertEqual(len(response["values"][0]), 2)
+        # Each raw row holds every word of the minimal plan, in plan order.
+        words = sum(count for _, count in response["raw"]["batches"])
+        self.assertEqual(len(response["raw"]["words"][0]), words)
+        self.assertEqual(response["raw"]["words"][0][0], response["raw"]["batches"][0][0])
+        read_addresses = {call.args[0] for call in self.reads.call_args_list}
+        self.assertTrue(all(40117 <= address <= 40183 for address in read_addresses))
+        self.assertEqual(self.capture.captures, 1)
+
+    def test_fast_link_fills_the_whole_window(self):
+        # 200 Hz back to back, well past the 50 Hz the buffer is sized for.
+        self.read_seconds = 0.005
+        response = asyncio.run(self.capture.async_capture([40117], 1.0, None, True))
+
+        self.assertEqual(response["samples"], 200)
+        self.assertGreater(response["timestamps"][-1], 0.99)
+        self.assertEqual(len(response["raw"]["words"]), 200)
+        self.assertAlmostEqual(response["achieved_rate"], 200.0)
+
+    def test_failed_reads_are_not_recorded_as_samples(self):
+        outcomes = iter([None] + [[5] * 125] * 10)
+
+        def read(address, count):
+            self.now += self.read_seconds
+            return next(outcomes)
+
+        self.reads.side_effect = read
+        response = asyncio.run(self.capture.async_capture([40117], 0.15, 10.0))
+
+        self.assertEqual(response["failed_reads"], 1)
+        self.assertEqual(response["samples"], 1)
+        self.assertIsNone(response["achieved_rate"])
+        self.assertNotIn("raw", response)
+
+    def test_non_numeric_registers_are_rejected(self):
+        with self.assertRaises(Exception):
+            asyncio.run(self.capture.async_capture([40004], 1.0))
+        self.reads.assert_not_called()
+
+
+class TestAPstorageFrameRecorder(unittest.TestCase):
+    """Test the append-only raw frame log."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.hass = MagicMock()
+        self.hass.async_add_executor_job = AsyncMock(side_effect=lambda func, *args: func(*args))
+        self.plan = APstorageCoordinator._build_read_plan(max_count=60)
+
+    def _recorder(self, **kwargs):
+        kwargs.setdefault("flush_bytes", 1 << 30)
+        kwargs.setdefault("flush_seconds", 1e9)
+        return APstorageFrameRecorder(self.hass, self.directory.name, "entry", **kwargs)
+
+    def _frames(self, seed, failed=()):
+        return [
+            (decoder, None if index in failed else decoder.pack([(seed + i) & 0xFFFF for i in range(decoder.count)]))
+            for index, decoder in enumerate(self.plan)
+        ]
+
+    def test_polls_round_trip_with_failed_batches(self):
+        recorder = self._recorder()
+        recorder.async_record(self._frames(1), 1000.0)
+        recorder.async_record(self._frames(2, failed={1}), 1005.0)
+        self.hass.async_add_executor_job.assert_not_called()
+
+        asyncio.run(recorder.async_stop())
+
+        (path,) = log_files(self.directory.name, "entry")
+        records = list(read_records(path))
+        self.assertEqual([record.timestamp for record in records], [1000.0, 1005.0])
+        first = self.plan[0]
+        self.assertEqual(records[0].frames[first.start][:3], (1, 2, 3))
+        self.assertIsNone(records[1].frames[self.plan[1].start])
+        self.assertEqual(records[1].frames[first.start][0], 2)
+        words = sum(decoder.count for decoder in self.plan)
+        self.assertEqual(recorder.records, 2)
+        self.assertEqual(path.stat().st_size, recorder.bytes_written)
+        self.assertLess(recorder.bytes_written, 2 * (words * 2 + 32) + 8 + 4 * len(self.plan))
+
+    def test_files_rotate_by_size_and_the_oldest_are_dropped(self):
+        record_bytes = 20 + 2 * sum(decoder.count for decoder in self.plan)
+        recorder = self._recorder(max_file_bytes=3 * record_bytes, max_files=2)
+        for second in range(7):
+            recorder.async_record(self._frames(second), 2000.0 + second)
+        asyncio.run(recorder.async_flush())
+
+        files = log_files(self.directory.name, "entry")
+        self.assertEqual(len(files), 2)
+        timestamps = [record.timestamp for path in files for record in read_records(path)]
+        self.assertEqual(timestamps, [2004.0, 2005.0, 2006.0])
+        self.assertTrue(all(path.with_suffix(".apidx").exists() for path in files))
+
+    def test_index_seeks_to_a_timestamp(self):
+        recorder = self._recorder(index_seconds=10)
+        for second in range(0, 60, 5):
+            recorder.async_record(self._frames(second), 3000.0 + second)
+        asyncio.run(recorder.async_flush())
+
+        (path,) = log_files(self.directory.name, "entry")
+        self.assertEqual(path.with_suffix(".apidx").stat().st_size, 6 * 16)
+        records = list(read_records(path, since=3032.0))
+        self.assertEqual(records[0].timestamp, 3035.0)
+        self.assertEqual(len(records), 5)
+
+    def test_failed_write_starts_a_new_file_without_counting(self):
+        recorder = self._recorder()
+        recorder.async_record(self._frames(1), 4000.0)
+        asyncio.run(recorder.async_flush())
+        (first,) = log_files(self.directory.name, "entry")
+        records, file_bytes = recorder.records, recorder.diagnostics()["file_bytes"]
+
+        recorder.async_record(self._frames(2), 4001.0)
+        with patch("pathlib.Path.open", side_effect=OSError("disk full")):
+            asyncio.run(recorder.async_flush())
+
+        self.assertEqual(recorder.write_errors, 1)
+        self.assertEqual(recorder.records, records)
+        self.assertEqual(first.stat().st_size, file_bytes)
+        self.assertIsNone(recorder.diagnostics()["file"])
+
+        recorder.async_record(self._frames(3), 4002.0)
+        asyncio.run(recorder.async_flush())
+        files = log_files(self.directory.name, "entry")
+        self.assertEqual(len(files), 2)
+        self.assertEqual([record.timestamp for record in read_records(files[1])], [4002.0])
+        self.assertEqual(recorder.records, records + 1)
+
+    def test_flush_is_scheduled_once_the_buffer_is_full(self):
+        self.hass.async_create_background_task = MagicMock(side_effect=lambda coro, name: coro.close())
+        recorder = self._recorder(flush_bytes=500)
+        recorder.async_record(self._frames(1), 1.0)
+        recorder.async_record(self._frames(2), 2.0)
+
+        self.hass.async_create_background_task.assert_called()
+
+
+def _load_step_benchmark():
+    """Import benchmarks/bench_step_response.py, which is not a package module."""
+    path = Path(__file__).resolve().parents[1] / "benchmarks" / "bench_step_response.py"
+    spec = importlib.util.spec_from_file_location("bench_step_response", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestStepResponseBenchmark(unittest.TestCase):
+    """Test the step-response metrics and the simulator run used for CI."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bench = _load_step_benchmark()
+
+    def test_metrics_of_a_known_response(self):
+        metrics = self.bench.analyze_step(
+            [0.0, 1.0, 2.0, 3.0, 4.0], [0.0, 0.0, 500.0, 1200.0, 1000.0], 0.0, 1000.0
+        )
+
+        self.assertEqual(
+            metrics, {"dead_time": 2.0, "rise_time": 1.0, "overshoot": 20.0, "settle_time": 4.0}
+        )
+
+    def test_sampled_plant_matches_the_simulator_expectation(self):
+        battery = self.bench.SimulatedBattery()
+        expected = battery.expected()
+        # A 100 Hz sampling of a 0 -> 2000 W step.
+        times = [index / 100 for index in range(500)]
+        values = [2000 * battery._unit_step(t - battery.dead_time) for t in times]
+
+        metrics = self.bench.analyze_step(times, values, 0.0, 2000.0)
+
+        for name in ("dead_time", "rise_time", "settle_time"):
+            self.assertAlmostEqual(metrics[name], expected[name], delta=0.011)
+        self.assertAlmostEqual(metrics["overshoot"], expected["overshoot"], delta=0.2)
+
+    def test_steps_outside_the_rate_limits_are_refused_or_clamped(self):
+        with self.assertRaises(ValueError):
+            self.bench.limit_steps([2000, 8000], -5000, 5000, clamp=False)
+        self.assertEqual(
+            self.bench.limit_steps([2000, 8000, -9000], -5000, 5000, clamp=True),
+            [2000, 5000, -5000],
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec("pymodbus"), "pymodbus is not installed")
+    def test_simulator_run_passes(self):
+        with patch("builtins.print"):
+            self.assertEqual(
+                self.bench.main(["--simulator", "--steps", "1000", "--hold", "0.8"]), 0
+            )
+            # An out-of-range step is refused before anything is written.
+            self.assertEqual(self.bench.main(["--simulator", "--steps", "8000"]), 2)